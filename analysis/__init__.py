@@ -0,0 +1,4 @@
+"""
+Offline analysis of the exported session data in ``data/`` (not an oTree
+app: nothing here is imported by the experiment).
+"""
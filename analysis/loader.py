@@ -0,0 +1,507 @@
+"""
+One table for every export in ``data/``, cached column by column.
+
+The exports come in several shapes: per-app CSVs (baseline, exogenous,
+demographics, with different columns per treatment and version), wide CSVs
+with one row per participant and one ``<app>.<round>.player.<field>``
+column per field and round (``all_apps_wide_*.csv``, ``sessions/*.csv``),
+the same files inside zip archives, in UTF-8 with or without BOM, some
+separated by semicolons.
+
+:func:`iter_records` streams all of them row by row (zip members are read
+in place) and maps every (participant, app, round) onto the canonical
+:data:`SCHEMA`. Fields a source does not have are None. The same session
+can appear in several files; every record keeps its ``source``.
+
+:func:`load` keeps the result in a column-oriented cache (``data/.columnar``
+by default): one binary array per column plus a ``manifest.json`` with the
+schema, the string dictionaries and, for every source, a key of its content
+(sha256 of the CSV, CRC-32 and size of a zip member) and its number of rows.
+Loading parses only the sources that are new or changed since the cache was
+written and appends their rows to the arrays; those of changed or deleted
+sources are dropped, the others are read back as they are. The rows of a
+source are contiguous, the sources in the order they were ingested.
+
+Usage: ``python -m analysis.loader [data_dir]`` updates the cache and prints
+a summary.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import json
+import math
+import re
+import sys
+import time
+import zipfile
+from array import array
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+CACHE_DIR_NAME = '.columnar'
+CACHE_VERSION = 2
+
+APP_TREATMENTS = {
+    'credencegoodsBJS': 'baseline',
+    'credencegoodsBJS_Exo': 'exogenous',
+    'credencegoodsBJS_verifiability': 'verifiability',
+    'demographics': None,
+}
+
+# (canonical column, type, source field). Source fields are named as in the
+# per-app exports; in wide exports the player/group/subsession fields carry
+# an '<app>.<round>.' prefix. Columns without a source field are set by the
+# loader.
+SCHEMA = [
+    ('source', str, None),
+    ('app', str, None),
+    ('treatment', str, None),
+    ('session_code', str, 'session.code'),
+    ('session_label', str, 'session.label'),
+    ('session_config', str, 'session.config.name'),
+    ('session_comment', str, 'session.comment'),
+    ('is_demo', bool, 'session.is_demo'),
+    ('real_world_currency_per_point', float, 'session.config.real_world_currency_per_point'),
+    ('participant_code', str, 'participant.code'),
+    ('participant_label', str, 'participant.label'),
+    ('participant_id_in_session', int, 'participant.id_in_session'),
+    ('is_bot', bool, 'participant._is_bot'),
+    ('time_started_utc', str, 'participant.time_started_utc'),
+    ('participant_payoff', float, 'participant.payoff'),
+    ('index_in_pages', int, 'participant._index_in_pages'),
+    ('max_page_index', int, 'participant._max_page_index'),
+    ('round_number', int, 'subsession.round_number'),
+    ('group_id_in_subsession', int, 'group.id_in_subsession'),
+    ('id_in_group', int, 'player.id_in_group'),
+    ('payoff', float, 'player.payoff'),
+    ('player_role', str, 'player.player_role'),
+    ('player_id_in_role', str, 'player.player_id_in_role'),
+    ('matching_group_id', int, 'player.matching_group_id'),
+    ('condition_price', str, 'player.condition_price'),
+    ('price_choice', str, 'player.price_choice'),
+    ('price1_offer', int, 'player.price1_offer'),
+    ('price2_offer', int, 'player.price2_offer'),
+    ('interaction', bool, 'player.interaction'),
+    ('player_b_type', int, 'player.player_b_type'),
+    ('action_chosen', int, 'player.action_chosen'),
+    ('price_paid', int, 'player.price_paid'),
+    ('revenue', int, 'player.revenue'),
+    ('round_payoff', float, 'player.round_payoff'),
+    ('partner_price1', int, 'player.partner_price1'),
+    ('partner_price2', int, 'player.partner_price2'),
+    ('partner_interaction', bool, 'player.partner_interaction'),
+    ('partner_action', int, 'player.partner_action'),
+    ('partner_price_paid', int, 'player.partner_price_paid'),
+    ('cq_q1', str, 'player.cq_q1'),
+    ('cq_q2', str, 'player.cq_q2'),
+    ('cq_q3', str, 'player.cq_q3'),
+    ('cq_q4', str, 'player.cq_q4'),
+    ('total_payoff_points', float, 'player.total_payoff_points'),
+    ('total_payoff_euros', float, 'player.total_payoff_euros'),
+    ('participation_fee', float, 'player.participation_fee'),
+    ('total_payment', float, 'player.total_payment'),
+    ('age', int, 'player.age'),
+    ('gender', str, 'player.gender'),
+    ('field_of_study', str, 'player.field_of_study'),
+]
+
+WIDE_COLUMN = re.compile(r'^(\w+)\.(\d+)\.((?:player|group|subsession)\.\w+)$')
+APP_FILE_NAME = re.compile(r'^(\w+?)_\d{4}-\d{2}-\d{2}')
+
+# on-disk encoding of each type: array typecode and the value standing for None
+INT_NULL = -(2 ** 63)
+TYPECODES = {int: 'q', float: 'd', bool: 'b', str: 'i'}
+TYPE_NAMES = {int: 'int', float: 'float', bool: 'bool', str: 'str'}
+TYPES_BY_NAME = {name: t for t, name in TYPE_NAMES.items()}
+
+
+# READING
+
+def open_text(binary):
+    """Wrap a binary stream in a text stream of the detected encoding:
+    UTF-8 (BOM or not), else cp1252."""
+    sample = binary.peek(65536)[:65536]
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        try:
+            # final=False: the sample may end inside a multibyte character
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = 'cp1252'
+    return io.TextIOWrapper(binary, encoding=encoding, newline='')
+
+
+def sniff_delimiter(header_line):
+    counts = {delimiter: header_line.count(delimiter) for delimiter in ',;\t'}
+    return max(counts, key=counts.get)
+
+
+def file_digest(path):
+    """sha256 of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_sources(data_dir, digest=file_digest):
+    """Yield (source name, content key, opener) for every CSV under
+    ``data_dir``, including the members of zip archives; openers return
+    binary streams. The key of a CSV is ``digest(path)``, that of a zip
+    member the CRC-32 and size the archive stores for it, so an unchanged
+    member is recognised without decompressing it."""
+    data_dir = Path(data_dir)
+    for path in sorted(data_dir.rglob('*')):
+        if CACHE_DIR_NAME in path.relative_to(data_dir).parts or not path.is_file():
+            continue
+        name = path.relative_to(data_dir).as_posix()
+        if path.suffix.lower() == '.csv':
+            yield name, digest(path), lambda path=path: open(path, 'rb')
+        elif path.suffix.lower() == '.zip':
+            with zipfile.ZipFile(path) as archive:
+                members = [
+                    (info.filename, f'crc32:{info.CRC:08x}:{info.file_size}')
+                    for info in archive.infolist() if info.filename.lower().endswith('.csv')
+                ]
+            for member, key in members:
+                yield f'{name}:{member}', key, lambda path=path, member=member: _open_member(path, member)
+
+
+def _open_member(path, member):
+    # the archive's file stays open until the member is closed
+    with zipfile.ZipFile(path) as archive:
+        return io.BufferedReader(archive.open(member))
+
+
+def convert(value, type_, source, column):
+    if value == '':
+        return None
+    try:
+        if type_ is str:
+            return value
+        if type_ is bool:
+            return {'1': True, 'True': True, 'true': True, '0': False, 'False': False, 'false': False}[value]
+        if type_ is int:
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError(value)
+            return int(number)
+        return float(value)
+    except (KeyError, ValueError):
+        raise RuntimeError(f"{source}: {column} = {value!r} is not a valid {TYPE_NAMES[type_]}.")
+
+
+def app_of_source(source, header):
+    """App of a per-app export, from its file name or else its columns."""
+    match = APP_FILE_NAME.match(Path(source.split(':')[-1]).name)
+    if match and match.group(1) in APP_TREATMENTS:
+        return match.group(1)
+    if 'player.condition_price' in header or 'group.condition_price' in header:
+        return 'credencegoodsBJS_Exo'
+    if 'player.age' in header:
+        return 'demographics'
+    if 'player.price1_offer' in header or 'group.price1_offer' in header:
+        return 'credencegoodsBJS'
+    raise RuntimeError(f"{source}: cannot tell which app the export belongs to.")
+
+
+def source_index(indexes, field):
+    """Header index of ``field``; the pair's decisions, exported as
+    ``player.*`` columns until they moved to Group, fall back to the
+    ``group.*`` column of newer exports."""
+    if field in indexes or not field.startswith('player.'):
+        return indexes.get(field)
+    return indexes.get('group.' + field[len('player.'):])
+
+
+def iter_source_records(source, binary):
+    """Stream the canonical records of one source."""
+    with open_text(binary) as text:
+        header_line = text.readline()
+        delimiter = sniff_delimiter(header_line)
+        header = next(csv.reader([header_line], delimiter=delimiter))
+        header = [name.strip() for name in header]
+
+        # canonical column -> header index, per (app, round) block
+        common = {field: i for i, field in enumerate(header) if not WIDE_COLUMN.match(field)}
+        blocks = {}
+        for i, field in enumerate(header):
+            match = WIDE_COLUMN.match(field)
+            if match:
+                app, round_number, field = match.groups()
+                blocks.setdefault((app, int(round_number)), {})[field] = i
+        if blocks:
+            layouts = [(app, {**common, **fields}) for (app, _), fields in blocks.items()]
+        else:
+            layouts = [(app_of_source(source, header), common)]
+
+        plans = []
+        for app, indexes in layouts:
+            plan = [
+                (name, type_, source_index(indexes, field)) for name, type_, field in SCHEMA if field is not None
+            ]
+            plans.append((app, APP_TREATMENTS.get(app), indexes.get('player.id_in_group'), plan))
+
+        for row in csv.reader(text, delimiter=delimiter):
+            if not row:
+                continue
+            for app, treatment, id_in_group_index, plan in plans:
+                # a wide row has blocks for apps the participant never reached
+                if id_in_group_index is None or id_in_group_index >= len(row) or row[id_in_group_index] == '':
+                    continue
+                record = dict(source=source, app=app, treatment=treatment)
+                for name, type_, index in plan:
+                    value = row[index] if index is not None and index < len(row) else ''
+                    record[name] = convert(value, type_, source, name)
+                yield record
+
+
+def iter_records(data_dir=DATA_DIR):
+    """Stream the canonical records of every source in ``data_dir``."""
+    for source, _, opener in iter_sources(data_dir, digest=lambda path: None):
+        yield from iter_source_records(source, opener())
+
+
+# COLUMNAR CACHE
+
+class Table:
+    """Columns of equal length; a column is decoded to a list (None for
+    missing values) the first time it is read."""
+
+    def __init__(self, num_rows, types, encoded, strings):
+        self.num_rows = num_rows
+        self.types = types
+        self._encoded = encoded
+        self._strings = strings
+        self._decoded = {}
+
+    @property
+    def names(self):
+        return list(self.types)
+
+    def __len__(self):
+        return self.num_rows
+
+    def __getitem__(self, name):
+        column = self._decoded.get(name)
+        if column is None:
+            column = self._decoded[name] = decode_column(
+                self._encoded[name], self.types[name], self._strings.get(name)
+            )
+        return column
+
+    def rows(self, names=None):
+        """Iterate over the rows as dicts (of ``names``, default all columns)."""
+        names = names or self.names
+        columns = [self[name] for name in names]
+        for values in zip(*columns):
+            yield dict(zip(names, values))
+
+
+def encode_column(values, type_, strings=None):
+    """Return (array, string dictionary or None) for a column of values;
+    strings get the codes of ``strings`` (the dictionary of the rows the
+    column is appended to) and new strings the next ones."""
+    if type_ is str:
+        codes = {string: code for code, string in enumerate(strings or [])}
+        encoded = array('i', [-1 if v is None else codes.setdefault(v, len(codes)) for v in values])
+        return encoded, list(codes)
+    if type_ is float:
+        return array('d', [math.nan if v is None else v for v in values]), None
+    if type_ is bool:
+        return array('b', [-1 if v is None else int(v) for v in values]), None
+    return array('q', [INT_NULL if v is None else v for v in values]), None
+
+
+def decode_column(encoded, type_, strings):
+    if type_ is str:
+        return [None if code < 0 else strings[code] for code in encoded]
+    if type_ is float:
+        return [None if math.isnan(v) else v for v in encoded]
+    if type_ is bool:
+        return [None if v < 0 else bool(v) for v in encoded]
+    return [None if v == INT_NULL else v for v in encoded]
+
+
+def compact(encoded, strings, types, ranges):
+    """Keep the rows of ``ranges`` ([start, stop) pairs) of every column;
+    string dictionaries keep the strings still used."""
+    for name, values in encoded.items():
+        kept = array(values.typecode)
+        for start, stop in ranges:
+            kept.extend(values[start:stop])
+        if types[name] is str:
+            codes = {}
+            kept = array('i', [-1 if code < 0 else codes.setdefault(code, len(codes)) for code in kept])
+            strings[name] = [strings[name][code] for code in codes]
+        encoded[name] = kept
+
+
+def read_manifest(cache_dir):
+    """The cache's manifest, or None if there is no cache or it has another
+    layout."""
+    manifest_path = Path(cache_dir) / 'manifest.json'
+    if not manifest_path.exists():
+        return None
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    expected_columns = [[name, TYPE_NAMES[type_]] for name, type_, _ in SCHEMA]
+    if (
+        manifest.get('version') != CACHE_VERSION or manifest['columns'] != expected_columns
+        or manifest['byteorder'] != sys.byteorder
+    ):
+        return None
+    return manifest
+
+
+def read_cache(cache_dir, manifest):
+    """The Table of the cache ``manifest`` describes, or None if a column is
+    missing rows. Rows past the manifest's count (appended by an update
+    that did not get to write its manifest) are dropped."""
+    types = {name: TYPES_BY_NAME[type_name] for name, type_name in manifest['columns']}
+    encoded = {}
+    for name, type_ in types.items():
+        path = Path(cache_dir) / f'{name}.bin'
+        values = array(TYPECODES[type_])
+        if path.exists():
+            values.frombytes(path.read_bytes())
+        if len(values) < manifest['rows']:
+            return None
+        del values[manifest['rows']:]
+        encoded[name] = values
+    return Table(manifest['rows'], types, encoded, manifest['strings'])
+
+
+def update(data_dir=DATA_DIR, cache_dir=None, refresh=False):
+    """Bring the cache up to date with ``data_dir``; return the Table and
+    the names of the sources parsed.
+
+    The manifest keys every source by its content (see :func:`iter_sources`).
+    The rows of unchanged sources are kept as they are; those of sources
+    that changed or disappeared are dropped from the arrays, and the new or
+    changed sources alone are parsed and appended. A CSV is hashed again
+    only when its size or mtime changed. ``refresh`` parses everything.
+    """
+    data_dir = Path(data_dir)
+    cache_dir = Path(cache_dir) if cache_dir else data_dir / CACHE_DIR_NAME
+    manifest = None if refresh else read_manifest(cache_dir)
+    table = read_cache(cache_dir, manifest) if manifest else None
+    if table is None:
+        manifest = dict(files={}, sources=[], strings={})
+
+    files = {}
+
+    def digest(path):
+        name = path.relative_to(data_dir).as_posix()
+        stat = path.stat()
+        known = manifest['files'].get(name)
+        if known is None or known[:2] != [stat.st_size, stat.st_mtime_ns]:
+            known = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+        files[name] = known
+        return known[2]
+
+    current = list(iter_sources(data_dir, digest))
+    keys = {name: key for name, key, _ in current}
+
+    # rows of the cached sources still current, in cache order
+    types = {name: type_ for name, type_, _ in SCHEMA}
+    sources, ranges, start = [], [], 0
+    for name, key, rows in manifest['sources']:
+        if keys.get(name) == key:
+            sources.append([name, key, rows])
+            ranges.append((start, start + rows))
+        start += rows
+    if table is None:
+        encoded = {name: array(TYPECODES[type_]) for name, type_ in types.items()}
+        strings = {}
+    else:
+        encoded, strings = table._encoded, dict(table._strings)
+    rewrite = table is None or len(sources) < len(manifest['sources'])
+    if rewrite and table is not None:
+        compact(encoded, strings, types, ranges)
+
+    kept = {name for name, _, _ in sources}
+    parsed = [(name, key, opener) for name, key, opener in current if name not in kept]
+    if not parsed and not rewrite and files == manifest['files']:
+        return table, []
+
+    columns = {name: [] for name in types}
+    for name, key, opener in parsed:
+        rows = 0
+        for record in iter_source_records(name, opener()):
+            for column, values in columns.items():
+                values.append(record[column])
+            rows += 1
+        sources.append([name, key, rows])
+    appended = {}
+    for name, values in columns.items():
+        appended[name], dictionary = encode_column(values, types[name], strings.get(name))
+        if dictionary is not None:
+            strings[name] = dictionary
+    num_rows = sum(rows for _, _, rows in sources)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = cache_dir / 'manifest.json'
+    if rewrite:
+        # a cache without manifest is rebuilt
+        manifest_path.unlink(missing_ok=True)
+    for name, values in encoded.items():
+        values.extend(appended[name])
+        if rewrite:
+            (cache_dir / f'{name}.bin').write_bytes(values.tobytes())
+        else:
+            with open(cache_dir / f'{name}.bin', 'ab') as f:
+                f.write(appended[name].tobytes())
+    manifest = dict(
+        version=CACHE_VERSION,
+        byteorder=sys.byteorder,
+        rows=num_rows,
+        columns=[[name, TYPE_NAMES[type_]] for name, type_ in types.items()],
+        strings=strings,
+        files=files,
+        sources=sources,
+    )
+    # written last: the rows of a cache are those its manifest counts
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+    return Table(num_rows, types, encoded, strings), [name for name, _, _ in parsed]
+
+
+def build(data_dir=DATA_DIR, cache_dir=None):
+    """Parse every source and write the cache; return the Table."""
+    return update(data_dir, cache_dir, refresh=True)[0]
+
+
+def load(data_dir=DATA_DIR, cache_dir=None, refresh=False):
+    """The canonical table of ``data_dir``: the cache, after parsing the
+    sources that are new or changed since it was written (everything with
+    ``refresh``)."""
+    return update(data_dir, cache_dir, refresh)[0]
+
+
+def main(data_dir=DATA_DIR):
+    started_at = time.perf_counter()
+    table, parsed = update(data_dir)
+    updated = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    table = load(data_dir)
+    table['source']
+    cached = time.perf_counter() - started_at
+
+    counts = {}
+    for source, app in zip(table['source'], table['app']):
+        counts[source, app] = counts.get((source, app), 0) + 1
+    for (source, app), count in sorted(counts.items()):
+        print(f'{source:<60}{app:<32}{count:>6}')
+    print()
+    print(
+        f'{len(table)} records, {len(parsed)} sources parsed in {updated * 1000:.0f} ms, '
+        f'loaded from the cache in {cached * 1000:.1f} ms'
+    )
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
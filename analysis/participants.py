@@ -0,0 +1,143 @@
+"""
+One record per participant, app and round across every export in ``data/``.
+
+The same session appears in several files (a morning export, the day's
+export, ``all_apps_wide``, the per-session files of ``sessions/``), and an
+export taken while the session ran has participants who had not finished
+(``participant._index_in_pages`` below ``_max_page_index``).
+:class:`ParticipantIndex` keeps, for each (session code, participant code,
+app, round), the most complete of the loader's records: the one whose
+participant got furthest in the pages (the latest export), then the one
+with the most fields set. Ties keep the first record loaded.
+
+The kept records are indexed by participant code: :meth:`history` returns
+a participant's records (game rounds in order, then the questionnaire) with
+a dict lookup, and :meth:`rows` joins every other record with its
+participant's ``demographics`` answers (``age``, ``gender``,
+``field_of_study``).
+
+Usage: ``python -m analysis.participants [data_dir] [participant_code]``
+prints the counts of the index, or one participant's history.
+"""
+import sys
+import time
+
+from .loader import APP_TREATMENTS, DATA_DIR, load
+
+KEY_COLUMNS = ['session_code', 'participant_code', 'app', 'round_number']
+DEMOGRAPHICS_APP = 'demographics'
+DEMOGRAPHICS_COLUMNS = ['age', 'gender', 'field_of_study']
+# apps of a history in session order: the games, other apps, the questionnaire
+APP_ORDER = {app: i for i, app in enumerate(app for app in APP_TREATMENTS if app != DEMOGRAPHICS_APP)}
+OTHER_APPS = len(APP_ORDER)
+APP_ORDER[DEMOGRAPHICS_APP] = OTHER_APPS + 1
+
+
+def completeness(table):
+    """Per record: (page index reached, number of fields set)."""
+    filled = [0] * len(table)
+    for name in table.names:
+        filled = [count + (value is not None) for count, value in zip(filled, table[name])]
+    return [(index if index is not None else -1, count) for index, count in zip(table['index_in_pages'], filled)]
+
+
+class ParticipantIndex:
+    """The deduplicated records of a loader Table, by participant."""
+
+    def __init__(self, table):
+        self.table = table
+        score = completeness(table)
+        best = {}
+        for i, key in enumerate(zip(*(table[name] for name in KEY_COLUMNS))):
+            if key[1] is None:
+                continue
+            kept = best.get(key)
+            if kept is None or score[i] > score[kept]:
+                best[key] = i
+        self.records = sorted(best.values())
+        self.duplicates = len(table) - len(self.records)
+
+        self._histories = {}
+        self._sessions = {}
+        self._demographics = {}
+        for (session_code, participant_code, app, round_number), i in sorted(
+            best.items(), key=lambda item: (
+                item[0][0], item[0][1], APP_ORDER.get(item[0][2], OTHER_APPS), item[0][3] or 0,
+            ),
+        ):
+            self._histories.setdefault(participant_code, []).append(i)
+            participants = self._sessions.setdefault(session_code, [])
+            if not participants or participants[-1] != participant_code:
+                participants.append(participant_code)
+            if app == DEMOGRAPHICS_APP:
+                self._demographics[participant_code] = i
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, participant_code):
+        return participant_code in self._histories
+
+    def record(self, i):
+        return {name: self.table[name][i] for name in self.table.names}
+
+    @property
+    def sessions(self):
+        return list(self._sessions)
+
+    def participants(self, session_code):
+        """Codes of the participants of a session."""
+        return list(self._sessions.get(session_code, []))
+
+    def history(self, participant_code):
+        """The participant's records: per app in session order, by round."""
+        return [self.record(i) for i in self._histories.get(participant_code, [])]
+
+    def demographics(self, participant_code):
+        """The participant's questionnaire answers, or None."""
+        i = self._demographics.get(participant_code)
+        if i is None:
+            return None
+        return {name: self.table[name][i] for name in DEMOGRAPHICS_COLUMNS}
+
+    def rows(self, app=None):
+        """The kept records other than the questionnaire (of ``app`` if
+        given), in load order, with the demographics answers of their
+        participant."""
+        for i in self.records:
+            record = self.record(i)
+            if record['app'] == DEMOGRAPHICS_APP or app not in (None, record['app']):
+                continue
+            answers = self.demographics(record['participant_code'])
+            for name, value in (answers or {}).items():
+                if record[name] is None:
+                    record[name] = value
+            yield record
+
+
+def main(data_dir=DATA_DIR, participant_code=None):
+    table = load(data_dir)
+    started_at = time.perf_counter()
+    index = ParticipantIndex(table)
+    elapsed = time.perf_counter() - started_at
+
+    if participant_code is not None:
+        for record in index.history(participant_code):
+            print(
+                f'{record["session_code"]:<10}{record["app"]:<32}{record["round_number"]:>4}  '
+                f'{record["player_role"] or "":<3}{record["round_payoff"]!s:>8}  {record["source"]}'
+            )
+        print(index.demographics(participant_code))
+        return
+
+    codes = [code for session in index.sessions for code in index.participants(session)]
+    with_answers = sum(index.demographics(code) is not None for code in codes)
+    print(
+        f'{len(table)} records, {len(index)} kept ({index.duplicates} duplicates), '
+        f'{len(codes)} participants in {len(index.sessions)} sessions, '
+        f'{with_answers} with demographics, indexed in {elapsed * 1000:.0f} ms'
+    )
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
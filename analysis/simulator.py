@@ -0,0 +1,260 @@
+"""
+Monte-Carlo simulator of the credence goods market, for power analysis.
+
+The game is read from the apps themselves: their ``C`` constants and
+``PRICE_VECTORS``, the payoff rule (``credencegoods.payoffs.pair_payoffs``)
+and the automatic price of the exogenous and verifiability treatments
+(``credencegoods.payoffs.automatic_price``). Per treatment:
+
+- baseline: A picks a price vector, B interacts or not, the type is drawn
+  (1 or 2, one half each), A picks an action, then the price paid;
+- exogenous: the vector is assigned, balanced over the groups of the
+  session each round as ``creating_session`` does, and the price paid
+  follows from the type;
+- verifiability: A picks the vector, the price paid follows from the type.
+
+Behaviour is described by a :class:`Strategy` (probabilities). A batch of
+sessions is simulated column-wise: each decision is one list over all the
+pairs of the batch, and the payoffs come from a table of every possible
+outcome built with ``pair_payoffs``, so there is no per-pair branching on
+the rules. The bots (``tests.py`` of each app) check the oTree payoffs
+against :func:`round_payoffs`, which uses the same tables.
+
+Usage: ``python -m analysis.simulator [replications] [seed]`` prints the
+throughput and a power table for the default scenario.
+"""
+import importlib
+import math
+import random
+import statistics
+import sys
+import time
+from functools import lru_cache
+
+from credencegoods.payoffs import automatic_price, pair_payoffs
+
+TREATMENT_APPS = {
+    'baseline': 'credencegoodsBJS',
+    'exogenous': 'credencegoodsBJS_Exo',
+    'verifiability': 'credencegoodsBJS_verifiability',
+}
+PRICES_SET_BY_TYPE = {'exogenous', 'verifiability'}
+
+
+def constants(treatment):
+    if treatment not in TREATMENT_APPS:
+        raise RuntimeError(f"Unknown treatment {treatment!r}.")
+    return importlib.import_module(TREATMENT_APPS[treatment]).C
+
+
+def price_vectors(C):
+    """``[(price1, price2), ...]`` in the order of ``C.PRICE_VECTORS``."""
+    return [
+        (vector['price1'], vector['price2']) if isinstance(vector, dict) else tuple(vector)
+        for vector in C.PRICE_VECTORS
+    ]
+
+
+class Strategy:
+    """Players' behaviour, as probabilities.
+
+    ``price_weights``: A's relative weights for each price vector (ignored
+    in the exogenous treatment); ``interact``: probability that B interacts,
+    per price vector; ``action2``: probability that A picks action 2, per
+    type (``{1: overtreatment, 2: 1 - undertreatment}``); ``pay_price2``:
+    probability that A pays Prix 2, per type (baseline only).
+    """
+
+    def __init__(self, price_weights=(1, 1, 1), interact=(0.8, 0.8, 0.8), action2=None, pay_price2=None):
+        self.price_weights = tuple(price_weights)
+        self.interact = tuple(interact)
+        self.action2 = action2 or {1: 0.3, 2: 0.9}
+        self.pay_price2 = pay_price2 or {1: 0.3, 2: 0.6}
+
+
+@lru_cache(maxsize=None)
+def outcome_table(treatment):
+    """``{(interaction, type, action, price_paid): (A's payoff, B's payoff)}``
+    for every outcome reachable in the treatment."""
+    C = constants(treatment)
+    prices = {price for vector in price_vectors(C) for price in vector}
+    table = {(False, 0, None, None): pair_payoffs(C, False, None, None, None)[1:]}
+    for b_type in (1, 2):
+        for action in (1, 2):
+            for price_paid in prices:
+                table[True, b_type, action, price_paid] = pair_payoffs(
+                    C, True, b_type, action, price_paid
+                )[1:]
+    return table
+
+
+def round_payoffs(treatment, price1, price2, interaction, player_b_type, action, price_paid=None):
+    """(A's payoff, B's payoff) of one pair, as the simulator computes it.
+
+    In the exogenous and verifiability treatments the price paid follows
+    from the type and ``price_paid`` is ignored.
+    """
+    if not interaction:
+        return outcome_table(treatment)[False, 0, None, None]
+    if treatment in PRICES_SET_BY_TYPE:
+        price_paid = automatic_price(price1, price2, player_b_type)
+    return outcome_table(treatment)[True, player_b_type, action, price_paid]
+
+
+def simulate(treatment, strategy, num_sessions, markets_per_session, rng, num_rounds=None):
+    """Simulate a batch of sessions; return the pair-level columns.
+
+    Columns are lists with one entry per pair and round: session, market,
+    round, vector (index into PRICE_VECTORS), interaction, type (0 without
+    interaction), action and price_paid (None without interaction),
+    payoff_a, payoff_b.
+    """
+    C = constants(treatment)
+    vectors = price_vectors(C)
+    table = outcome_table(treatment)
+    num_rounds = num_rounds or C.NUM_ROUNDS
+    pairs_per_market = C.MARKET_SIZE // 2
+    pairs_per_round = markets_per_session * pairs_per_market
+    n = num_sessions * num_rounds * pairs_per_round
+    draw = rng.random
+
+    # pairs are laid out session by session, round by round, market by market
+    session = [i // (num_rounds * pairs_per_round) for i in range(n)]
+    round_number = [i // pairs_per_round % num_rounds + 1 for i in range(n)]
+    market = [i % pairs_per_round // pairs_per_market + 1 for i in range(n)]
+
+    if treatment == 'exogenous':
+        pool = list(range(len(vectors))) * math.ceil(pairs_per_round / len(vectors))
+        vector = []
+        for _ in range(num_sessions * num_rounds):
+            rng.shuffle(pool)
+            vector.extend(pool[:pairs_per_round])
+    else:
+        vector = rng.choices(range(len(vectors)), weights=strategy.price_weights, k=n)
+
+    interact = strategy.interact
+    interaction = [draw() < interact[v] for v in vector]
+    b_type = [2 if draw() < 0.5 else 1 for _ in range(n)]
+    action2 = strategy.action2
+    action = [2 if draw() < action2[t] else 1 for t in b_type]
+    if treatment in PRICES_SET_BY_TYPE:
+        price_paid = [vectors[v][t - 1] for v, t in zip(vector, b_type)]
+    else:
+        pay_price2 = strategy.pay_price2
+        price_paid = [vectors[v][1] if draw() < pay_price2[t] else vectors[v][0] for v, t in zip(vector, b_type)]
+
+    # no interaction: no type, action or price, as in the apps
+    b_type = [t if i else 0 for t, i in zip(b_type, interaction)]
+    action = [a if i else None for a, i in zip(action, interaction)]
+    price_paid = [p if i else None for p, i in zip(price_paid, interaction)]
+    payoffs = [table[key] for key in zip(interaction, b_type, action, price_paid)]
+
+    return dict(
+        session=session,
+        market=market,
+        round=round_number,
+        vector=vector,
+        interaction=interaction,
+        type=b_type,
+        action=action,
+        price_paid=price_paid,
+        payoff_a=[p[0] for p in payoffs],
+        payoff_b=[p[1] for p in payoffs],
+    )
+
+
+# per-pair values whose mean over a market is a market statistic
+# (None: the pair does not count, e.g. overtreatment without interaction)
+STATISTICS = {
+    'interaction': lambda c, i: float(c['interaction'][i]),
+    'payoff_a': lambda c, i: c['payoff_a'][i],
+    'payoff_b': lambda c, i: c['payoff_b'][i],
+    'overtreatment': lambda c, i: float(c['action'][i] == 2) if c['type'][i] == 1 else None,
+    'undertreatment': lambda c, i: float(c['action'][i] == 1) if c['type'][i] == 2 else None,
+}
+
+
+def market_means(columns, statistic):
+    """Mean of ``statistic`` per (session, market), over all its rounds;
+    markets are the independent observations of the experiment."""
+    value = STATISTICS[statistic]
+    sums = {}
+    for i, key in enumerate(zip(columns['session'], columns['market'])):
+        v = value(columns, i)
+        if v is not None:
+            total, count = sums.get(key, (0.0, 0))
+            sums[key] = total + v, count + 1
+    return [total / count for total, count in sums.values()]
+
+
+def rank_sum_p_value(xs, ys):
+    """Two-sided p-value of the Mann-Whitney U test (normal approximation
+    with tie correction)."""
+    pooled = sorted([(v, 0) for v in xs] + [(v, 1) for v in ys])
+    ranks = [0.0] * len(pooled)
+    ties = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    n1, n2 = len(xs), len(ys)
+    n = n1 + n2
+    u = sum(rank for rank, (_, group) in zip(ranks, pooled) if group == 0) - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return 2 * (1 - statistics.NormalDist().cdf(abs(z)))
+
+
+def power(scenario_a, scenario_b, statistic, markets_per_treatment, replications=200, alpha=0.05, seed=0):
+    """Share of simulated experiments in which the rank-sum test on the
+    market means of ``statistic`` rejects equality at ``alpha``.
+
+    A scenario is (treatment, strategy, markets per session); each
+    experiment runs ``markets_per_treatment`` markets of each scenario.
+    """
+    rng = random.Random(seed)
+    samples = []
+    for treatment, strategy, markets_per_session in (scenario_a, scenario_b):
+        num_sessions = math.ceil(markets_per_treatment / markets_per_session)
+        columns = simulate(treatment, strategy, num_sessions * replications, markets_per_session, rng)
+        means = market_means(columns, statistic)
+        per_experiment = num_sessions * markets_per_session
+        samples.append([
+            means[r * per_experiment:r * per_experiment + markets_per_treatment] for r in range(replications)
+        ])
+    rejected = sum(rank_sum_p_value(xs, ys) < alpha for xs, ys in zip(*samples))
+    return rejected / replications
+
+
+def main(replications=200, seed=0):
+    replications, seed = int(replications), int(seed)
+    strategy = Strategy()
+
+    for treatment in TREATMENT_APPS:
+        started_at = time.perf_counter()
+        columns = simulate(treatment, strategy, 10_000, 2, random.Random(seed))
+        elapsed = time.perf_counter() - started_at
+        market_rounds = len(columns['session']) // (constants(treatment).MARKET_SIZE // 2)
+        print(f'{treatment:<14}{market_rounds:>10} market-rounds in {elapsed:.2f} s '
+              f'({market_rounds / elapsed:,.0f}/s), mean payoff B {statistics.mean(columns["payoff_b"]):.2f}')
+
+    print()
+    print('Power (rank-sum test on market means, alpha 0.05), baseline vs verifiability, payoff_b:')
+    print(f'{"markets per treatment":<24}{"power":>8}')
+    for markets in (2, 4, 6, 8, 12, 16):
+        value = power(
+            ('baseline', strategy, 2), ('verifiability', strategy, 1), 'payoff_b', markets,
+            replications=replications, seed=seed,
+        )
+        print(f'{markets:<24}{value:>8.2f}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
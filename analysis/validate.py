@@ -0,0 +1,209 @@
+"""
+Replay the payoff rules over every exported row and report what disagrees.
+
+The stored ``round_payoff``, ``payoff`` and ``revenue`` of each player-round
+are recomputed from the pair's decisions with the rule of the apps (the
+revenue and cost table of ``credencegoods.payoffs``, which
+``Player.calculate_payoff`` became), and the price paid of the exogenous
+and verifiability treatments from the type (``automatic_price``). The totals FinalResults stores on the
+last round are checked against the round payoffs of the same participant
+in the same file: points = sum of the round payoffs, euros = points x
+``real_world_currency_per_point`` (rounded to the cent), payment = euros +
+participation fee.
+
+The pair's decisions come from the row itself, whatever the layout: the
+player's own fields, else the ``partner_*`` copies of older exports (A's row
+had B's interaction, B's row A's action and price paid). Older exogenous
+exports have no interaction on A's row; A interacted when it has an action.
+Rows without a round payoff (rounds never played) are skipped.
+
+Exports without ``real_world_currency_per_point`` (per-app CSVs) use the
+simplest fraction close to the session's median of euros / points (1/7, or
+1/4 in the pilot): a wrong rate for a whole session goes unnoticed there,
+a participant paid at another rate does not.
+
+The rows are read from the loader's columnar cache (``analysis.loader``)
+and checked column by column: each check is one pass over zipped columns,
+with revenue and cost looked up by (type, action).
+
+Usage: ``python -m analysis.validate [data_dir]`` prints the mismatches
+(source, participant code, round, column, stored, expected) and a summary.
+"""
+import statistics
+from fractions import Fraction
+import sys
+import time
+
+from credencegoods.payoffs import automatic_price, payoff_table
+
+from .loader import DATA_DIR, load
+from .simulator import PRICES_SET_BY_TYPE, constants
+
+COLUMNS = [
+    'source', 'treatment', 'session_code', 'participant_code', 'round_number', 'player_role',
+    'interaction', 'partner_interaction', 'player_b_type', 'action_chosen', 'partner_action',
+    'price1_offer', 'partner_price1', 'price2_offer', 'partner_price2', 'price_paid', 'partner_price_paid',
+    'revenue', 'round_payoff', 'payoff', 'total_payoff_points', 'total_payoff_euros',
+    'participation_fee', 'total_payment', 'real_world_currency_per_point',
+]
+# payoffs are exported as floats (points and euros)
+TOLERANCE = 0.005
+# the exported euros only pin the rate down to a fraction with a small denominator
+RATE_DENOMINATOR = 20
+
+
+def coalesce(first, second):
+    return [a if a is not None else b for a, b in zip(first, second)]
+
+
+def outcomes(treatment):
+    """The outside option and ``{(type, action): (revenue, cost)}``."""
+    C = constants(treatment)
+    return C.OUTSIDE_OPTION, payoff_table(C)
+
+
+def pair_columns(c):
+    """The pair's decisions on every row (None where the row cannot tell)."""
+    automatic = [treatment in PRICES_SET_BY_TYPE for treatment in c['treatment']]
+    action = coalesce(c['action_chosen'], c['partner_action'])
+    interaction = coalesce(c['interaction'], c['partner_interaction'])
+    interaction = [
+        (a is not None) if i is None and auto and role == 'A' else i
+        for i, a, auto, role in zip(interaction, action, automatic, c['player_role'])
+    ]
+    price1 = coalesce(c['price1_offer'], c['partner_price1'])
+    price2 = coalesce(c['price2_offer'], c['partner_price2'])
+    automatic_paid = [
+        automatic_price(p1, p2, b_type) if auto and i and None not in (p1, p2, b_type) else None
+        for auto, i, p1, p2, b_type in zip(automatic, interaction, price1, price2, c['player_b_type'])
+    ]
+    price_paid = [
+        paid if auto else own
+        for auto, paid, own in zip(automatic, automatic_paid, coalesce(c['price_paid'], c['partner_price_paid']))
+    ]
+    return dict(interaction=interaction, action=action, price_paid=price_paid, automatic_paid=automatic_paid)
+
+
+def expected_payoffs(c, pair):
+    """(revenue, round payoff) each row should have; None where unknown."""
+    revenues, payoffs = [], []
+    for treatment, role, interaction, b_type, action, price_paid in zip(
+        c['treatment'], c['player_role'], pair['interaction'], c['player_b_type'], pair['action'], pair['price_paid'],
+    ):
+        if treatment is None or interaction is None:
+            revenues.append(None)
+            payoffs.append(None)
+            continue
+        outside_option, table = outcomes(treatment)
+        if not interaction:
+            revenues.append(0)
+            payoffs.append(outside_option)
+            continue
+        if role == 'B':
+            revenues.append(None)
+            payoffs.append(price_paid)
+            continue
+        revenue, cost = table.get((b_type, action), (None, None))
+        revenues.append(revenue)
+        payoffs.append(revenue - cost - price_paid if None not in (revenue, price_paid) else None)
+    return revenues, payoffs
+
+
+def differs(stored, expected):
+    return stored is not None and expected is not None and abs(stored - expected) > TOLERANCE
+
+
+def session_rates(c):
+    """``{(source, session_code): points-to-euros rate}``: the exported rate,
+    else the median of euros / points over the session's participants, as
+    a fraction (the euros are rounded to the cent)."""
+    ratios = {}
+    for source, session, rate, points, euros in zip(
+        c['source'], c['session_code'], c['real_world_currency_per_point'],
+        c['total_payoff_points'], c['total_payoff_euros'],
+    ):
+        if rate is not None:
+            ratios[source, session] = [rate]
+        elif points and euros is not None:
+            ratios.setdefault((source, session), []).append(euros / points)
+    return {
+        key: float(Fraction(statistics.median(values)).limit_denominator(RATE_DENOMINATOR))
+        for key, values in ratios.items()
+    }
+
+
+def cumulative_payoffs(c):
+    """Sum of the stored round payoffs of the row's participant (in the
+    same source and app) up to the row's round."""
+    by_round = {}
+    keys = list(zip(c['source'], c['treatment'], c['participant_code']))
+    for key, round_number, payoff in zip(keys, c['round_number'], c['round_payoff']):
+        by_round.setdefault(key, {})[round_number] = payoff or 0
+    return [
+        sum(p for r, p in by_round[key].items() if r <= round_number) if round_number is not None else None
+        for key, round_number in zip(keys, c['round_number'])
+    ]
+
+
+def validate(table):
+    """Return the mismatches: dicts with source, session_code,
+    participant_code, round_number, column, stored and expected."""
+    game = [i for i, treatment in enumerate(table['treatment']) if treatment is not None]
+    c = {name: [table[name][i] for i in game] for name in COLUMNS}
+    played = [payoff is not None for payoff in c['round_payoff']]
+    pair = pair_columns(c)
+    revenues, payoffs = expected_payoffs(c, pair)
+
+    checks = [
+        ('round_payoff', c['round_payoff'], payoffs),
+        ('payoff', c['payoff'], c['round_payoff']),
+        ('revenue', [r if role == 'A' else None for r, role in zip(c['revenue'], c['player_role'])], revenues),
+        ('price_paid', [p if role == 'A' else None for p, role in zip(c['price_paid'], c['player_role'])],
+         pair['automatic_paid']),
+    ]
+
+    # FinalResults totals, on the rows where they were stored
+    rates = session_rates(c)
+    final = [bool(points) for points in c['total_payoff_points']]
+    checks += [
+        ('total_payoff_points', c['total_payoff_points'],
+         [total if f else None for total, f in zip(cumulative_payoffs(c), final)]),
+        ('total_payoff_euros', c['total_payoff_euros'], [
+            round(points * rates[source, session], 2) if f and (source, session) in rates else None
+            for points, source, session, f in zip(c['total_payoff_points'], c['source'], c['session_code'], final)
+        ]),
+        ('total_payment', c['total_payment'], [
+            euros + fee if f and None not in (euros, fee) else None
+            for euros, fee, f in zip(c['total_payoff_euros'], c['participation_fee'], final)
+        ]),
+    ]
+
+    mismatches = []
+    for column, stored, expected in checks:
+        for i, (s, e) in enumerate(zip(stored, expected)):
+            if played[i] and differs(s, e):
+                mismatches.append(dict(
+                    source=c['source'][i], session_code=c['session_code'][i],
+                    participant_code=c['participant_code'][i], round_number=c['round_number'][i],
+                    column=column, stored=s, expected=e,
+                ))
+    return mismatches, sum(played)
+
+
+def main(data_dir=DATA_DIR):
+    table = load(data_dir)
+    started_at = time.perf_counter()
+    mismatches, checked = validate(table)
+    elapsed = time.perf_counter() - started_at
+
+    for m in mismatches:
+        print(
+            f'{m["source"]}  {m["participant_code"] or "":<10}{m["round_number"]:>4}  '
+            f'{m["column"]:<22}{m["stored"]!s:>10}{m["expected"]!s:>10}'
+        )
+    print(f'{checked} player-rounds checked in {elapsed * 1000:.0f} ms, {len(mismatches)} mismatches')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
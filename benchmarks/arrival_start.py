@@ -0,0 +1,128 @@
+"""
+Simulate the time from a participant's arrival to the first decision of
+their market, by how markets start:
+
+- session: WaitForAllPlayers, every market waits for the whole session;
+- market: market_barrier=True, markets fixed by id wait for their 8 players;
+- arrival: arrival_markets=True, the first 8 participants ready form market 1,
+  the next 8 market 2, ... (see credencegoods.arrival).
+
+Usage (from the project root):
+
+    python benchmarks/arrival_start.py --harness [arrival_seconds] [server_url]
+    python benchmarks/arrival_start.py [replications] [seed]
+
+With ``--harness``, one session of each mode is played against a running
+server by the load test harness (benchmarks/load_test.py), its participants
+showing up one by one over ``arrival_seconds`` (odd ids first, see
+load_test.arrival_order), and we report the measured seconds from each
+participant's arrival to their first decision page, and when the first
+market started. The bots decide at once, so the measure is the start
+barrier alone.
+
+Otherwise the modes are simulated, as a supplement with more markets and
+realistic reading times (no server is involved). Participants show up
+uniformly over ARRIVAL_MINUTES ("15min avant de débuter pour remplir les
+cohortes" in the pilot notes) in an order unrelated to their id, then read
+the instructions and answer the quiz for a time drawn as in
+barrier_simulation.py.
+"""
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import load_test  # noqa: E402
+from barrier_simulation import MARKET_SIZE, SPEED_SIGMA, STRAGGLER_FACTOR, STRAGGLER_SHARE, think  # noqa: E402
+
+ARRIVAL_MINUTES = 15
+MARKET_COUNTS = [1, 2, 4, 8]
+MODES = ['session', 'market', 'arrival']
+# mode -> (session config, config fields) of the sessions played with --harness
+HARNESS_MODES = dict(
+    session=('credencegoods_baseline', {}),
+    market=('credencegoods_baseline', dict(market_barrier=True)),
+    arrival=('credencegoods_baseline_arrival', {}),
+)
+ARRIVAL_SECONDS = 120
+
+
+def simulate(num_markets, seed):
+    """Return {mode: (mean minutes from arrival to the first decision,
+    minutes until the first market starts)} for one session."""
+    rng = random.Random(seed)
+    size = num_markets * MARKET_SIZE
+    shows_up = [rng.uniform(0, ARRIVAL_MINUTES * 60) for _ in range(size)]
+    speed = [
+        rng.lognormvariate(0, SPEED_SIGMA) * (STRAGGLER_FACTOR if rng.random() < STRAGGLER_SHARE else 1)
+        for _ in range(size)
+    ]
+    ready = [shows_up[p] + think(rng, 'instructions', speed[p]) for p in range(size)]
+
+    by_id = [list(range(m * MARKET_SIZE, (m + 1) * MARKET_SIZE)) for m in range(num_markets)]
+    by_arrival = sorted(range(size), key=ready.__getitem__)
+    markets = dict(
+        session=[list(range(size))],
+        market=by_id,
+        arrival=[by_arrival[m * MARKET_SIZE:(m + 1) * MARKET_SIZE] for m in range(num_markets)],
+    )
+    results = {}
+    for mode, groups in markets.items():
+        start = {}
+        for group in groups:
+            released = max(ready[p] for p in group)
+            start.update((p, released) for p in group)
+        results[mode] = (
+            statistics.mean(start[p] - shows_up[p] for p in range(size)) / 60,
+            min(start.values()) / 60,
+        )
+    return results
+
+
+def measure(arrival_seconds=ARRIVAL_SECONDS, server_url='http://localhost:8000'):
+    rows = []
+    for mode, (config_name, config_fields) in HARNESS_MODES.items():
+        results, _ = load_test.run(config_name, 1, server_url, config_fields, arrival_seconds)
+        first_decisions = [pair for _, _, pairs in results for pair in pairs]
+        waits = [wait for _, wait in first_decisions]
+        rows.append((
+            mode, config_name, statistics.mean(waits), load_test.percentile(waits, 50), max(waits),
+            min(arrived + wait for arrived, wait in first_decisions),
+        ))
+
+    print(f'one session per mode against {server_url}, arrivals over {arrival_seconds:g} s; seconds')
+    print(f'{"mode":<10}{"config":<32}{"arrival -> first decision":>27}{"first market":>14}')
+    print(f'{"":<42}{"mean":>9}{"p50":>9}{"max":>9}{"starts":>14}')
+    for mode, config_name, mean, p50, longest, first_start in rows:
+        print(f'{mode:<10}{config_name:<32}{mean:>9.1f}{p50:>9.1f}{longest:>9.1f}{first_start:>14.1f}')
+
+
+def main(replications=500, seed=1):
+    print(
+        f'{MARKET_SIZE} players per market, arrivals over {ARRIVAL_MINUTES} min, {replications} sessions per row; '
+        f'minutes (mean over sessions)'
+    )
+    print(f'{"":>8}{"arrival -> first decision":>30}{"first market starts":>30}')
+    print(f'{"markets":>8}' + ''.join(f'{mode:>10}' for mode in MODES) * 2)
+    for num_markets in MARKET_COUNTS:
+        runs = [simulate(num_markets, f'{seed}-{num_markets}-{r}') for r in range(replications)]
+        waits = [statistics.mean(run[mode][0] for run in runs) for mode in MODES]
+        firsts = [statistics.mean(run[mode][1] for run in runs) for mode in MODES]
+        print(f'{num_markets:>8}' + ''.join(f'{value:>10.1f}' for value in waits + firsts))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--harness']:
+        args = args[1:]
+        measure(
+            float(args[0]) if args else ARRIVAL_SECONDS,
+            args[1] if len(args) > 1 else 'http://localhost:8000',
+        )
+    else:
+        main(
+            int(args[0]) if args else 500,
+            int(args[1]) if len(args) > 1 else 1,
+        )
@@ -0,0 +1,127 @@
+"""
+Simulate session wall-clock time with a session-wide round barrier
+(wait_for_all_groups, the default) versus the per-market barrier
+(session config market_barrier=True, see credencegoods.barrier).
+
+Usage (from the project root):
+
+    python benchmarks/barrier_simulation.py [replications] [seed]
+
+No server is involved: each participant gets a speed factor (log-normal,
+plus a few stragglers who are STRAGGLER_FACTOR times slower, like the
+"très très lente" participants in the session notes) and every decision a
+noisy think time around THINK_SECONDS. A round of a pair runs
+PriceOffer -> InteractionDecision -> ActionChoice -> PricePayment, then each
+player reads RoundResults and reaches the barrier. The next round starts when
+the barrier releases: once the whole session arrived, or once the player's
+market arrived.
+"""
+import random
+import statistics
+import sys
+
+# as in credencegoodsBJS.C
+MARKET_SIZE = 8
+NUM_ROUNDS = 16
+INTERACTION_RATE = 0.8
+
+# median think time per page, in seconds
+THINK_SECONDS = dict(
+    instructions=240,
+    PriceOffer=12,
+    InteractionDecision=8,
+    ActionChoice=10,
+    PricePayment=6,
+    RoundResults=8,
+)
+THINK_NOISE = 0.5  # sigma of the log-normal noise per decision
+SPEED_SIGMA = 0.3  # sigma of the log-normal speed factor per participant
+STRAGGLER_SHARE = 1 / 16
+STRAGGLER_FACTOR = 3
+
+MARKET_COUNTS = [1, 2, 4, 8, 16]
+
+
+def think(rng, page, speed):
+    return THINK_SECONDS[page] * speed * rng.lognormvariate(0, THINK_NOISE)
+
+
+def simulate(num_markets, scope, seed):
+    """Return (session wall-clock, mean market finish, mean seconds a
+    participant spent waiting at barriers) for one session."""
+    rng = random.Random(seed)
+    size = num_markets * MARKET_SIZE
+    speed = [
+        rng.lognormvariate(0, SPEED_SIGMA) * (STRAGGLER_FACTOR if rng.random() < STRAGGLER_SHARE else 1)
+        for _ in range(size)
+    ]
+    markets = [list(range(m * MARKET_SIZE, (m + 1) * MARKET_SIZE)) for m in range(num_markets)]
+    arrived = [think(rng, 'instructions', speed[p]) for p in range(size)]
+    waited = 0.0
+
+    for round_number in range(NUM_ROUNDS + 1):
+        # release the barrier (round 0 is the barrier after the instructions)
+        if scope == 'session':
+            release = {p: max(arrived) for p in range(size)}
+        else:
+            release = {}
+            for market in markets:
+                market_release = max(arrived[p] for p in market)
+                release.update((p, market_release) for p in market)
+        waited += sum(release[p] - arrived[p] for p in range(size))
+        if round_number == NUM_ROUNDS:
+            break
+
+        for market in markets:
+            half = MARKET_SIZE // 2
+            buyers = market[:half]
+            sellers = market[half:]
+            rng.shuffle(sellers)
+            for buyer, seller in zip(buyers, sellers):
+                t = release[buyer]
+                t += think(rng, 'PriceOffer', speed[buyer])
+                t = max(t, release[seller]) + think(rng, 'InteractionDecision', speed[seller])
+                if rng.random() < INTERACTION_RATE:
+                    t += think(rng, 'ActionChoice', speed[buyer])
+                    t += think(rng, 'PricePayment', speed[buyer])
+                for player in (buyer, seller):
+                    arrived[player] = t + think(rng, 'RoundResults', speed[player])
+
+    market_finish = [max(arrived[p] for p in market) for market in markets]
+    return max(market_finish), statistics.mean(market_finish), waited / size
+
+
+def main(replications=200, seed=1):
+    print(
+        f'{MARKET_SIZE} players per market, {NUM_ROUNDS} rounds, {replications} sessions per row; '
+        f'minutes (mean over sessions)'
+    )
+    print(
+        f'{"markets":>8}{"session":>10}{"market":>10}{"gain":>8}'
+        f'{"market end":>12}{"wait/player":>13}{"wait/player":>13}'
+    )
+    print(f'{"":>8}{"barrier":>10}{"barrier":>10}{"":>8}{"(market)":>12}{"(session)":>13}{"(market)":>13}')
+    for num_markets in MARKET_COUNTS:
+        results = {scope: [] for scope in ('session', 'market')}
+        for replication in range(replications):
+            for scope in results:
+                # same seed for both scopes: same participants and think times
+                results[scope].append(simulate(num_markets, scope, f'{seed}-{num_markets}-{replication}'))
+        session_total = statistics.mean(r[0] for r in results['session']) / 60
+        market_total = statistics.mean(r[0] for r in results['market']) / 60
+        market_end = statistics.mean(r[1] for r in results['market']) / 60
+        session_wait = statistics.mean(r[2] for r in results['session']) / 60
+        market_wait = statistics.mean(r[2] for r in results['market']) / 60
+        print(
+            f'{num_markets:>8}{session_total:>10.1f}{market_total:>10.1f}'
+            f'{(1 - market_total / session_total):>8.0%}{market_end:>12.1f}'
+            f'{session_wait:>13.1f}{market_wait:>13.1f}'
+        )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if args else 200,
+        int(args[1]) if len(args) > 1 else 1,
+    )
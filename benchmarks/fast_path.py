@@ -0,0 +1,164 @@
+"""
+Measure what the fast path (session config fast_path) saves per round.
+
+Usage (from the project root, with a server running as described in
+benchmarks/load_test.py):
+
+    python benchmarks/fast_path.py [interaction rates, e.g. 0.85,0.9] [num_sessions] [server_url]
+    python benchmarks/fast_path.py --replay [interaction rates] [num_participants]
+
+Each treatment is played with the load test harness (load_test.run: the
+tests.py bots over HTTP, sessions created through the REST API), with the
+fast path off and on, while player B interacts in the given share of the
+pair-rounds (session config bot_interaction_rate, drawn per pair and round
+from the session's stream). The default rates bracket the pilot sessions,
+where B interacted in 86% (baseline) and 91% (exogenous) of the rounds.
+We report, per participant and round, the requests, the wait page loads
+and the time spent waiting for the server, plus the p50/p95 of the page
+submits and the session duration.
+
+With ``--replay``, the treatments are instead replayed in-process with
+query_counts.run (no server): the wait pages shown, the barrier releases
+(after_all_players_arrive calls, per participant), the queries and the
+server time per participant and round, plus the estimated time saved:
+every page skipped spares a POST and a GET (two round trips of rtt_ms).
+"""
+import importlib
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import load_test  # noqa: E402
+
+CONFIGS = ['credencegoods_baseline', 'credencegoods_exogenous', 'credencegoods_verifiability']
+RATES = [0.85, 0.9]
+RTT_MS = 50.0
+
+
+def num_rounds(config_name):
+    import otree.session
+
+    config = otree.session.SESSION_CONFIGS_DICT[config_name]
+    module = importlib.import_module(config['app_sequence'][0])
+    return config['num_demo_participants'], module.C.NUM_ROUNDS
+
+
+def is_wait_page(page):
+    return page.split('.')[-1].startswith('WaitFor')
+
+
+def summarize_run(results, num_participants, rounds):
+    per = len(results) * num_participants * rounds
+    timings = [timing for session_timings, _, _ in results for timing in session_timings]
+    submits = [elapsed * 1000 for _, kind, elapsed in timings if kind == 'submit']
+    return dict(
+        requests=len(timings) / per,
+        waits=sum(kind == 'load' and is_wait_page(page) for page, kind, _ in timings) / per,
+        server_ms=sum(elapsed for _, _, elapsed in timings) * 1000 / per,
+        p50=load_test.percentile(submits, 50),
+        p95=load_test.percentile(submits, 95),
+        duration=statistics.mean(duration for _, duration, _ in results),
+    )
+
+
+def main(rates=RATES, num_sessions=2, server_url='http://localhost:8000'):
+    from otree.main import setup
+
+    setup()
+    rows = []
+    for config_name in CONFIGS:
+        num_participants, rounds = num_rounds(config_name)
+        for rate in rates:
+            off, on = (
+                summarize_run(
+                    load_test.run(
+                        config_name, num_sessions, server_url,
+                        dict(fast_path=fast, bot_interaction_rate=rate),
+                    )[0],
+                    num_participants, rounds,
+                )
+                for fast in (False, True)
+            )
+            rows.append((config_name, rate, off, on))
+
+    print(f'{num_sessions} concurrent sessions against {server_url}')
+    print('per participant and round (fast path off -> on), submit latency and session duration')
+    print(f'{"config":<30}{"rate":>6}{"requests":>16}{"wait loads":>16}{"server ms":>18}'
+          f'{"submit p50":>16}{"submit p95":>16}{"session s":>16}')
+    for config_name, rate, off, on in rows:
+        print(
+            f'{config_name:<30}{rate:>6.0%}'
+            f'{off["requests"]:>8.2f}{on["requests"]:>8.2f}{off["waits"]:>8.2f}{on["waits"]:>8.2f}'
+            f'{off["server_ms"]:>9.1f}{on["server_ms"]:>9.1f}{off["p50"]:>8.1f}{on["p50"]:>8.1f}'
+            f'{off["p95"]:>8.1f}{on["p95"]:>8.1f}{off["duration"]:>8.1f}{on["duration"]:>8.1f}'
+        )
+
+
+def interaction_at(rate):
+    def interacts(player):
+        return random.Random(f'{player.id_in_subsession}-{player.round_number}').random() < rate
+    return interacts
+
+
+def summarize(module, stats, num_participants):
+    from query_counts import WaitPage
+
+    per = num_participants * module.C.NUM_ROUNDS
+    waits = [page.__name__ for page in module.page_sequence if issubclass(page, WaitPage)]
+    return dict(
+        shown=sum(s['shown'] for s in stats.values()) / per,
+        waits=sum(stats[name]['shown'] for name in waits) / per,
+        releases=sum(s['releases'] for s in stats.values()) / per,
+        queries=sum(s['queries'] for s in stats.values()) / per,
+        server_ms=sum(s['seconds'] for s in stats.values()) * 1000 / per,
+    )
+
+
+def replay(rates=RATES, num_participants=None):
+    # in-memory database: imported here so that the harness runs above
+    # keep the server's DATABASE_URL
+    import query_counts
+
+    rows = []
+    for config_name in CONFIGS:
+        config = query_counts.otree.session.SESSION_CONFIGS_DICT[config_name]
+        participants = num_participants or config['num_demo_participants']
+        module = importlib.import_module(config['app_sequence'][0])
+        for rate in rates:
+            query_counts.DECISIONS['interaction'] = interaction_at(rate)
+            off, on = (
+                summarize(module, query_counts.run(config_name, participants, quiet=True, fast_path=fast), participants)
+                for fast in (False, True)
+            )
+            rows.append((config_name, rate, off, on))
+
+    print(f'per participant and round (fast path off -> on), rtt = {RTT_MS:g} ms')
+    print(f'{"config":<30}{"rate":>6}{"wait pages":>16}{"releases":>16}{"queries":>18}'
+          f'{"server ms":>16}{"saved ms":>10}')
+    for config_name, rate, off, on in rows:
+        saved = (off['shown'] - on['shown']) * 2 * RTT_MS + off['server_ms'] - on['server_ms']
+        print(
+            f'{config_name:<30}{rate:>6.0%}'
+            f'{off["waits"]:>8.2f}{on["waits"]:>8.2f}{off["releases"]:>8.2f}{on["releases"]:>8.2f}'
+            f'{off["queries"]:>9.1f}{on["queries"]:>9.1f}{off["server_ms"]:>8.2f}{on["server_ms"]:>8.2f}'
+            f'{saved:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--replay']:
+        args = args[1:]
+        replay(
+            [float(rate) for rate in args[0].split(',')] if args else RATES,
+            int(args[1]) if len(args) > 1 else None,
+        )
+    else:
+        main(
+            [float(rate) for rate in args[0].split(',')] if args else RATES,
+            int(args[1]) if len(args) > 1 else 2,
+            args[2] if len(args) > 2 else 'http://localhost:8000',
+        )
@@ -0,0 +1,67 @@
+"""
+Compare the minimal-repeat matching schedule with independent shuffles.
+
+Usage (from the project root):
+
+    python benchmarks/matching_schedule.py [num_rounds] [market sizes, e.g. 8,40,200,1000]
+
+For one market of each size, both schemes of credencegoods.draws are built
+for num_rounds (default 16) rounds, and we report the time to build the
+schedule (and, for the Latin schedule, to verify it with
+credencegoods.schedule.verify_schedule), the most times an A-B pair meets,
+the share of pairs that never meet, and the encounters repeated back to
+back.
+"""
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from credencegoods.draws import precompute_draws  # noqa: E402
+from credencegoods.schedule import max_repeats, verify_schedule  # noqa: E402
+
+SIZES = [8, 40, 200, 1000]
+
+
+def repeat_stats(round_matrices, num_pairs):
+    encounters = Counter()
+    back_to_back = 0
+    previous = set()
+    for round_no in sorted(round_matrices):
+        current = {tuple(pair) for pair in round_matrices[round_no]}
+        back_to_back += len(current & previous)
+        encounters.update(current)
+        previous = current
+    never = 1 - len(encounters) / num_pairs ** 2
+    return max(encounters.values()), never, back_to_back
+
+
+def main(num_rounds=16, sizes=SIZES):
+    print(f'{num_rounds} rounds, one market')
+    print(f'{"players":>8}{"matching":>10}{"build ms":>10}{"verify ms":>11}'
+          f'{"max meets":>11}{"bound":>7}{"never met":>11}{"back to back":>14}')
+    for size in sizes:
+        half = size // 2
+        markets = {1: (list(range(1, half + 1)), list(range(half + 1, size + 1)))}
+        for matching in ('latin', 'random'):
+            started_at = time.perf_counter()
+            round_matrices = precompute_draws('benchmark', markets, num_rounds, matching=matching)['round_matrices']
+            built = time.perf_counter() - started_at
+            verify = ''
+            if matching == 'latin':
+                started_at = time.perf_counter()
+                verify_schedule(round_matrices, markets)
+                verify = f'{(time.perf_counter() - started_at) * 1000:.1f}'
+            most, never, back_to_back = repeat_stats(round_matrices, half)
+            print(f'{size:>8}{matching:>10}{built * 1000:>10.1f}{verify:>11}'
+                  f'{most:>11}{max_repeats(half, num_rounds):>7}{never:>11.0%}{back_to_back:>14}')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if args else 16,
+        [int(size) for size in args[1].split(',')] if len(args) > 1 else SIZES,
+    )
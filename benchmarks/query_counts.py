@@ -0,0 +1,284 @@
+"""
+Count the SQL queries (and time) spent in each page of a game app.
+
+Usage (from the project root):
+
+    python benchmarks/query_counts.py credencegoods_baseline [num_participants]
+
+A session is created in an in-memory database and its page_sequence is
+replayed in-process for every round. Each page visit gets a fresh DB session
+with the participant and player already loaded, like an oTree request does,
+so the numbers are the queries caused by the app's own hooks
+(is_displayed, vars_for_template, before_next_page, after_all_players_arrive).
+Form fields are filled from DECISIONS.
+
+Pages with a live_method (LiveRound, ControlQuiz) are shown to everyone
+first, then each group sends the page's LIVE_MESSAGES in order, then the
+page is submitted. The
+"shown" column counts page loads (HTTP transitions), "messages" counts live
+messages.
+"""
+import importlib
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+os.chdir(PROJECT_ROOT)
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('OTREE_IN_MEMORY', '1')
+
+from otree.main import setup  # noqa: E402
+
+setup()
+
+from sqlalchemy import event  # noqa: E402
+from otree.api import WaitPage  # noqa: E402
+from otree.database import db, engine  # noqa: E402
+import otree.session  # noqa: E402
+
+
+DECISIONS = dict(
+    cq_q1='B',
+    cq_q2='A',
+    cq_q3='C',
+    cq_q4='A',
+    price_choice='2-7',
+    interaction=True,
+    action_chosen=2,
+    price_paid=lambda player: player.price2_offer,
+)
+
+# (sender role, field) for one group on each live page; the message
+# carries the field's value from DECISIONS
+LIVE_MESSAGES = dict(
+    LiveRound=[
+        ('A', 'price_choice'),
+        ('B', 'interaction'),
+        ('A', 'action_chosen'),
+        ('A', 'price_paid'),
+    ],
+    # every answer checked once as it is picked
+    ControlQuiz=[(role, field) for role in 'AB' for field in ('cq_q1', 'cq_q2', 'cq_q3', 'cq_q4')],
+)
+LIVE_DATA = dict(
+    LiveRound=lambda field, value: dict(type=field, value=value),
+    ControlQuiz=lambda field, value: dict(question=field, answer=value),
+)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def user_hook(module, cls, name):
+    """Return the hook only if the app defines it (not oTree's default)."""
+    func = getattr(cls, name, None)
+    if func is None or getattr(func, '__module__', None) != module.__name__:
+        return None
+    return func
+
+
+def decision(field, player):
+    value = DECISIONS[field]
+    return value(player) if callable(value) else value
+
+
+def visit_page(module, page, player_pk, counter, submit=True):
+    """Play one page for one player; return (queries issued, seconds, shown).
+
+    With submit=False the page is only rendered (used for live pages, which
+    are submitted by submit_page once the live messages are exchanged).
+    """
+    db.new_session()
+    player = module.Player.objects_get(id=player_pk)
+    # oTree loads the participant and stamps it on every request
+    player.participant._current_page_name = page.__name__
+    start = counter.count
+    started_at = time.perf_counter()
+    is_displayed = user_hook(module, page, 'is_displayed')
+    shown = is_displayed is None or bool(is_displayed(player))
+    if shown:
+        vars_for_template = user_hook(module, page, 'vars_for_template')
+        if vars_for_template:
+            vars_for_template(player)
+        if submit:
+            _submit(module, page, player)
+    db.commit()
+    used = counter.count - start, time.perf_counter() - started_at, shown
+    db.close()
+    return used
+
+
+def _submit(module, page, player):
+    form_target = player.group if getattr(page, 'form_model', None) == 'group' else player
+    for field in getattr(page, 'form_fields', []):
+        setattr(form_target, field, decision(field, player))
+    error_message = user_hook(module, page, 'error_message')
+    if error_message and not getattr(page, 'form_fields', None):
+        # a page without form fields still runs error_message on submit
+        error = error_message(player, {})
+        if error:
+            raise RuntimeError(f'{page.__name__} refused submission: {error}')
+    before_next_page = user_hook(module, page, 'before_next_page')
+    if before_next_page:
+        before_next_page(player, timeout_happened=False)
+
+
+def submit_page(module, page, player_pk, counter):
+    """Submit a page that visit_page rendered with submit=False."""
+    db.new_session()
+    player = module.Player.objects_get(id=player_pk)
+    start = counter.count
+    started_at = time.perf_counter()
+    _submit(module, page, player)
+    db.commit()
+    used = counter.count - start, time.perf_counter() - started_at
+    db.close()
+    return used
+
+
+def send_live_messages(module, page, group_roles, counter):
+    """Send the page's LIVE_MESSAGES for every group; return (queries, seconds, messages).
+
+    group_roles maps group id to {role: player pk}.
+    """
+    queries = messages = 0
+    seconds = 0.0
+    for roles in group_roles.values():
+        for role, field in LIVE_MESSAGES[page.__name__]:
+            db.new_session()
+            player = module.Player.objects_get(id=roles[role])
+            start = counter.count
+            started_at = time.perf_counter()
+            sender = player.id_in_group
+            data = LIVE_DATA[page.__name__](field, decision(field, player))
+            replies = page.live_method(player, data)
+            if 'error' in replies.get(sender, {}):
+                raise RuntimeError(f'{page.__name__} refused {field}: {replies[sender]["error"]}')
+            db.commit()
+            queries += counter.count - start
+            seconds += time.perf_counter() - started_at
+            messages += 1
+            db.close()
+    return queries, seconds, messages
+
+
+def release_wait_page(module, page, session_id, round_number, counter, group_ids):
+    """Run after_all_players_arrive once per group in group_ids (the groups
+    shown the page), or once per subsession; return (queries, seconds,
+    releases)."""
+    after_all_players_arrive = user_hook(module, page, 'after_all_players_arrive')
+    if after_all_players_arrive is None:
+        return 0, 0.0, 0
+    db.new_session()
+    subsession = module.Subsession.objects_get(session_id=session_id, round_number=round_number)
+    start = counter.count
+    started_at = time.perf_counter()
+    if page.wait_for_all_groups:
+        after_all_players_arrive(subsession)
+        releases = 1
+    else:
+        releases = 0
+        for group in subsession.get_groups():
+            if group.id in group_ids:
+                after_all_players_arrive(group)
+                releases += 1
+    db.commit()
+    used = counter.count - start, time.perf_counter() - started_at, releases
+    db.close()
+    return used
+
+
+def run(session_config_name, num_participants=None, quiet=False, **config_fields):
+    """Replay every round of the session's game app and return the per-page
+    stats as {page name: dict(shown, messages, releases, queries, seconds)}.
+
+    config_fields override the session config (e.g. fast_path=False).
+    """
+    config = otree.session.SESSION_CONFIGS_DICT[session_config_name]
+    db.new_session()
+    session = otree.session.create_session(
+        session_config_name=session_config_name,
+        num_participants=num_participants or config['num_demo_participants'],
+        modified_session_config_fields=config_fields,
+    )
+    session_id = session.id
+    app_name = session.config['app_sequence'][0]
+    module = importlib.import_module(app_name)
+    db.commit()
+    db.close()
+
+    counter = QueryCounter()
+    stats = {
+        page.__name__: dict(visits=0, shown=0, messages=0, releases=0, queries=0, seconds=0.0)
+        for page in module.page_sequence
+    }
+    for round_number in range(1, module.C.NUM_ROUNDS + 1):
+        db.new_session()
+        players = module.Player.objects_filter(session_id=session_id, round_number=round_number)
+        player_pks = [p.id for p in players]
+        group_of = {p.id: p.group_id for p in players}
+        group_roles = defaultdict(dict)
+        for p in players:
+            group_roles[p.group_id][p.player_role] = p.id
+        db.close()
+        for page in module.page_sequence:
+            page_stats = stats[page.__name__]
+            live = bool(getattr(page, 'live_method', None))
+            shown_pks = []
+            for pk in player_pks:
+                used, elapsed, shown = visit_page(module, page, pk, counter, submit=not live)
+                page_stats['queries'] += used
+                page_stats['seconds'] += elapsed
+                page_stats['visits'] += 1
+                page_stats['shown'] += shown
+                if shown:
+                    shown_pks.append(pk)
+            if live and shown_pks:
+                used, elapsed, messages = send_live_messages(module, page, group_roles, counter)
+                page_stats['queries'] += used
+                page_stats['seconds'] += elapsed
+                page_stats['messages'] += messages
+                for pk in shown_pks:
+                    used, elapsed = submit_page(module, page, pk, counter)
+                    page_stats['queries'] += used
+                    page_stats['seconds'] += elapsed
+            if issubclass(page, WaitPage) and shown_pks:
+                used, elapsed, releases = release_wait_page(
+                    module, page, session_id, round_number, counter, {group_of[pk] for pk in shown_pks},
+                )
+                page_stats['queries'] += used
+                page_stats['seconds'] += elapsed
+                page_stats['releases'] += releases
+    if quiet:
+        return stats
+
+    print(f'{app_name} ({session_config_name}): {len(player_pks)} participants, {module.C.NUM_ROUNDS} rounds')
+    print(f'{"page":<24}{"shown":>8}{"messages":>10}{"queries":>10}{"per visit":>12}{"ms total":>12}')
+    for name, page_stats in stats.items():
+        print(
+            f'{name:<24}{page_stats["shown"]:>8}{page_stats["messages"]:>10}'
+            f'{page_stats["queries"]:>10}{page_stats["queries"] / page_stats["visits"]:>12.2f}'
+            f'{page_stats["seconds"] * 1000:>12.1f}'
+        )
+    totals = {key: sum(page_stats[key] for page_stats in stats.values()) for key in ('shown', 'messages', 'queries', 'seconds')}
+    print(
+        f'{"total":<24}{totals["shown"]:>8}{totals["messages"]:>10}{totals["queries"]:>10}'
+        f'{"":>12}{totals["seconds"] * 1000:>12.1f}'
+    )
+    return stats
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args:
+        sys.exit(__doc__)
+    run(args[0], int(args[1]) if len(args) > 1 else None)
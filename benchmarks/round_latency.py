@@ -0,0 +1,68 @@
+"""
+Compare the page-based round flows with the live round (LiveRound) flow.
+
+Usage (from the project root):
+
+    python benchmarks/round_latency.py [rtt_ms] [num_participants]
+
+The flows are replayed with query_counts.run (credencegoods_baseline,
+credencegoods_baseline_combined, with A's action and price paid on one
+page, and credencegoods_baseline_live). For each we report, per participant
+and round, the page loads (HTTP transitions), the live messages, the
+queries and the server time, plus an estimate of the latency seen by a participant:
+a page transition costs two round trips (POST, then GET of the next page),
+a live message one round trip, on top of the measured server time.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import query_counts  # noqa: E402
+
+FLOWS = [
+    ('pages', 'credencegoods_baseline'),
+    ('combined', 'credencegoods_baseline_combined'),
+    ('live', 'credencegoods_baseline_live'),
+]
+
+
+def summarize(stats, num_participants, num_rounds):
+    per = num_participants * num_rounds
+    shown = sum(s['shown'] for s in stats.values())
+    # a message is sent by one player but answered to both members of the pair
+    messages = sum(s['messages'] for s in stats.values())
+    return dict(
+        shown=shown / per,
+        messages=messages / per,
+        queries=sum(s['queries'] for s in stats.values()) / per,
+        server_ms=sum(s['seconds'] for s in stats.values()) * 1000 / per,
+    )
+
+
+def main(rtt_ms=50.0, num_participants=None):
+    rows = []
+    for label, config_name in FLOWS:
+        config = query_counts.otree.session.SESSION_CONFIGS_DICT[config_name]
+        participants = num_participants or config['num_demo_participants']
+        stats = query_counts.run(config_name, participants)
+        module = query_counts.importlib.import_module(config['app_sequence'][0])
+        print()
+        rows.append((label, summarize(stats, participants, module.C.NUM_ROUNDS)))
+
+    print(f'per participant and round, rtt = {rtt_ms:g} ms')
+    print(f'{"flow":<10}{"pages":>8}{"messages":>10}{"queries":>10}{"server ms":>12}{"est. ms":>10}')
+    for label, row in rows:
+        estimate = row['shown'] * 2 * rtt_ms + row['messages'] * rtt_ms + row['server_ms']
+        print(
+            f'{label:<10}{row["shown"]:>8.2f}{row["messages"]:>10.2f}{row["queries"]:>10.1f}'
+            f'{row["server_ms"]:>12.2f}{estimate:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(
+        float(args[0]) if args else 50.0,
+        int(args[1]) if len(args) > 1 else None,
+    )
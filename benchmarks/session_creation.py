@@ -0,0 +1,79 @@
+"""
+Time session creation against the number of participants.
+
+Usage (from the project root):
+
+    python benchmarks/session_creation.py [config ...] [--sizes 16,48,96,200,400]
+
+For each session config (default: one per treatment) and size, a session is
+created in the in-memory database with otree.session.create_session, as the
+admin's "create session" does, and we report the seconds and SQL queries
+spent, for the whole creation and for the apps' creating_session alone.
+Sizes must be multiples of the market size (8).
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import query_counts  # noqa: E402  (sets up oTree on the in-memory database)
+from query_counts import QueryCounter, db  # noqa: E402
+import otree.session  # noqa: E402
+
+CONFIGS = ['credencegoods_baseline', 'credencegoods_exogenous', 'credencegoods_verifiability']
+SIZES = [16, 48, 96, 200, 400]
+
+
+class CreatingSessionTimer:
+    """Accumulate the time and queries spent in run_creating_session_functions."""
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.queries = 0
+        self.seconds = 0.0
+        self._run = otree.session.run_creating_session_functions
+        otree.session.run_creating_session_functions = self
+
+    def __call__(self, *args, **kwargs):
+        start = self.counter.count
+        started_at = time.perf_counter()
+        try:
+            return self._run(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - started_at
+            self.queries += self.counter.count - start
+
+
+def create(config_name, num_participants, counter, timer):
+    """Create one session; return (seconds, queries) in total and in creating_session."""
+    db.new_session()
+    timer.queries, timer.seconds = 0, 0.0
+    start = counter.count
+    started_at = time.perf_counter()
+    otree.session.create_session(session_config_name=config_name, num_participants=num_participants)
+    db.commit()
+    elapsed = time.perf_counter() - started_at
+    db.close()
+    return elapsed, counter.count - start, timer.seconds, timer.queries
+
+
+def main(config_names, sizes):
+    counter = QueryCounter()
+    timer = CreatingSessionTimer(counter)
+    print(f'{"config":<30}{"participants":>14}{"total s":>10}{"queries":>10}'
+          f'{"creating_session s":>20}{"queries":>10}')
+    for config_name in config_names:
+        for size in sizes:
+            total, queries, seconds, session_queries = create(config_name, size, counter, timer)
+            print(f'{config_name:<30}{size:>14}{total:>10.2f}{queries:>10}{seconds:>20.2f}{session_queries:>10}')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sizes = SIZES
+    if '--sizes' in args:
+        i = args.index('--sizes')
+        sizes = [int(size) for size in args[i + 1].split(',')]
+        del args[i:i + 2]
+    main(args or CONFIGS, sizes)
@@ -0,0 +1,4 @@
+"""
+Helpers shared by the credence goods apps (baseline, exogenous prices and
+verifiability treatments).
+"""
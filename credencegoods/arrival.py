@@ -0,0 +1,105 @@
+"""
+Markets formed in order of arrival (session config ``arrival_markets``).
+
+Session creation assigns every round of every player (``credencegoods.assignment``)
+to a *seat*: the roles, pairs and partners of seat ``s`` are those of
+``id_in_subsession == s``, the first ``C.MARKET_SIZE`` seats form market 1,
+and so on. By default participant ``i`` sits in seat ``i``, so a market can
+only start once its participants, chosen by id, are all there.
+
+With ``arrival_markets=True``, round 1 shows :class:`ArrivalWaitPage` once a
+participant is ready to play. The ``k``-th participant to get there takes seat
+``k`` (:func:`take_seat`): the first 8 arrivals form market 1 and start
+right away, the next 8 market 2, and so on. Taking a seat swaps the
+assignments of every round with the participant who held it, who has not
+arrived yet (the seats before ``k`` are taken by earlier arrivals), and
+repoints the partners of both. The draws, the schedule and the Group rows
+stay keyed by seat, so nothing else changes; :func:`seat_of` recovers a
+player's seat from its role label.
+
+Rounds after the first should use the per-market round barrier, which is
+why ``arrival_markets`` implies ``market_barrier``
+(see ``credencegoods.barrier``).
+"""
+from .assignment import market_roles
+from .barrier import START_BARRIER, MarketWaitPage
+
+# the Player columns that place a player in a seat
+SEAT_FIELDS = ['group_id', 'id_in_group', 'matching_group_id', 'player_role', 'player_id_in_role', 'partner_pk']
+SEAT_VARS = ['matching_group_id', 'player_role', 'player_id_in_role']
+
+
+def arrival_markets(player):
+    """True when markets are formed in order of arrival."""
+    return player.session.config.get('arrival_markets', False)
+
+
+def seat_of(player, market_size):
+    """The seat of ``player`` (its ``id_in_subsession`` unless seats were
+    taken in order of arrival)."""
+    half_market = market_size // 2
+    position = int(player.player_id_in_role[1:]) - 1 + (half_market if player.player_role == 'B' else 0)
+    return (player.matching_group_id - 1) * market_size + position + 1
+
+
+def take_seat(player, market_size):
+    """Give ``player`` (round 1) the next free seat; idempotent."""
+    if (player.field_maybe_none('barrier_reached') or 0) >= START_BARRIER:
+        return
+    Player = type(player)
+    seated = Player.objects_filter(
+        Player.barrier_reached >= START_BARRIER,
+        session_id=player.session_id,
+        round_number=player.round_number,
+    ).count()
+    market_id, _, label = market_roles(player.session.num_participants, market_size)[seated]
+    holder = Player.objects_get(
+        session_id=player.session_id,
+        round_number=player.round_number,
+        matching_group_id=market_id,
+        player_id_in_role=label,
+    )
+    if holder.participant_id != player.participant_id:
+        swap_seats(Player, player.participant, holder.participant)
+
+
+def swap_seats(Player, participant, other):
+    """Exchange the seats of two participants in every round."""
+    rows = Player.objects_filter(
+        Player.participant_id.in_([participant.id, other.id]), session_id=participant.session_id,
+    )
+    by_round = {}
+    for row in rows:
+        by_round.setdefault(row.round_number, {})[row.participant_id] = row
+    swapped_pk = {}
+    for pair in by_round.values():
+        mine, theirs = pair[participant.id], pair[other.id]
+        swapped_pk[mine.id], swapped_pk[theirs.id] = theirs.id, mine.id
+        for field in SEAT_FIELDS:
+            mine_value, theirs_value = getattr(mine, field), getattr(theirs, field)
+            setattr(mine, field, theirs_value)
+            setattr(theirs, field, mine_value)
+
+    # the partners of both now sit with the other one (or with each other)
+    outside = [pk for pk in {row.partner_pk for row in rows} if pk not in swapped_pk]
+    partners = Player.objects_filter(Player.id.in_(outside)) if outside else []
+    for row in [*rows, *partners]:
+        row.partner_pk = swapped_pk.get(row.partner_pk, row.partner_pk)
+
+    participant_vars, other_vars = participant.vars, other.vars
+    for key in SEAT_VARS:
+        participant_vars[key], other_vars[key] = other_vars[key], participant_vars[key]
+
+
+class ArrivalWaitPage(MarketWaitPage):
+    """Take the next free seat, then wait for the rest of its market;
+    subclasses set ``market_size`` and ``is_displayed``."""
+    barrier = START_BARRIER
+    market_size = None
+    body_text = "Veuillez patienter : votre marché commencera dès que ses participants seront prêts."
+
+    def get(self):
+        # seated before oTree looks the market up
+        if self._is_displayed():
+            take_seat(self.player, self.market_size)
+        return super().get()
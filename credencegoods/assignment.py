@@ -0,0 +1,117 @@
+"""
+Session creation in one pass, for every round at once.
+
+oTree calls ``creating_session`` once per round. Done round by round, each
+call re-read ``participant.vars``, re-copied the roles onto every Player row
+and regrouped the round with ``set_group_matrix``, which deletes the round's
+groups and re-creates them with one commit per group.
+
+Instead, round 1 calls :func:`assign_all_rounds`. It computes the
+assignments of every round from the draws (``credencegoods.draws``) and
+writes them with one bulk UPDATE per table. Pair ``k`` of a round goes to
+the Group row oTree already created with ``id_in_subsession == k``, so no
+group is deleted or re-created. Later rounds only call :func:`check_assigned`.
+"""
+from sqlalchemy.orm import object_session
+
+from otree.database import db
+
+from .draws import matching_scheme, precompute_draws
+from .matching import build_partner_index
+from .schedule import verify_price_schedule, verify_schedule
+
+
+def market_roles(num_players, market_size):
+    """``[(matching_group_id, role, label)]`` for ``id_in_subsession`` 1 to
+    ``num_players``: the first half of each market are A1, A2, ..., the
+    second half B1, B2, ..."""
+    if num_players % market_size != 0:
+        raise RuntimeError(f"Session size {num_players} is not divisible by market size {market_size}.")
+    half_market = market_size // 2
+    roles = []
+    for idx in range(num_players):
+        position = idx % market_size
+        role = 'A' if position < half_market else 'B'
+        roles.append((idx // market_size + 1, role, f"{role}{position % half_market + 1}"))
+    return roles
+
+
+def assign_all_rounds(subsession, C, Player, Group, group_fields=None):
+    """Assign roles, pairs and partners of every round (call from round 1).
+
+    ``group_fields(session, round_number, group_id_in_subsession)``, if
+    given, returns the Group fields to set on each pair (e.g. exogenous
+    prices). Returns the session's draws.
+    """
+    session = subsession.session
+    participants = sorted(session.get_participants(), key=lambda p: p.id_in_session)
+    roles = market_roles(len(participants), C.MARKET_SIZE)
+
+    markets = {}
+    for id_in_subsession, (market_id, role, _) in enumerate(roles, start=1):
+        buyers, sellers = markets.setdefault(market_id, ([], []))
+        (buyers if role == 'A' else sellers).append(id_in_subsession)
+    num_price_vectors = len(C.PRICE_VECTORS) if group_fields else 0
+    matching = matching_scheme(session)
+    draws = precompute_draws(session.code, markets, C.NUM_ROUNDS, num_price_vectors, matching)
+    if matching == 'latin':
+        verify_schedule(draws['round_matrices'], markets)
+        if num_price_vectors:
+            verify_price_schedule(draws['round_matrices'], draws['price_vectors'], markets, num_price_vectors)
+    # only used to write partner_pk: the Player rows are the one record of partners
+    partner_index = build_partner_index(draws['round_matrices'], len(participants))
+    session.vars['draws'] = draws
+
+    for participant, (market_id, role, label) in zip(participants, roles):
+        participant.vars['matching_group_id'] = market_id
+        participant.vars['player_role'] = role
+        participant.vars['player_id_in_role'] = label
+
+    # primary keys only: the rows are written below without loading them
+    dbs = object_session(subsession)
+    id_in_session = {p.id: p.id_in_session for p in participants}
+    player_pks = {
+        (round_number, id_in_session[participant_id]): pk
+        for pk, round_number, participant_id in dbs.query(Player.id, Player.round_number, Player.participant_id)
+        .filter(Player.session_id == session.id)
+    }
+    group_pks = {
+        (round_number, id_in_subsession): pk
+        for pk, round_number, id_in_subsession in dbs.query(Group.id, Group.round_number, Group.id_in_subsession)
+        .filter(Group.session_id == session.id)
+    }
+
+    player_rows, group_rows = [], []
+    for round_number, pairs in draws['round_matrices'].items():
+        partners = partner_index[round_number]
+        for group_id_in_subsession, pair in enumerate(pairs, start=1):
+            group_pk = group_pks[round_number, group_id_in_subsession]
+            if group_fields:
+                group_rows.append(dict(id=group_pk, **group_fields(session, round_number, group_id_in_subsession)))
+            for id_in_group, id_in_subsession in enumerate(pair, start=1):
+                market_id, role, label = roles[id_in_subsession - 1]
+                player_rows.append(dict(
+                    id=player_pks[round_number, id_in_subsession],
+                    group_id=group_pk,
+                    id_in_group=id_in_group,
+                    matching_group_id=market_id,
+                    player_role=role,
+                    player_id_in_role=label,
+                    partner_pk=player_pks[round_number, partners[id_in_subsession - 1]],
+                ))
+
+    dbs.bulk_update_mappings(Player, player_rows)
+    if group_rows:
+        dbs.bulk_update_mappings(Group, group_rows)
+    # rows loaded before the bulk update are stale; the commit expires them
+    db.commit()
+    return draws
+
+
+def check_assigned(subsession):
+    """For rounds after the first: round 1 must have assigned every round."""
+    draws = subsession.session.vars.get('draws')
+    if not draws or subsession.round_number not in draws['round_matrices']:
+        raise RuntimeError(
+            f"Round {subsession.round_number} was not assigned in round 1 of session {subsession.session.code}."
+        )
@@ -0,0 +1,134 @@
+"""
+Round barrier scoped to one market (``matching_group_id``).
+
+A ``wait_for_all_groups`` wait page holds every market of the session until
+the slowest participant anywhere arrives, although players only ever meet
+inside their own market. With the session config ``market_barrier=True`` (or
+``arrival_markets=True``, see ``credencegoods.arrival``) the apps show a
+:class:`MarketWaitPage` instead, which only waits for the players of the
+player's market.
+
+:class:`MarketWaitPage` is one of oTree's own group wait pages whose group
+is widened to the market: oTree counts who has not reached the page among
+the market's participants (one query, under oTree's lock, when a player
+arrives), and once the last one arrives it marks the page completed for
+every pair of the market and notifies each pair's wait page channel. The
+waiting browsers hold oTree's wait page socket and are pushed the release;
+nothing polls. Barriers are pure synchronisation points (the session-wide
+wait pages they replace have no ``after_all_players_arrive``).
+
+Each player records the last barrier it reached this round in its
+``barrier_reached`` field (1 = start of the session, 2 = end of the round);
+arrival seats are counted with it.
+
+Widening the group means overriding oTree internals (private WaitPage
+methods and attributes, the completed-page model, the wait page channels),
+so requirements.txt pins the oTree minor version this was tested with, and
+the module refuses to import under an oTree lacking any of them
+(:func:`check_otree_internals`) rather than leave every market stuck on its
+round barrier.
+"""
+import inspect
+
+import otree
+import otree.channels.utils as channel_utils
+from otree.api import WaitPage
+from otree.database import db, dbq
+from otree.models import Participant
+from otree.models_concrete import CompletedGroupWaitPage
+
+from .timing import TimedWaitPage
+
+START_BARRIER = 1
+ROUND_BARRIER = 2
+
+
+def check_otree_internals():
+    """Raise RuntimeError if oTree lacks one of the internals MarketWaitPage
+    overrides or uses."""
+    missing = [
+        f'WaitPage.{name}' for name in ('_get_participants_for_this_waitpage', '_mark_completed_and_notify')
+        if not callable(getattr(WaitPage, name, None))
+    ]
+    # instance attributes, set for every page view
+    set_attributes = inspect.getsource(WaitPage.set_attributes)
+    missing += [
+        f'WaitPage.{name}' for name in ('_index_in_pages', '_session_pk')
+        if f'self.{name} =' not in set_attributes
+    ]
+    missing += [
+        f'CompletedGroupWaitPage.{name}' for name in ('page_index', 'session_id', 'group_id')
+        if not hasattr(CompletedGroupWaitPage, name)
+    ]
+    missing += [
+        f'otree.channels.utils.{name}' for name in ('sync_group_send', 'group_wait_page_name')
+        if not hasattr(channel_utils, name)
+    ]
+    if missing:
+        raise RuntimeError(
+            f"oTree {otree.__version__} lacks what the market barrier relies on: {', '.join(missing)}. "
+            f"Install the oTree version of requirements.txt."
+        )
+
+
+check_otree_internals()
+
+
+def market_barrier(player):
+    """True when the session waits per market instead of session-wide."""
+    config = player.session.config
+    return config.get('market_barrier', False) or config.get('arrival_markets', False)
+
+
+def reach_barrier(player, barrier):
+    if (player.field_maybe_none('barrier_reached') or 0) < barrier:
+        player.barrier_reached = barrier
+
+
+class MarketWaitPage(TimedWaitPage):
+    """Wait for the rest of the market; subclasses set ``is_displayed`` and
+    may set ``barrier``, ``title_text`` and ``body_text``.
+
+    Timings record it as a wait page scoped to the market (see
+    :mod:`credencegoods.timing`).
+    """
+    barrier = ROUND_BARRIER
+    title_text = "En attente"
+    body_text = "Veuillez patienter jusqu'à ce que tous les participants de votre marché soient prêts."
+    wait_scope = 'market'
+
+    def get(self):
+        if self._is_displayed():
+            reach_barrier(self.player, self.barrier)
+        return super().get()
+
+    def _market_filter(self):
+        Player = self.PlayerClass
+        player = self.player
+        return (
+            Player.session_id == player.session_id,
+            Player.round_number == player.round_number,
+            Player.matching_group_id == player.matching_group_id,
+        )
+
+    def _get_participants_for_this_waitpage(self, group_or_subsession):
+        # the market of the player, whatever pair oTree asks about
+        return dbq(self.PlayerClass).join(Participant).filter(*self._market_filter()).with_entities(Participant)
+
+    def _mark_completed_and_notify(self, group):
+        # oTree completes the player's own pair and marks the whole market's
+        # page completions (through _get_participants_for_this_waitpage)
+        super()._mark_completed_and_notify(group)
+        Player = self.PlayerClass
+        group_ids = {
+            group_id for group_id, in dbq(Player).filter(*self._market_filter()).with_entities(Player.group_id)
+        }
+        group_ids.discard(group.id)
+        for group_id in sorted(group_ids):
+            db.add(CompletedGroupWaitPage(page_index=self._index_in_pages, session_id=self._session_pk, group_id=group_id))
+            channel_utils.sync_group_send(
+                group=channel_utils.group_wait_page_name(
+                    session_id=self._session_pk, page_index=self._index_in_pages, group_id=group_id,
+                ),
+                data={'status': 'ready'},
+            )
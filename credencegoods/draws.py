@@ -0,0 +1,128 @@
+"""
+Every random draw of a session, precomputed from the session code.
+
+In round 1, ``creating_session`` computes the whole session at once and
+stores it in ``session.vars['draws']``:
+
+- ``round_matrices``: per round, the ``[buyer_id, seller_id]`` pairs (ids in
+  subsession). With the session config ``matching='random'`` (the default)
+  buyers and sellers are shuffled independently per market and round, as
+  in the sessions run before the schedule; with ``matching='latin'`` they
+  follow a minimal-repeat schedule per market (``credencegoods.schedule``);
+- ``b_types``: per round, one digit per group (in group order), the type
+  player B gets if the pair interacts;
+- ``price_vectors``: per round, one digit per group, the index into
+  ``C.PRICE_VECTORS`` (exogenous treatment only). With ``matching='latin'``
+  they follow a schedule balanced over groups, rounds and markets
+  (``credencegoods.schedule.balanced_price_schedule``); with
+  ``matching='random'`` every round's groups share a shuffled pool, as
+  before.
+
+Each purpose draws from its own stream, seeded with the session code and the
+purpose (:func:`stream`), so the same session code always gives the same
+session and adding a stream does not shift the others. The random
+matching and the price streams keep the seeds the apps used before, so
+earlier sessions can be replayed too. Wait pages only look the values up.
+"""
+import math
+import random
+
+from .schedule import balanced_price_schedule, latin_schedule
+
+MATCHINGS = ('latin', 'random')
+
+
+def stream(session_code, *key):
+    """Independent random stream of a session for one purpose."""
+    return random.Random('-'.join(str(part) for part in (session_code, *key)))
+
+
+def market_members(players, seat=None):
+    """``{matching_group_id: (buyer seats, seller seats)}`` in seat order.
+
+    ``seat(player)`` defaults to ``id_in_subsession``; pass
+    ``credencegoods.arrival.seat_of`` once seats are taken by arrival.
+    """
+    seat = seat or (lambda p: p.id_in_subsession)
+    markets = {}
+    for player in sorted(players, key=seat):
+        buyers, sellers = markets.setdefault(player.matching_group_id, ([], []))
+        (buyers if player.player_role == 'A' else sellers).append(seat(player))
+    return markets
+
+
+def matching_scheme(session):
+    """The session's matching scheme (session config ``matching``)."""
+    scheme = session.config.get('matching', 'random')
+    if scheme not in MATCHINGS:
+        raise RuntimeError(f"Unknown matching {scheme!r}, expected one of {MATCHINGS}.")
+    return scheme
+
+
+def precompute_draws(session_code, markets, num_rounds, num_price_vectors=0, matching='random'):
+    """Return the draws of a session (see the module docstring).
+
+    ``markets`` is :func:`market_members` of the round 1 players.
+    """
+    for market_id, (buyers, sellers) in markets.items():
+        if len(buyers) != len(sellers):
+            raise RuntimeError(
+                f"Market {market_id}: {len(buyers)} buyers vs {len(sellers)} sellers."
+            )
+    if matching == 'latin':
+        schedules = [
+            latin_schedule(buyers, sellers, num_rounds, stream(session_code, 'schedule', market_id))
+            for market_id, (buyers, sellers) in markets.items()
+        ]
+
+    round_matrices, b_types, price_vectors = {}, {}, {}
+    for round_no in range(1, num_rounds + 1):
+        pairs = []
+        if matching == 'latin':
+            for schedule in schedules:
+                pairs.extend(schedule[round_no])
+        else:
+            for market_id, (buyers, sellers) in markets.items():
+                rng = stream(session_code, market_id, round_no)
+                buyers, sellers = list(buyers), list(sellers)
+                rng.shuffle(buyers)
+                rng.shuffle(sellers)
+                pairs.extend([buyer_id, seller_id] for buyer_id, seller_id in zip(buyers, sellers))
+        round_matrices[round_no] = pairs
+
+        num_groups = len(pairs)
+        rng = stream(session_code, 'types', round_no)
+        b_types[round_no] = ''.join(rng.choice('12') for _ in range(num_groups))
+
+        if num_price_vectors and matching == 'random':
+            # every vector equally often (up to rounding) among the round's groups
+            pool = list(range(num_price_vectors)) * math.ceil(num_groups / num_price_vectors)
+            stream(session_code, 'prices', round_no).shuffle(pool)
+            price_vectors[round_no] = ''.join(str(index) for index in pool[:num_groups])
+
+    if num_price_vectors and matching == 'latin':
+        price_vectors = balanced_price_schedule(
+            markets, round_matrices, num_price_vectors, stream(session_code, 'price-schedule')
+        )
+
+    draws = dict(round_matrices=round_matrices, b_types=b_types)
+    if num_price_vectors:
+        draws['price_vectors'] = price_vectors
+    return draws
+
+
+def session_draws(session):
+    draws = session.vars.get('draws')
+    if not draws:
+        raise RuntimeError(f"Draws missing in session vars of session {session.code}.")
+    return draws
+
+
+def drawn_b_type(group):
+    """Player B's type for ``group`` this round (if the pair interacts)."""
+    return int(session_draws(group.session)['b_types'][group.round_number][group.id_in_subsession - 1])
+
+
+def drawn_price_vector(session, round_number, group_id_in_subsession):
+    """Index into ``C.PRICE_VECTORS`` of a group (exogenous treatment)."""
+    return int(session_draws(session)['price_vectors'][round_number][group_id_in_subsession - 1])
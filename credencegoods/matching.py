@@ -0,0 +1,38 @@
+"""
+Partner index built from the per-round pairing schedule.
+
+``round_matrices`` (stored in ``session.vars``) lists, for every round, the
+``[buyer_id, seller_id]`` pairs of ``id_in_subsession`` values. Looking a
+partner up through ``group.get_players()`` costs a group load plus a scan of
+the group on every page, so the schedule is flattened once into one array per
+round, and every Player row keeps the primary key of its partner
+(``partner_pk``, set by ``credencegoods.assignment``). The index itself is
+not stored: ``partner_pk`` is the one record of partners, which
+``credencegoods.arrival.swap_seats`` repoints when seats move.
+"""
+
+
+def build_partner_index(round_matrices, num_players):
+    """Return ``{round_no: partners}``, where ``partners[i - 1]`` is the
+    ``id_in_subsession`` of the partner of player ``i`` in that round."""
+    index = {}
+    for round_no, pairs in round_matrices.items():
+        partners = [0] * num_players
+        for buyer_id, seller_id in pairs:
+            partners[buyer_id - 1] = seller_id
+            partners[seller_id - 1] = buyer_id
+        if 0 in partners:
+            missing = partners.index(0) + 1
+            raise RuntimeError(f"Player {missing} has no partner in round {round_no}.")
+        index[round_no] = partners
+    return index
+
+
+def partner_of(player):
+    """Fetch the partner of ``player`` with a single primary-key lookup."""
+    partner_pk = player.field_maybe_none('partner_pk')
+    if partner_pk is None:
+        raise RuntimeError(
+            f"Partner missing for player {player.id_in_subsession} in round {player.round_number}."
+        )
+    return type(player).objects_get(id=partner_pk)
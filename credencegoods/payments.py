@@ -0,0 +1,202 @@
+"""
+Batch settlement of the payments of a session.
+
+The payment used to reach the database only once a participant rendered
+FinalResults, which stored the totals on the Player row; whoever closed the
+browser first left no payment in the data. The totals are now stored when
+the last round settles (``credencegoods.payoffs``), and at the end of the
+game :func:`settle_session` settles the whole session in one pass: it is
+called as soon as the last pair of the last round has settled (whoever
+still has pages to open), and stores one ``Payment`` row (an ExtraModel of
+the demographics app, the last app of every session) per participant:
+
+- the game app's round payoffs, one query for all the players of the session
+  (the game app is the one of the session's ``app_sequence`` whose Player has
+  ``round_payoff``);
+- the participants, for their labels, running totals and oTree payoff.
+
+A session is settled once (``session.vars['payments_settled']``, the time of
+the settlement). A session that never got there (its last round was left
+unfinished) is settled by the admin from the command line, with the rounds
+settled so far:
+
+    python -m credencegoods.payments <session code> [...]
+
+The exports read the stored rows and do not compute anything again:
+:func:`export_payments` writes one row per participant (points, euros,
+participation fee, payment, whether every round settled and the
+questionnaire was answered); :func:`export_payment_summary` one row per
+session reconciling the settled totals with the three other records of the
+payment: the running totals kept at settlement (``participant.vars``, see
+``credencegoods.payoffs``), the totals stored on the last round's Player row
+(when the last round settles, and again by FinalResults) and oTree's own
+``participant.payoff``. Both are custom exports of the demographics app.
+"""
+import importlib
+import sys
+import time
+
+from otree.api import cu
+
+from .timing import player_rows
+
+# two cents: euros are rounded to the cent on each side
+TOLERANCE = 0.02
+
+
+def game_app(session):
+    """The models module of the session's game app."""
+    for app_name in session.config['app_sequence']:
+        module = importlib.import_module(app_name)
+        if hasattr(module.Player, 'round_payoff'):
+            return module
+    raise RuntimeError(f"Session {session.code} has no game app.")
+
+
+def payment_app(session):
+    """The models module of the session's app that stores the payments."""
+    for app_name in session.config['app_sequence']:
+        module = importlib.import_module(app_name)
+        if hasattr(module, 'Payment'):
+            return module
+    raise RuntimeError(f"Session {session.code} has no app storing the payments.")
+
+
+def session_payments(session):
+    """One dict per participant of ``session``, by participant id."""
+    module = game_app(session)
+    Player = module.Player
+    by_participant = {}
+    for player in Player.objects_filter(session_id=session.id):
+        by_participant.setdefault(player.participant_id, []).append(player)
+
+    fee = float(session.config.get('participation_fee', 0))
+    payments = {}
+    for participant in session.get_participants():
+        rounds = by_participant.get(participant.id, [])
+        payoffs = [p.field_maybe_none('round_payoff') for p in rounds]
+        points = sum(payoff for payoff in payoffs if payoff is not None)
+        euros = float(cu(points).to_real_world_currency(session))
+        last = max(rounds, key=lambda p: p.round_number, default=None)
+        # participant.vars flags the row as modified on every access, so read it once
+        participant_vars = participant.vars
+        payments[participant.id] = dict(
+            participant_code=participant.code,
+            participant_label=participant.label or '',
+            id_in_session=participant.id_in_session,
+            app=module.C.NAME_IN_URL,
+            rounds_settled=sum(payoff is not None for payoff in payoffs),
+            num_rounds=module.C.NUM_ROUNDS,
+            total_points=float(points),
+            total_euros=euros,
+            participation_fee=fee,
+            payment=round(euros + fee, 2),
+            running_payment=participant_vars.get('total_payment'),
+            stored_payment=(last.field_maybe_none('total_payment') or None) if last else None,
+            otree_payment=float(participant.payoff_plus_participation_fee()),
+        )
+    return payments
+
+
+def settle_session(session):
+    """Store the payment of every participant of ``session``, once."""
+    if session.vars.get('payments_settled'):
+        return
+    module = payment_app(session)
+    players = {player.participant_id: player for player in module.Player.objects_filter(session_id=session.id)}
+    settled_at = time.time()
+    for participant_id, payment in session_payments(session).items():
+        module.Payment.create(player=players[participant_id], settled_at=settled_at, **payment)
+    session.vars['payments_settled'] = settled_at
+
+
+def iter_session_payments(players, Payment):
+    """(session, [(payment, questionnaire answered)]) for every session of
+    ``players`` (rows of the app storing the payments), in order of first
+    appearance; a session not settled yet has no payments."""
+    by_pk = {player.id: player for player in players}
+    sessions = {player.session_id: player.session for player in by_pk.values()}
+    payments = {session_id: [] for session_id in sessions}
+    for payment in player_rows(Payment, by_pk):
+        player = by_pk.get(payment.player_id) or payment.player
+        payments[player.session_id].append((payment, player.field_maybe_none('age') is not None))
+    for session_id, session in sessions.items():
+        yield session, sorted(payments[session_id], key=lambda item: item[0].id_in_session)
+
+
+PAYMENT_COLUMNS = [
+    'participant_code', 'participant_label', 'id_in_session', 'app',
+    'rounds_settled', 'num_rounds',
+]
+AMOUNT_COLUMNS = ['total_points', 'total_euros', 'participation_fee', 'payment']
+
+
+def export_payments(players, Payment):
+    """custom_export rows: the payment list, one row per participant of the
+    settled sessions."""
+    yield ['session_code', *PAYMENT_COLUMNS, 'questionnaire', *AMOUNT_COLUMNS, 'complete']
+    for session, payments in iter_session_payments(players, Payment):
+        for payment, questionnaire in payments:
+            complete = payment.rounds_settled == payment.num_rounds and questionnaire
+            yield [
+                session.code, *(getattr(payment, column) for column in PAYMENT_COLUMNS), questionnaire,
+                *(getattr(payment, column) for column in AMOUNT_COLUMNS), complete,
+            ]
+
+
+def differs(payment, column):
+    value = getattr(payment, column)
+    return value is not None and abs(value - payment.payment) > TOLERANCE
+
+
+def export_payment_summary(players, Payment):
+    """custom_export rows: one row per session, with its totals and the
+    number of participants whose payment disagrees with each other record
+    (running totals, totals stored on the last round, oTree's participant
+    payoff). A session not settled yet has ``settled`` False and no
+    totals."""
+    yield [
+        'session_code', 'session_label', 'config', 'settled', 'participants', 'complete', 'rounds_missing',
+        'total_points', 'total_euros', 'total_participation_fees', 'total_payment',
+        'running_mismatches', 'stored_mismatches', 'stored_missing', 'otree_mismatches',
+    ]
+    for session, payments in iter_session_payments(players, Payment):
+        if not payments:
+            yield [session.code, session.label, session.config['name'], False, *([None] * 11)]
+            continue
+        payments, answered = [payment for payment, _ in payments], [answered for _, answered in payments]
+        yield [
+            session.code, session.label, session.config['name'], True, len(payments),
+            sum(p.rounds_settled == p.num_rounds and a for p, a in zip(payments, answered)),
+            sum(p.num_rounds - p.rounds_settled for p in payments),
+            sum(p.total_points for p in payments),
+            round(sum(p.total_euros for p in payments), 2),
+            round(sum(p.participation_fee for p in payments), 2),
+            round(sum(p.payment for p in payments), 2),
+            sum(differs(p, 'running_payment') for p in payments),
+            sum(differs(p, 'stored_payment') for p in payments),
+            sum(p.stored_payment is None for p in payments),
+            sum(differs(p, 'otree_payment') for p in payments),
+        ]
+
+
+def main(*session_codes):
+    from otree.main import setup
+
+    setup()
+    from otree.database import db
+    from otree.models import Session
+
+    for code in session_codes:
+        session = Session.objects_get(code=code)
+        settled_at = session.vars.get('payments_settled')
+        if settled_at:
+            print(f'{code}: already settled at {time.ctime(settled_at)}')
+            continue
+        settle_session(session)
+        print(f'{code}: {len(session_payments(session))} payments settled')
+    db.commit()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,204 @@
+"""
+Payoff engine shared by the three treatments.
+
+The rules only differ in who sets ``price_paid`` (player A in the baseline,
+the type draw in the exogenous and verifiability treatments), so a pair is
+settled the same way everywhere:
+
+- no interaction: both players get ``C.OUTSIDE_OPTION`` and A's revenue is 0;
+- interaction: A gets revenue - cost - price_paid, B gets price_paid, where
+  (revenue, cost) is looked up by (player B type, action).
+
+:func:`pair_payoffs` is the rule itself, free of the database, so that
+the simulator (``analysis.simulator``) applies exactly the same one.
+
+Pairs are settled once, from the ``after_all_players_arrive`` of the last wait
+page before RoundResults, so the results page only reads stored fields (on
+the fast path, a pair that declined is settled as soon as B's decision is
+released; see ``credencegoods.transaction``). The
+decisions are read from the pair's Group (see ``credencegoods.transaction``).
+Settling again overwrites the same values, which keeps it idempotent.
+
+Settling also keeps a per-participant history of round payoffs and running
+totals in ``participant.vars`` (see :func:`record_round_payoff`), so the final
+page and the payment never have to walk ``in_all_rounds()``, and adds the
+pair to the running totals of the admin report (``credencegoods.report``).
+Once the last pair of the last round has settled, the session's payments are
+settled too (``credencegoods.payments``), whoever still has pages to open.
+"""
+from functools import lru_cache
+
+from otree.api import cu
+
+from .payments import settle_session
+from .report import pair_outcome, record_pair
+
+
+@lru_cache(maxsize=None)
+def payoff_table(C):
+    """Return ``{(player_b_type, action): (revenue, cost)}`` for the app's C."""
+    revenue_by_type = {
+        1: {1: C.REVENUE_1, 2: C.REVENUE_2},
+        2: {1: C.REVENUE_2, 2: C.REVENUE_2},
+    }
+    cost_by_action = {1: C.ACTION_1_COST, 2: C.ACTION_2_COST}
+    return {
+        (b_type, action): (revenue_by_type[b_type][action], cost)
+        for b_type in (1, 2)
+        for action, cost in cost_by_action.items()
+    }
+
+
+def automatic_price(price1, price2, player_b_type):
+    """Price paid when the type draw sets it (exogenous and verifiability
+    treatments): Prix 1 for a type 1, Prix 2 for a type 2."""
+    return price1 if player_b_type == 1 else price2
+
+
+def pair_payoffs(C, interaction, player_b_type, action, price_paid):
+    """Return (revenue, A's payoff, B's payoff) for one pair's decisions.
+
+    Raises KeyError for an unknown (type, action) combination.
+    """
+    if not interaction:
+        return 0, C.OUTSIDE_OPTION, C.OUTSIDE_OPTION
+    revenue, cost = payoff_table(C)[player_b_type, action]
+    return revenue, revenue - cost - price_paid, price_paid
+
+
+def settle_pair(buyer, seller, C):
+    """Compute and store revenue, round_payoff and payoff for one A-B pair."""
+    store_pair(buyer, seller, C)
+    settle_payments_when_done(buyer, C)
+
+
+def store_pair(buyer, seller, C):
+    group = buyer.group
+    interaction = group.field_maybe_none('interaction')
+    if interaction is None:
+        raise RuntimeError(
+            f"Interaction decision missing for player {seller.id_in_subsession} in round {seller.round_number}."
+        )
+
+    b_type = action = price_paid = None
+    if interaction:
+        b_type = group.field_maybe_none('player_b_type')
+        action = group.field_maybe_none('action_chosen')
+        price_paid = group.field_maybe_none('price_paid')
+        if b_type is None:
+            raise RuntimeError(
+                f"Player B type missing for player {seller.id_in_subsession} in round {seller.round_number}."
+            )
+        if action is None:
+            raise RuntimeError(
+                f"Action choice missing for player {buyer.id_in_subsession} in round {buyer.round_number}."
+            )
+        if price_paid is None:
+            raise RuntimeError(
+                f"Price paid missing for player {buyer.id_in_subsession} in round {buyer.round_number}."
+            )
+    try:
+        revenue, buyer_payoff, seller_payoff = pair_payoffs(C, interaction, b_type, action, price_paid)
+    except KeyError:
+        raise RuntimeError(
+            f"Invalid type {b_type} / action {action} for player {buyer.id_in_subsession}."
+        ) from None
+
+    buyer.revenue = revenue
+    buyer.round_payoff = buyer_payoff
+    seller.round_payoff = seller_payoff
+    record_round_payoff(buyer, buyer_payoff, C)
+    record_round_payoff(seller, seller_payoff, C)
+    record_pair(group, buyer.matching_group_id, pair_outcome(interaction, b_type, action, price_paid))
+    # the payoff setter commits the DB session, so it comes after the other writes
+    buyer.payoff = buyer_payoff
+    seller.payoff = seller_payoff
+
+
+def settle_payments_when_done(player, C):
+    """In the last round, settle the session's payments once every pair of
+    ``player``'s round has settled."""
+    if player.round_number != C.NUM_ROUNDS:
+        return
+    subsession = player.subsession
+    if all(p.field_maybe_none('round_payoff') is not None for p in subsession.get_players()):
+        settle_session(subsession.session)
+
+
+def record_round_payoff(player, points, C):
+    """Store this round's payoff in the participant's history and update the
+    running totals of points, euros and payment.
+
+    ``participant.vars['round_payoffs']`` has one slot per round (None until
+    the round settles). Totals move by the difference with the previous
+    value of the slot, so recording a round twice does not double count.
+    In the last round the totals are also stored on the Player row.
+    """
+    session = player.session
+    # participant.vars flags the row as modified on every access, so read it once
+    participant_vars = player.participant.vars
+    history = participant_vars.get('round_payoffs') or [None] * C.NUM_ROUNDS
+    previous = history[player.round_number - 1] or 0
+    history[player.round_number - 1] = points
+    total_points = participant_vars.get('total_payoff_points', 0) + points - previous
+    total_euros = float(cu(total_points).to_real_world_currency(session))
+
+    participation_fee = session.config.get('participation_fee', 0)
+    participant_vars['round_payoffs'] = history
+    participant_vars['total_payoff_points'] = total_points
+    participant_vars['total_payoff_euros'] = total_euros
+    participant_vars['total_payment'] = total_euros + participation_fee
+    if player.round_number == C.NUM_ROUNDS:
+        # the totals FinalResults shows, stored whether or not it is rendered
+        player.total_payoff_points = float(total_points)
+        player.total_payoff_euros = total_euros
+        player.participation_fee = float(participation_fee)
+        player.total_payment = float(total_euros + participation_fee)
+
+
+def payment_summary(player):
+    """Return the running totals and per-round history of ``player``'s
+    participant, as used by FinalResults."""
+    participant_vars = player.participant.vars
+    history = participant_vars.get('round_payoffs') or [None] * player.round_number
+    if None in history[: player.round_number]:
+        missing = history.index(None) + 1
+        raise RuntimeError(
+            f"Round payoff missing for player {player.id_in_subsession} in round {missing}."
+        )
+    return dict(
+        total_payoff=cu(participant_vars.get('total_payoff_points', 0)),
+        total_euros=participant_vars.get('total_payoff_euros', 0),
+        participation_fee=player.session.config.get('participation_fee', 0),
+        total_payment=participant_vars.get('total_payment', 0),
+        rounds=[
+            dict(round_number=round_number, round_payoff=cu(points))
+            for round_number, points in enumerate(history, start=1)
+            if points is not None
+        ],
+    )
+
+
+def _split_roles(players):
+    buyer = next((p for p in players if p.player_role == 'A'), None)
+    seller = next((p for p in players if p.player_role == 'B'), None)
+    if buyer is None or seller is None:
+        raise RuntimeError("Both player A and player B are required to settle a pair.")
+    return buyer, seller
+
+
+def settle_group(group, C):
+    """Settle the pair of one group (for a group-level wait page)."""
+    settle_pair(*_split_roles(group.get_players()), C)
+
+
+def settle_subsession(subsession, C):
+    """Settle every pair of a round with a single fetch of its players
+    (for a wait page with ``wait_for_all_groups = True``)."""
+    pairs = {}
+    for player in subsession.get_players():
+        pairs.setdefault(player.group_id, []).append(player)
+    for players in pairs.values():
+        store_pair(*_split_roles(players), C)
+    if pairs:
+        settle_payments_when_done(players[0], C)
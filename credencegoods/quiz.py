@@ -0,0 +1,77 @@
+"""
+Control quiz checked answer by answer over a live channel.
+
+ControlQuiz used to check the answers only when the whole form was posted:
+every wrong answer re-rendered the page, for all participants at once at
+the start of the session, and the attempts were lost. Now the page sends
+each answer as soon as it is picked (``{'question': 'cq_q2', 'answer': 'A'}``)
+and :func:`check_answer` replies whether it is correct, without a reload.
+The submitted form is still verified by :func:`quiz_errors`, so nobody
+moves on with a wrong answer, with or without JavaScript.
+
+Every answer checked appends one ``QuizAttempt`` row (an ExtraModel each app
+declares next to its PageTiming): question, answer, whether it was correct,
+how it came (``live`` or ``submit``) and when. Rows are never updated; the
+attempt number of each answer is counted by :func:`export_attempts`.
+"""
+import time
+from collections import Counter
+
+from .timing import player_rows
+
+ANSWERS = dict(cq_q1='B', cq_q2='A', cq_q3='C', cq_q4='A')
+
+LIVE = 'live'
+SUBMIT = 'submit'
+
+
+def record_attempt(QuizAttempt, player, question, answer, source):
+    correct = answer == ANSWERS[question]
+    QuizAttempt.create(
+        player=player, question=question, answer=answer, correct=correct, source=source, at=time.time(),
+    )
+    return correct
+
+
+def check_answer(QuizAttempt, player, data, message):
+    """live_method of ControlQuiz: check and record one answer.
+
+    The reply says whether the answer is correct, never which one is.
+    """
+    question = data.get('question')
+    answer = data.get('answer')
+    if question not in ANSWERS or not isinstance(answer, str):
+        return {player.id_in_group: dict(error='Question inconnue.')}
+    correct = record_attempt(QuizAttempt, player, question, answer, LIVE)
+    return {player.id_in_group: dict(question=question, correct=correct, message=None if correct else message)}
+
+
+def quiz_errors(QuizAttempt, player, values, message):
+    """error_message of ControlQuiz: record the submitted answers and return
+    ``{field: message}`` for the wrong ones (None when all are correct)."""
+    errors = {}
+    for question in ANSWERS:
+        if not record_attempt(QuizAttempt, player, question, values[question], SUBMIT):
+            errors[question] = message
+    return errors or None
+
+
+def export_attempts(players, QuizAttempt):
+    """custom_export rows: one row per answer checked, numbered per
+    participant and question."""
+    by_pk = {p.id: p for p in players}
+    yield [
+        'session_code', 'participant_code', 'player_id_in_role',
+        'question', 'attempt', 'answer', 'correct', 'source', 'at',
+    ]
+    attempts = Counter()
+    for row in player_rows(QuizAttempt, by_pk):
+        player = by_pk.get(row.player_id)
+        if player is None:
+            continue
+        attempts[row.player_id, row.question] += 1
+        yield [
+            player.session.code, player.participant.code, player.field_maybe_none('player_id_in_role'),
+            row.question, attempts[row.player_id, row.question], row.answer, row.correct, row.source,
+            round(row.at, 3),
+        ]
@@ -0,0 +1,140 @@
+"""
+Live admin report per market (``vars_for_admin_report``).
+
+The monitor only shows where each participant is. The report adds, per
+market and round: how many pairs settled, the interaction rate, the
+overtreatment (Action 2 for a type 1) and undertreatment (Action 1 for a
+type 2) counts, the average price paid, and the participants the market is
+waiting on.
+
+The outcomes are not recomputed from the Player rows on every refresh:
+:func:`record_pair` runs when a pair settles (see
+``credencegoods.payoffs.settle_pair``) and adds it to the running totals of
+its (round, market), one ``MarketRound`` row (an ExtraModel each app declares
+next to its PageTiming). The pair's last outcome is kept on its Group
+(``reported_outcome``), so settling a pair again moves the totals by the
+difference and never counts it twice. The totals are deliberately not kept
+in ``session.vars``: every access to it rewrites the whole dict on commit,
+so any request holding an older copy would drop the pairs settled since.
+
+A refresh reads the MarketRound rows of rounds 1..r, the participants of the
+session (their current page) and the market of each player in the round
+shown: four queries whatever the number of rounds.
+"""
+import sys
+import time
+
+from otree.api import WaitPage
+
+TOTALS = ['pairs', 'interactions', 'overtreatment', 'undertreatment', 'paid', 'price_paid']
+
+
+def market_round_model(obj):
+    """The app's MarketRound ExtraModel, declared in the module of ``obj``'s class."""
+    model = getattr(sys.modules[type(obj).__module__], 'MarketRound', None)
+    if model is None:
+        raise RuntimeError(f"App {type(obj).__module__} has no MarketRound model.")
+    return model
+
+
+def pair_outcome(interaction, player_b_type, action, price_paid):
+    """This pair's contribution to the totals, in the order of TOTALS."""
+    if not interaction:
+        return 1, 0, 0, 0, 0, 0
+    return (
+        1, 1,
+        int(player_b_type == 1 and action == 2),
+        int(player_b_type == 2 and action == 1),
+        1, price_paid,
+    )
+
+
+def record_pair(group, market_id, outcome):
+    """Add a settled pair's outcome to the totals of its (round, market)."""
+    reported = group.field_maybe_none('reported_outcome')
+    previous = [int(value) for value in reported.split(',')] if reported else [0] * len(TOTALS)
+    if list(outcome) == previous:
+        return
+    MarketRound = market_round_model(group)
+    subsession = group.subsession
+    rows = MarketRound.filter(subsession=subsession, matching_group_id=market_id)
+    row = rows[0] if rows else MarketRound.create(
+        subsession=subsession, round_number=group.round_number, matching_group_id=market_id,
+        **dict.fromkeys(TOTALS, 0),
+    )
+    for name, new, old in zip(TOTALS, outcome, previous):
+        setattr(row, name, getattr(row, name) + new - old)
+    group.reported_outcome = ','.join(str(value) for value in outcome)
+
+
+def market_rows(subsession, num_markets, pairs_per_market):
+    """One row per market: the totals of ``subsession``'s round and those of
+    rounds 1..round_number."""
+    round_number = subsession.round_number
+    MarketRound = market_round_model(subsession)
+    subsession_ids = [s.id for s in subsession.in_rounds(1, round_number)]
+    cells = {
+        (row.matching_group_id, row.round_number): row
+        for row in MarketRound.objects_filter(MarketRound.subsession_id.in_(subsession_ids))
+    }
+    rows = []
+    for market_id in range(1, num_markets + 1):
+        row = dict(matching_group_id=market_id)
+        for scope, rounds in ('round', [round_number]), ('cumulative', range(1, round_number + 1)):
+            totals = dict.fromkeys(TOTALS, 0)
+            for r in rounds:
+                cell = cells.get((market_id, r))
+                for name in TOTALS if cell else []:
+                    totals[name] += getattr(cell, name)
+            row[scope] = dict(
+                totals,
+                expected=pairs_per_market * len(rounds),
+                interaction_rate=round(totals['interactions'] / totals['pairs'], 3) if totals['pairs'] else None,
+                average_price_paid=round(totals['price_paid'] / totals['paid'], 2) if totals['paid'] else None,
+            )
+        rows.append(row)
+    return rows
+
+
+def waiting_on(subsession, page_sequence):
+    """``{market_id: [participants]}``: in each market, the participants on
+    the earliest page of the app who are not themselves on a wait page."""
+    wait_pages = {
+        page.__name__ for page in page_sequence if issubclass(page, WaitPage) or getattr(page, 'wait_scope', None)
+    }
+    app_name = subsession.get_folder_name()
+    participants = {p.id: p for p in subsession.session.get_participants()}
+    markets = {}
+    for player in subsession.get_players():
+        participant = participants[player.participant_id]
+        if participant._current_app_name == app_name and player.field_maybe_none('matching_group_id'):
+            markets.setdefault(player.matching_group_id, []).append((participant, player))
+
+    now = time.time()
+    waiting = {}
+    for market_id, members in markets.items():
+        earliest = min(participant._index_in_pages for participant, _ in members)
+        waiting[market_id] = [
+            dict(
+                code=participant.code,
+                label=participant.label,
+                player_id_in_role=player.field_maybe_none('player_id_in_role'),
+                round_number=participant._round_number,
+                page_name=participant._current_page_name,
+                idle_seconds=int(now - participant._last_page_timestamp) if participant._last_page_timestamp else None,
+            )
+            for participant, player in members
+            if participant._index_in_pages == earliest and participant._current_page_name not in wait_pages
+        ]
+    return waiting
+
+
+def admin_report(subsession, market_size, page_sequence):
+    """vars_for_admin_report: the totals of the round shown and the
+    participants each market is waiting on now."""
+    num_markets = -(-subsession.session.num_participants // market_size)
+    markets = market_rows(subsession, num_markets, market_size // 2)
+    waiting = waiting_on(subsession, page_sequence)
+    for row in markets:
+        row['waiting_on'] = waiting.get(row['matching_group_id'], [])
+    return dict(markets=markets)
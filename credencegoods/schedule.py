@@ -0,0 +1,179 @@
+"""
+Stranger matching with as few repeat encounters as possible.
+
+Shuffling buyers and sellers independently every round leaves repeat
+encounters to chance: in a market of 4 A and 4 B over 16 rounds, some pairs
+meet 8 times and others never. :func:`latin_schedule` builds a cyclic Latin
+square instead. With ``n`` buyers and ``n`` sellers, round ``r`` pairs
+buyer ``i`` with seller ``(i + shift[r]) % n``. The shifts run through every
+value of ``range(n)`` once per block of ``n`` rounds, so:
+
+- a buyer meets every seller once per block, hence each A-B pair meets
+  ``num_rounds // n`` or ``num_rounds // n + 1`` times (the minimum);
+- the shift never repeats from one round to the next, so nobody meets the
+  same partner twice in a row (when ``n > 1``).
+
+Buyers, sellers and the shifts of each block are shuffled with the
+market's random stream, so the schedule is still random for the
+participants. Building and checking a schedule is O(n × num_rounds), a few
+milliseconds for markets of hundreds of players.
+
+:func:`verify_schedule` checks these invariants on any ``round_matrices``
+(see ``credencegoods.draws``).
+
+The exogenous treatment assigns a price vector to every pair.
+:func:`balanced_price_schedule` spreads the vectors over groups, rounds and
+markets. Each buyer gets a slot: the buyers of a market take consecutive
+slots, in shuffled order. Each round gets an offset: the rounds are cut
+into blocks of ``num_vectors`` consecutive rounds, and the offsets
+``0 .. num_vectors - 1`` are shuffled within each block, so no buyer
+follows a fixed rotation through the vectors. The buyer's pair plays
+vector ``(slot + offset) % num_vectors``. Consecutive slots, and distinct
+offsets within a block, make the counts of the vectors differ by at most
+one:
+
+- among the pairs of a market, and of the session, in every round;
+- over the rounds a buyer plays;
+- over all the pair-rounds of a market, when there are at most 3 vectors
+  (3 in ``C.PRICE_VECTORS``).
+
+:func:`verify_price_schedule` checks these.
+"""
+from collections import Counter
+
+
+def latin_schedule(buyers, sellers, num_rounds, rng):
+    """Return ``{round_no: [[buyer_id, seller_id], ...]}`` for one market."""
+    if len(buyers) != len(sellers):
+        raise RuntimeError(f"Latin schedule needs as many buyers as sellers ({len(buyers)} vs {len(sellers)}).")
+    n = len(buyers)
+    buyers, sellers = list(buyers), list(sellers)
+    rng.shuffle(buyers)
+    rng.shuffle(sellers)
+
+    shifts = []
+    while len(shifts) < num_rounds:
+        block = list(range(n))
+        rng.shuffle(block)
+        if shifts and n > 1 and block[0] == shifts[-1]:
+            # no repeat across the block boundary
+            swap = rng.randrange(1, n)
+            block[0], block[swap] = block[swap], block[0]
+        shifts.extend(block)
+
+    return {
+        round_no: [[buyers[i], sellers[(i + shift) % n]] for i in range(n)]
+        for round_no, shift in enumerate(shifts[:num_rounds], start=1)
+    }
+
+
+def max_repeats(num_pairs, num_rounds):
+    """Most times an A-B pair of a market meets in a minimal-repeat schedule."""
+    return -(-num_rounds // num_pairs)
+
+
+def verify_schedule(round_matrices, markets):
+    """Check a session's schedule; raise RuntimeError on the first violation.
+
+    ``markets`` is ``{market_id: (buyer ids, seller ids)}``
+    (``credencegoods.draws.market_members``). Every round, each player
+    plays exactly once, as A with a B of the same market. Over the session,
+    no A-B pair meets more than :func:`max_repeats` times, and no pair meets
+    in two consecutive rounds (unless its market has a single pair).
+    """
+    market_of, is_buyer = {}, {}
+    for market_id, (buyers, sellers) in markets.items():
+        for player_id in buyers:
+            market_of[player_id], is_buyer[player_id] = market_id, True
+        for player_id in sellers:
+            market_of[player_id], is_buyer[player_id] = market_id, False
+
+    encounters = Counter()
+    previous = set()
+    for round_no in sorted(round_matrices):
+        seen = set()
+        current = set()
+        for buyer_id, seller_id in round_matrices[round_no]:
+            for player_id in (buyer_id, seller_id):
+                if player_id in seen:
+                    raise RuntimeError(f"Round {round_no}: player {player_id} is matched twice.")
+                if player_id not in market_of:
+                    raise RuntimeError(f"Round {round_no}: player {player_id} is in no market.")
+                seen.add(player_id)
+            if not is_buyer[buyer_id] or is_buyer[seller_id]:
+                raise RuntimeError(f"Round {round_no}: pair {buyer_id}-{seller_id} is not an A with a B.")
+            if market_of[buyer_id] != market_of[seller_id]:
+                raise RuntimeError(f"Round {round_no}: pair {buyer_id}-{seller_id} spans two markets.")
+            pair = (buyer_id, seller_id)
+            if pair in previous and len(markets[market_of[buyer_id]][0]) > 1:
+                raise RuntimeError(f"Round {round_no}: pair {buyer_id}-{seller_id} already met in round {round_no - 1}.")
+            encounters[pair] += 1
+            current.add(pair)
+        if len(seen) != len(market_of):
+            raise RuntimeError(f"Round {round_no}: {len(market_of) - len(seen)} players are not matched.")
+        previous = current
+
+    num_rounds = len(round_matrices)
+    for (buyer_id, seller_id), count in encounters.items():
+        cap = max_repeats(len(markets[market_of[buyer_id]][0]), num_rounds)
+        if count > cap:
+            raise RuntimeError(f"Pair {buyer_id}-{seller_id} meets {count} times (at most {cap}).")
+
+
+def balanced_price_schedule(markets, round_matrices, num_vectors, rng):
+    """Return ``{round_no: digits}``: the index into ``C.PRICE_VECTORS`` of
+    every group of the round, one digit per group in group order."""
+    if num_vectors > 10:
+        raise RuntimeError(f"At most 10 price vectors fit the schedule's digits, got {num_vectors}.")
+    labels = list(range(num_vectors))
+    rng.shuffle(labels)
+    slot = {}
+    for buyers, _ in markets.values():
+        order = list(buyers)
+        rng.shuffle(order)
+        for buyer_id in order:
+            slot[buyer_id] = len(slot)
+    offsets = []
+    while len(offsets) < len(round_matrices):
+        block = list(range(num_vectors))
+        rng.shuffle(block)
+        offsets.extend(block)
+    offset = dict(zip(sorted(round_matrices), offsets))
+    return {
+        round_no: ''.join(str(labels[(slot[buyer_id] + offset[round_no]) % num_vectors]) for buyer_id, _ in pairs)
+        for round_no, pairs in round_matrices.items()
+    }
+
+
+def _check_balance(counts, num_vectors, what):
+    values = [counts.get(vector, 0) for vector in range(num_vectors)]
+    if max(values) - min(values) > 1:
+        raise RuntimeError(f"Price vectors unbalanced in {what}: {values}.")
+
+
+def verify_price_schedule(round_matrices, price_vectors, markets, num_vectors):
+    """Check the balance of a price schedule (see the module docstring);
+    raise RuntimeError on the first violation."""
+    market_of = {buyer_id: market_id for market_id, (buyers, _) in markets.items() for buyer_id in buyers}
+    per_market, per_buyer = {}, {}
+    for round_no, pairs in round_matrices.items():
+        digits = price_vectors[round_no]
+        if len(digits) != len(pairs):
+            raise RuntimeError(f"Round {round_no}: {len(digits)} price vectors for {len(pairs)} groups.")
+        per_round = {}
+        for (buyer_id, _), digit in zip(pairs, digits):
+            vector = int(digit)
+            if vector >= num_vectors:
+                raise RuntimeError(f"Round {round_no}: unknown price vector {vector}.")
+            market_counts = per_round.setdefault(market_of[buyer_id], Counter())
+            market_counts[vector] += 1
+            per_market.setdefault(market_of[buyer_id], Counter())[vector] += 1
+            per_buyer.setdefault(buyer_id, Counter())[vector] += 1
+        _check_balance(sum(per_round.values(), Counter()), num_vectors, f"round {round_no}")
+        for market_id, counts in per_round.items():
+            _check_balance(counts, num_vectors, f"market {market_id}, round {round_no}")
+    for buyer_id, counts in per_buyer.items():
+        _check_balance(counts, num_vectors, f"the rounds of buyer {buyer_id}")
+    if num_vectors <= 3:
+        for market_id, counts in per_market.items():
+            _check_balance(counts, num_vectors, f"market {market_id}")
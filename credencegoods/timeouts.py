@@ -0,0 +1,114 @@
+"""
+Timeouts on the pages of a round, with default decisions.
+
+No page had a timeout, so one idle participant held their pair, their
+market and, with the session-wide barriers, the whole session. Pages
+deriving from :class:`TimeoutPage` submit themselves after the session
+config ``decision_timeout`` (seconds, 0 = no timeout);
+``timeout_<PageName>`` overrides it for one page, e.g.
+``timeout_PriceOffer=60``.
+
+A page that times out keeps the answers that were valid and leaves the
+others None (see ``TimeoutPage.timeout_submission``); its
+``before_next_page`` then applies the treatment's default with
+:func:`default_on_timeout`:
+
+- price_choice: a random entry of ``C.PRICE_VECTORS``, from the session's
+  ``timeout`` stream, so it is the same on every replay;
+- interaction: the session config ``default_interaction`` (False: B
+  declines);
+- action_chosen: the action suited to B's type (Action 1 for a type 1,
+  Action 2 for a type 2);
+- price_paid: the price of the action taken (Prix 1 for Action 1, Prix 2
+  for Action 2).
+
+With ``live_rounds``, LiveRound times out like a decision page and the
+moves the pair had not made get the same defaults.
+
+Every default is flagged on the Player row of the participant who timed
+out, in ``timeout_defaults`` (the fields, comma separated), and
+:func:`export_timeouts` reports their frequency per market. Results and
+information pages have no timeout: they do not hold anybody's decision.
+"""
+from collections import defaultdict
+
+from .draws import stream
+from .timing import TimedPage
+
+DEFAULTED_FIELDS = ['price_choice', 'interaction', 'action_chosen', 'price_paid']
+
+
+def page_timeout(player, page_name):
+    """Seconds before ``page_name`` submits itself, or None."""
+    config = player.session.config
+    return config.get(f'timeout_{page_name}', config.get('decision_timeout', 0)) or None
+
+
+class TimeoutPage(TimedPage):
+    """A TimedPage with the session's timeout for its page name.
+
+    On a timeout oTree replaces invalid answers with ``timeout_submission``;
+    None lets ``before_next_page`` tell a missing answer from a given one.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.timeout_submission = {field: None for field in getattr(cls, 'form_fields', None) or []}
+
+    @classmethod
+    def get_timeout_seconds(cls, player):
+        return page_timeout(player, cls.__name__)
+
+
+def flag_default(player, field):
+    flagged = player.field_maybe_none('timeout_defaults')
+    player.timeout_defaults = f'{flagged},{field}' if flagged else field
+
+
+def default_on_timeout(player, timeout_happened, field, default):
+    """After a timeout that left the group's ``field`` empty, set it to
+    ``default(group)`` and flag it on ``player``."""
+    group = player.group
+    if timeout_happened and group.field_maybe_none(field) is None:
+        setattr(group, field, default(group))
+        flag_default(player, field)
+
+
+def random_price_choice(price_vectors):
+    """Default ``price_choice`` ('2-7'): a random entry of ``price_vectors``."""
+    def default(group):
+        rng = stream(group.session.code, 'timeout', group.round_number, group.id_in_subsession)
+        price1, price2 = rng.choice(price_vectors)
+        return f'{price1}-{price2}'
+    return default
+
+
+def configured_interaction(group):
+    return bool(group.session.config.get('default_interaction', False))
+
+
+def suited_action(group):
+    return 1 if group.player_b_type == 1 else 2
+
+
+def action_price(group):
+    return group.price1_offer if group.action_chosen == 1 else group.price2_offer
+
+
+def export_timeouts(players):
+    """custom_export rows: per session and market, the player-rounds played,
+    the defaults applied (in total and per field) and their share."""
+    counts = defaultdict(lambda: dict(rounds=0, defaults=defaultdict(int)))
+    for player in players:
+        market = counts[player.session.code, player.field_maybe_none('matching_group_id')]
+        market['rounds'] += 1
+        for field in filter(None, (player.field_maybe_none('timeout_defaults') or '').split(',')):
+            market['defaults'][field] += 1
+    yield ['session_code', 'matching_group_id', 'player_rounds', 'timeouts', *DEFAULTED_FIELDS, 'timeouts_per_round']
+    for (session_code, market_id), market in sorted(counts.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        total = sum(market['defaults'].values())
+        yield [
+            session_code, market_id, market['rounds'], total,
+            *(market['defaults'][field] for field in DEFAULTED_FIELDS),
+            round(total / market['rounds'], 4),
+        ]
@@ -0,0 +1,230 @@
+"""
+Per-page timing of every participant, page and round.
+
+Pages derive from :class:`TimedPage` / :class:`TimedWaitPage`, which append
+one ``PageTiming`` row (an ExtraModel each app declares next to its Player)
+per event:
+
+- ``shown``: a page was rendered (again on every reload or failed submit);
+- ``submitted``: the page was submitted and the participant moved on;
+- ``wait_start``: the participant was put on a wait page;
+- ``wait_end``: the wait page released the participant. The last player to
+  arrive is released at once and only gets a ``wait_end``.
+
+Rows are never updated, so recording costs one INSERT per event. The export
+functions below turn them into the raw event table, the time spent on each
+page class and the time each straggler made the rest of the page wait.
+"""
+import sys
+import time
+from collections import defaultdict
+
+from otree.api import Page, WaitPage
+from otree.database import dbq
+
+SHOWN = 'shown'
+SUBMITTED = 'submitted'
+WAIT_START = 'wait_start'
+WAIT_END = 'wait_end'
+
+
+def timing_model(page):
+    """The app's PageTiming ExtraModel, declared in the page's module."""
+    model = getattr(sys.modules[type(page).__module__], 'PageTiming', None)
+    if model is None:
+        raise RuntimeError(f"App {type(page).__module__} has no PageTiming model.")
+    return model
+
+
+def record_event(page, event):
+    player = page.player
+    timing_model(page).create(
+        player=player,
+        round_number=player.round_number,
+        page_index=page._index_in_pages,
+        page_name=type(page).__name__,
+        event=event,
+        at=time.time(),
+    )
+
+
+class TimedPage(Page):
+    """A Page that records when it was shown and submitted."""
+
+    def get(self):
+        response = super().get()
+        if response.status_code == 200:
+            record_event(self, SHOWN)
+        return response
+
+    def post(self):
+        response = super().post()
+        # failed validation renders the page again, moving on redirects
+        if response.status_code == 302:
+            record_event(self, SUBMITTED)
+        return response
+
+
+class TimedWaitPage(WaitPage):
+    """A WaitPage that records when each participant arrived and left."""
+
+    def get(self):
+        response = super().get()
+        if response.status_code == 200:
+            record_event(self, WAIT_START)
+        elif self._is_displayed():
+            record_event(self, WAIT_END)
+        return response
+
+
+def wait_scope(page_class):
+    """Who waits together on a wait page: 'session', 'market' or 'group'."""
+    scope = getattr(page_class, 'wait_scope', None)
+    if scope:
+        return scope
+    return 'session' if page_class.wait_for_all_groups else 'group'
+
+
+def player_rows(Model, by_pk):
+    """The rows of the ExtraModel ``Model`` (linked to Player) of the
+    sessions of ``by_pk`` ({Player.id: player}), in insertion order.
+
+    The sessions are filtered in SQL, so the rows of other sessions are
+    never loaded; callers still skip the rows of players not in ``by_pk``.
+    """
+    if not by_pk:
+        return []
+    Player = type(next(iter(by_pk.values())))
+    session_ids = {player.session_id for player in by_pk.values()}
+    player_ids = dbq(Player).filter(Player.session_id.in_(session_ids)).with_entities(Player.id)
+    return Model.objects_filter(Model.player_id.in_(player_ids)).order_by(Model.id)
+
+
+def page_visits(players, PageTiming):
+    """Fold the events into one visit per (player, round, page).
+
+    Returns a list of dicts with the player, page name and index, kind
+    ('page' or 'wait'), start and end (epoch seconds) and duration. ``end``
+    and ``duration`` are None for pages that were never left.
+    """
+    by_pk = {p.id: p for p in players}
+    visits = {}
+    for row in player_rows(PageTiming, by_pk):
+        player = by_pk.get(row.player_id)
+        if player is None:
+            continue
+        key = row.player_id, row.page_index
+        visit = visits.get(key)
+        if visit is None:
+            visit = visits[key] = dict(
+                player=player,
+                page_index=row.page_index,
+                page_name=row.page_name,
+                kind='wait' if row.event in (WAIT_START, WAIT_END) else 'page',
+                start=None,
+                end=None,
+            )
+        if row.event in (SHOWN, WAIT_START):
+            if visit['start'] is None:
+                visit['start'] = row.at
+        else:
+            visit['end'] = row.at
+
+    for visit in visits.values():
+        if visit['start'] is None:
+            # released without waiting (or submitted without a recorded load)
+            visit['start'] = visit['end']
+        visit['duration'] = None if visit['end'] is None else visit['end'] - visit['start']
+    return list(visits.values())
+
+
+def export_events(players, PageTiming):
+    """custom_export rows: the PageTiming table, one row per event."""
+    by_pk = {p.id: p for p in players}
+    yield [
+        'session_code', 'participant_code', 'matching_group_id', 'player_id_in_role',
+        'round_number', 'page_index', 'page_name', 'event', 'at',
+    ]
+    for row in player_rows(PageTiming, by_pk):
+        player = by_pk.get(row.player_id)
+        if player is None:
+            continue
+        yield [
+            player.session.code, player.participant.code,
+            player.field_maybe_none('matching_group_id'), player.field_maybe_none('player_id_in_role'),
+            row.round_number, row.page_index, row.page_name, row.event, round(row.at, 3),
+        ]
+
+
+def export_page_times(players, PageTiming, page_sequence):
+    """Time spent on each page class of ``page_sequence``, per session.
+
+    For a page: from first shown to submitted; for a wait page: from arrival
+    to release. Visits that never ended are left out.
+    """
+    order = {cls.__name__: i for i, cls in enumerate(page_sequence)}
+    totals = defaultdict(list)
+    for visit in page_visits(players, PageTiming):
+        if visit['duration'] is not None:
+            key = visit['player'].session.code, visit['page_name'], visit['kind']
+            totals[key].append(visit['duration'])
+
+    yield ['session_code', 'page_name', 'kind', 'visits', 'seconds_total', 'seconds_mean', 'seconds_max']
+    for (session_code, page_name, kind), durations in sorted(
+        totals.items(), key=lambda item: (item[0][0], order.get(item[0][1], len(order)))
+    ):
+        total = sum(durations)
+        yield [
+            session_code, page_name, kind, len(durations),
+            round(total, 3), round(total / len(durations), 3), round(max(durations), 3),
+        ]
+
+
+def export_stragglers(players, PageTiming, page_sequence):
+    """Wait time each straggler caused, per market (``matching_group_id``).
+
+    On every wait page instance (a round's page for the group, the market
+    or the session, see :func:`wait_scope`) the straggler is the last player
+    to arrive; the waits of everyone else on that instance are attributed to
+    them. Waits on session-wide pages are attributed to the straggler's
+    market as well, although players of other markets waited too.
+    """
+    classes = {cls.__name__: cls for cls in page_sequence}
+    instances = defaultdict(list)
+    for visit in page_visits(players, PageTiming):
+        if visit['kind'] != 'wait' or visit['end'] is None:
+            continue
+        player = visit['player']
+        scope = wait_scope(classes[visit['page_name']])
+        if scope == 'session':
+            scope_id = player.session_id
+        elif scope == 'market':
+            scope_id = player.session_id, player.matching_group_id
+        else:
+            scope_id = player.group_id
+        instances[visit['page_index'], scope, scope_id].append(visit)
+
+    stragglers = defaultdict(lambda: dict(times_last=0, seconds=0.0, pages=set()))
+    for visits in instances.values():
+        last = max(visits, key=lambda visit: visit['start'])
+        player = last['player']
+        key = (
+            player.session.code, player.field_maybe_none('matching_group_id'),
+            player.participant.code, player.field_maybe_none('player_id_in_role'),
+        )
+        entry = stragglers[key]
+        entry['times_last'] += 1
+        entry['seconds'] += sum(visit['duration'] for visit in visits if visit is not last)
+        entry['pages'].add(last['page_name'])
+
+    yield [
+        'session_code', 'matching_group_id', 'participant_code', 'player_id_in_role',
+        'times_last', 'seconds_others_waited', 'wait_pages',
+    ]
+    for key, entry in sorted(
+        stragglers.items(), key=lambda item: (item[0][0], item[0][1] or 0, -item[1]['seconds'])
+    ):
+        yield [
+            *key, entry['times_last'], round(entry['seconds'], 3),
+            ' '.join(sorted(entry['pages'], key=lambda name: list(classes).index(name))),
+        ]
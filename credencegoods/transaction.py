@@ -0,0 +1,101 @@
+"""
+One transaction record per pair and round, stored on Group.
+
+A pair's prices, B's interaction decision, B's type, A's action and the
+price paid are Group fields, written once where they are decided: decision
+pages use ``form_model = 'group'`` and wait pages write the group they
+release. Player declares :func:`group_field` properties of the same names,
+so ``player.price1_offer`` or ``player.field_maybe_none('interaction')``
+read the pair's record whatever the player's role.
+
+Before, every decision was copied onto the partner's row (``partner_*``
+fields) and the type onto both rows; :func:`export_compat` still produces
+those per-player columns, declared per app as ``COMPAT_COLUMNS``.
+:func:`export_transactions` is the tidy counterpart: one row per pair and
+round, with both players resolved.
+
+A pair that does not interact has nothing left to wait for once B declined.
+With the session config ``fast_path``, it is settled when B's decision is
+released and :func:`skips_transaction` hides the later wait pages of the
+round, so both players go straight to RoundResults.
+"""
+
+
+def group_field(name):
+    """Read-only Player property returning ``player.group.<name>``.
+
+    Like a null model field, reading a field that is still None raises
+    TypeError, so ``field_maybe_none`` works on it.
+    """
+    return property(lambda player: getattr(player.group, name), doc=f"The pair's {name} (on Group).")
+
+
+def fast_path(obj):
+    """True when declined pairs skip the rest of the round (``obj`` is a
+    player or a group)."""
+    return obj.session.config.get('fast_path', False)
+
+
+def skips_transaction(player):
+    """True when the fast path sends ``player``'s pair, which declined,
+    past the wait pages that follow B's decision."""
+    return fast_path(player) and not player.group.interaction
+
+
+def export_compat(players, columns):
+    """Rows with the per-player transaction columns of the former layout.
+
+    ``columns`` maps each old column to (roles whose row had it, Group
+    field), e.g. ``partner_price1=('B', 'price1_offer')``; other roles get
+    an empty cell.
+    """
+    yield [
+        'session_code', 'participant_code', 'round_number', 'id_in_group',
+        'player_role', 'player_id_in_role', *columns,
+    ]
+    for player in players:
+        group = player.group
+        role = player.field_maybe_none('player_role')
+        yield [
+            player.session.code, player.participant.code, player.round_number, player.id_in_group,
+            role, player.field_maybe_none('player_id_in_role'),
+        ] + [
+            group.field_maybe_none(field) if role in roles else None
+            for roles, field in columns.values()
+        ]
+
+
+# Group fields of every transaction row; apps add their own (e.g. price_choice)
+TRANSACTION_FIELDS = ['price1_offer', 'price2_offer', 'interaction', 'player_b_type', 'action_chosen', 'price_paid']
+
+
+def export_transactions(players, extra_fields=()):
+    """custom_export rows: one row per pair and round, with the codes and
+    payoffs of both players and the pair's Group record.
+
+    oTree passes the players ordered by id, and the two players of a pair
+    are created in the same round, so a row is yielded as soon as its second
+    player comes and only the pairs of the round in progress are held.
+    """
+    fields = [*TRANSACTION_FIELDS, *extra_fields]
+    yield [
+        'session_code', 'round_number', 'matching_group_id', 'group_id_in_subsession',
+        'participant_code_A', 'participant_code_B', 'player_id_in_role_A', 'player_id_in_role_B',
+        *fields, 'revenue', 'payoff_A', 'payoff_B',
+    ]
+    open_pairs = {}
+    for player in players:
+        first = open_pairs.pop(player.group_id, None)
+        if first is None:
+            open_pairs[player.group_id] = player
+            continue
+        buyer, seller = (first, player) if first.field_maybe_none('player_role') == 'A' else (player, first)
+        group = buyer.group
+        yield [
+            buyer.session.code, buyer.round_number, buyer.field_maybe_none('matching_group_id'),
+            group.id_in_subsession, buyer.participant.code, seller.participant.code,
+            buyer.field_maybe_none('player_id_in_role'), seller.field_maybe_none('player_id_in_role'),
+            *(group.field_maybe_none(field) for field in fields),
+            buyer.field_maybe_none('revenue'), buyer.field_maybe_none('round_payoff'),
+            seller.field_maybe_none('round_payoff'),
+        ]
@@ -1,5 +1,21 @@
 from otree.api import *
-import random
+
+from credencegoods.arrival import ArrivalWaitPage, arrival_markets
+from credencegoods.assignment import assign_all_rounds, check_assigned
+from credencegoods.barrier import START_BARRIER, MarketWaitPage, market_barrier
+from credencegoods.draws import drawn_b_type
+from credencegoods.matching import partner_of
+from credencegoods.payoffs import payment_summary, payoff_table, settle_group, settle_pair
+from credencegoods.report import admin_report
+from credencegoods.quiz import check_answer, export_attempts, quiz_errors
+from credencegoods.timeouts import (
+    TimeoutPage, action_price, configured_interaction, default_on_timeout, export_timeouts, flag_default,
+    random_price_choice, suited_action,
+)
+from credencegoods.timing import (
+    TimedPage, TimedWaitPage, export_events, export_page_times, export_stragglers,
+)
+from credencegoods.transaction import export_compat, export_transactions, fast_path, group_field, skips_transaction
 
 
 doc = """
@@ -36,16 +52,11 @@ class Subsession(BaseSubsession):
     pass
 
 class Group(BaseGroup):
-    pass
-
-
-class Player(BasePlayer):
-    # Role and identification
-    player_role = models.StringField()
-    player_id_in_role = models.StringField()
-    matching_group_id = models.IntegerField()
+    # Round stage when the session runs with live_rounds (see LiveRound)
+    stage = models.StringField(initial='prices')
 
-    # Decision variables - Player A
+    # The pair's transaction, one record per round (see credencegoods.transaction)
+    # Player A's decisions
     price1_offer = models.IntegerField(
         min=C.MIN_PRICE,
         max=C.MAX_PRICE,
@@ -75,10 +86,23 @@ class Player(BasePlayer):
         blank=True
     )
 
-    # Decision variables - Player B
+    # Player B's decision
     interaction = models.BooleanField(
         choices=[[True, 'Oui'], [False, 'Non']],
-            )
+    )
+    player_b_type = models.IntegerField()  # 1 or 2 if B interacts, 0 otherwise
+    reported_outcome = models.StringField(initial='')  # see credencegoods.report
+
+
+class Player(BasePlayer):
+    # Role and identification
+    player_role = models.StringField()
+    player_id_in_role = models.StringField()
+    matching_group_id = models.IntegerField()
+    partner_pk = models.IntegerField()  # Player.id of this round's partner
+    barrier_reached = models.IntegerField(initial=0)  # see credencegoods.barrier
+    timeout_defaults = models.StringField(initial='')  # see credencegoods.timeouts
+
     # Control-quiz answers: store the user’s choice
 
     cq_q1 = models.StringField(label="Question 1. Quelle affirmation au sujet des interactions entre joueurs est correcte ?",
@@ -107,7 +131,6 @@ class Player(BasePlayer):
         ['D', 'Le gain du Joueur B est défini par les prix payés par le Joueur A.'],
     ])
     # Game state variables
-    player_b_type = models.IntegerField()  # 1 or 2, randomly assigned
     revenue = models.IntegerField()  # Revenue received by Player A
     round_payoff = models.CurrencyField()  # Payoff for this round
 
@@ -117,200 +140,67 @@ class Player(BasePlayer):
     participation_fee = models.FloatField(initial=0)
     total_payment = models.FloatField(initial=0)
 
-    # For feedback display
-    partner_price1 = models.IntegerField()
-    partner_price2 = models.IntegerField()
-    partner_interaction = models.BooleanField()
-    partner_action = models.IntegerField()
-    partner_price_paid = models.IntegerField()
-
-    def price_paid_choices(self):
-        price1 = self.field_maybe_none('price1_offer')
-        price2 = self.field_maybe_none('price2_offer')
-        choices = []
-        if price1 is not None:
-            choices.append([price1, f"Prix 1 ({price1} points)"])
-        if price2 is not None:
-            label = "Prix 2" if price2 != price1 else "Payer le prix"
-            choices.append([price2, f"{label} ({price2} points)"])
-        return choices
+    # The pair's transaction, read from Group
+    price_choice = group_field('price_choice')
+    price1_offer = group_field('price1_offer')
+    price2_offer = group_field('price2_offer')
+    interaction = group_field('interaction')
+    player_b_type = group_field('player_b_type')
+    action_chosen = group_field('action_chosen')
+    price_paid = group_field('price_paid')
 
     def set_partner(self):
         """Get the partner player in this group"""
-        return [p for p in self.group.get_players() if p != self][0]
-
-    def calculate_payoff(self):
-        """Calculate payoff for this round"""
-        partner = self.set_partner()
-        role = self.field_maybe_none('player_role')
-
-        if role is None:
-            raise RuntimeError(
-                f"Player {self.id_in_subsession} is missing a role in round {self.round_number}."
-            )
-
-        if role == 'A':
-            partner_interaction = partner.field_maybe_none('interaction')
-            if partner_interaction is None:
-                raise RuntimeError(
-                    f"Partner interaction decision missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if not partner_interaction:
-                # No interaction
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.revenue = 0
-                self.payoff = cu(self.round_payoff)
-            else:
-                # Calculate revenue based on type and action
-                partner_type = partner.field_maybe_none('player_b_type')
-                if partner_type is None:
-                    raise RuntimeError(
-                        f"Player B type missing for player {self.id_in_subsession} in round {self.round_number}."
-                    )
-                action_chosen = self.field_maybe_none('action_chosen')
-                if action_chosen is None:
-                    raise RuntimeError(
-                        f"Action choice missing for player {self.id_in_subsession} in round {self.round_number}."
-                    )
-                if partner_type == 1:
-                    if action_chosen == 1:
-                        revenue = C.REVENUE_1
-                    else:  # action_chosen == 2
-                        revenue = C.REVENUE_2
-                else:  # player_b_type == 2
-                    revenue = C.REVENUE_2
-                
-                # Calculate costs
-                if action_chosen == 1:
-                    cost = C.ACTION_1_COST
-                elif action_chosen == 2:
-                    cost = C.ACTION_2_COST
-                else:
-                    raise RuntimeError(
-                        f"Invalid action choice {action_chosen} for player {self.id_in_subsession}."
-                    )
-                
-                # Final payoff
-                self.revenue = revenue
-                price_paid = self.field_maybe_none('price_paid')
-                if price_paid is None:
-                    raise RuntimeError(
-                        f"Price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                    )
-                self.round_payoff = revenue - cost - price_paid
-                self.payoff = cu(self.round_payoff)
-        else:  # Player B
-            interaction = self.field_maybe_none('interaction')
-            if interaction is None:
-                raise RuntimeError(
-                    f"Interaction decision missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if not interaction:
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.payoff = cu(self.round_payoff)
-            else:
-                partner_price_paid = partner.field_maybe_none('price_paid')
-                if partner_price_paid is None:
-                    raise RuntimeError(
-                        f"Partner price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                    )
-                if partner_price_paid:
-                    self.round_payoff = partner_price_paid
-                else:
-                    self.round_payoff = 0
-                self.payoff = cu(self.round_payoff)
-
-    def validate_price1_offer(self, value):
-        role = self.field_maybe_none('player_role')
-        price2 = self.field_maybe_none('price2_offer')
-        if role == 'A' and price2 is not None and value > price2:
-                return 'Price 1 must be less than or equal to Price 2'
-        return None
+        return partner_of(self)
 
     def role(self):
         return self.player_role or 'A'
 
 
-def creating_session(subsession: Subsession):
-    players = sorted(subsession.get_players(), key=lambda p: p.id_in_subsession)
-    market_size = C.MARKET_SIZE
-    total_players = len(players)
-
-    if total_players % market_size != 0:
-        raise RuntimeError(
-            f"Session size {total_players} is not divisible by market size {market_size}."
-        )
-
-    session = subsession.session
-
-    if subsession.round_number == 1:
-        markets = {}
-        half_market = market_size // 2
-
-        for idx, player in enumerate(players):
-            market_id = idx // market_size + 1
-            position = idx % market_size
-            role = 'A' if position < half_market else 'B'
-            label_idx = position % half_market + 1
-            label = f"{role}{label_idx}"
-
-            player.matching_group_id = market_id
-            player.player_role = role
-            player.player_id_in_role = label
+class PageTiming(ExtraModel):
+    """Append-only page timing events, see credencegoods.timing."""
+    player = models.Link(Player)
+    round_number = models.IntegerField()
+    page_index = models.IntegerField()
+    page_name = models.StringField()
+    event = models.StringField()
+    at = models.FloatField()  # epoch seconds
 
-            player.participant.vars['matching_group_id'] = market_id
-            player.participant.vars['player_role'] = role
-            player.participant.vars['player_id_in_role'] = label
 
-            markets.setdefault(market_id, []).append(player)
+class QuizAttempt(ExtraModel):
+    """Append-only control quiz answers, see credencegoods.quiz."""
+    player = models.Link(Player)
+    question = models.StringField()
+    answer = models.StringField()
+    correct = models.BooleanField()
+    source = models.StringField()  # 'live' or 'submit'
+    at = models.FloatField()  # epoch seconds
 
-        round_matrices = {}
-        for round_no in range(1, C.NUM_ROUNDS + 1):
-            round_pairs = []
-            for market_id, market_players in markets.items():
-                buyers = [p.id_in_subsession for p in market_players if p.player_role == 'A']
-                sellers = [p.id_in_subsession for p in market_players if p.player_role == 'B']
 
-                if len(buyers) != len(sellers):
-                    raise RuntimeError(
-                        f"Market {market_id}: {len(buyers)} buyers vs {len(sellers)} sellers."
-                    )
-
-                rng = random.Random(f"{session.code}-{market_id}-{round_no}")
-                rng.shuffle(buyers)
-                rng.shuffle(sellers)
-
-                for buyer_id, seller_id in zip(buyers, sellers):
-                    round_pairs.append([buyer_id, seller_id])
-
-            round_matrices[round_no] = round_pairs
-
-        session.vars['round_matrices'] = round_matrices
-
-    round_matrices = session.vars.get('round_matrices')
-    if not round_matrices:
-        raise RuntimeError("Round matrices missing in session vars.")
-
-    for player in players:
-        stored_market = player.participant.vars.get('matching_group_id')
-        stored_role = player.participant.vars.get('player_role')
-        stored_label = player.participant.vars.get('player_id_in_role')
-
-        if stored_market is None or stored_role is None or stored_label is None:
-            raise RuntimeError(
-                f"Participant {player.participant.code} is missing stored assignments."
-            )
+class MarketRound(ExtraModel):
+    """Running totals of the admin report, see credencegoods.report."""
+    subsession = models.Link(Subsession)
+    round_number = models.IntegerField()
+    matching_group_id = models.IntegerField()
+    pairs = models.IntegerField()
+    interactions = models.IntegerField()
+    overtreatment = models.IntegerField()
+    undertreatment = models.IntegerField()
+    paid = models.IntegerField()  # interacting pairs, which all pay a price
+    price_paid = models.IntegerField()  # sum over the pairs that paid
 
-        player.matching_group_id = stored_market
-        player.player_role = stored_role
-        player.player_id_in_role = stored_label
 
-    subsession.set_group_matrix(round_matrices[subsession.round_number])
+def creating_session(subsession: Subsession):
+    # every round is assigned in round 1, see credencegoods.assignment
+    if subsession.round_number == 1:
+        assign_all_rounds(subsession, C, Player, Group)
+    else:
+        check_assigned(subsession)
 
 
-def price_paid_choices(player: Player):
-    price1 = player.field_maybe_none('price1_offer')
-    price2 = player.field_maybe_none('price2_offer')
+def price_paid_choices(group: Group):
+    price1 = group.field_maybe_none('price1_offer')
+    price2 = group.field_maybe_none('price2_offer')
     choices = []
     if price1 is not None:
         choices.append([price1, f"Prix 1 ({price1} points)"])
@@ -320,49 +210,227 @@ def price_paid_choices(player: Player):
         choices.append([price2, f"Prix ({price2} points)"])
     return choices
 
+
+def live_rounds(player: Player):
+    """True when the session plays each round on the single LiveRound page."""
+    return player.session.config.get('live_rounds', False)
+
+
+def combined_payment(player: Player):
+    """True when A chooses the action and the price paid on the single
+    ActionPayment page instead of ActionChoice, WaitForAction and PricePayment."""
+    return player.session.config.get('combined_payment', False)
+
+
+def price_paid_error(player: Player, price_paid):
+    price1 = player.field_maybe_none('price1_offer')
+    price2 = player.field_maybe_none('price2_offer')
+    if price_paid not in [price1, price2]:
+        return f'Vous devez choisir soit le Prix 1 ({price1} points), soit le Prix 2 ({price2} points).'
+
+
+def set_price_offer(group: Group):
+    choice = group.field_maybe_none('price_choice')
+    if choice is None:
+        raise RuntimeError("Aucune paire de prix sélectionnée.")
+    mapping = {
+        '2-3': (2, 3),
+        '2-7': (2, 7),
+        '4-7': (4, 7),
+    }
+    if choice not in mapping:
+        raise RuntimeError(f"Paire de prix inconnue : {choice}")
+    group.price1_offer, group.price2_offer = mapping[choice]
+
+
+def assign_b_type(group: Group):
+    interaction = group.field_maybe_none('interaction')
+    if interaction is None:
+        raise RuntimeError("Player B interaction decision missing when assigning type.")
+
+    if interaction:
+        # Type 1 or 2, drawn in advance for the group (credencegoods.draws)
+        group.player_b_type = drawn_b_type(group)
+    else:
+        # No interaction, assign default (won't be used)
+        group.player_b_type = 0
+
+
+def action_info(player_b_type):
+    table = payoff_table(C)
+    info = []
+    for action in (1, 2):
+        revenue, cost = table[player_b_type, action]
+        info.append({
+            'label': f'Action {action}',
+            'cost': cost,
+            'revenue': revenue,
+            'net_gain': revenue - cost,
+        })
+    return info
+
+
+# Live round: who may send which message at each stage of Group.stage
+LIVE_MOVES = {
+    'prices': ('A', 'price_choice'),
+    'interaction': ('B', 'interaction'),
+    'action': ('A', 'action_chosen'),
+    'payment': ('A', 'price_paid'),
+}
+
+
+def advance_live_round(group: Group, buyer: Player, seller: Player, sender: Player, data):
+    """Apply one LiveRound message to the pair and move group.stage on.
+
+    Writes the same Group fields as PriceOffer, InteractionDecision,
+    ActionChoice and PricePayment (and their wait pages) do. Returns an error message, or
+    None when the move was accepted.
+    """
+    stage = group.stage
+    if LIVE_MOVES.get(stage) != (sender.player_role, data.get('type')):
+        return "Ce n'est pas à vous de jouer."
+    value = data.get('value')
+
+    if stage == 'prices':
+        if value not in {'2-3', '2-7', '4-7'}:
+            return 'Veuillez sélectionner une paire de prix.'
+        group.price_choice = value
+        set_price_offer(group)
+        group.stage = 'interaction'
+    elif stage == 'interaction':
+        if not isinstance(value, bool):
+            return 'Veuillez indiquer si vous souhaitez interagir.'
+        group.interaction = value
+        assign_b_type(group)
+        if value:
+            group.stage = 'action'
+        else:
+            group.stage = 'results'
+            settle_pair(buyer, seller, C)
+    elif stage == 'action':
+        if value not in [1, 2]:
+            return 'Veuillez sélectionner une action avant de continuer.'
+        group.action_chosen = value
+        group.stage = 'payment'
+    elif stage == 'payment':
+        price1 = group.price1_offer
+        price2 = group.price2_offer
+        if value not in [price1, price2]:
+            return f'Vous devez choisir soit le Prix 1 ({price1} points), soit le Prix 2 ({price2} points).'
+        group.price_paid = value
+        group.stage = 'results'
+        settle_pair(buyer, seller, C)
+    return None
+
+
+# Live round timed out: the default of each move still to make
+# (credencegoods.timeouts)
+LIVE_DEFAULTS = dict(
+    price_choice=random_price_choice(C.PRICE_VECTORS),
+    interaction=configured_interaction,
+    action_chosen=suited_action,
+    price_paid=action_price,
+)
+
+
+def finish_live_round(player: Player):
+    """After LiveRound timed out for ``player``, play the pair's remaining
+    moves with their defaults, each flagged on the player whose move it was."""
+    group = player.group
+    partner = player.set_partner()
+    if player.player_role == 'A':
+        buyer, seller = player, partner
+    else:
+        buyer, seller = partner, player
+    while group.stage != 'results':
+        role, field = LIVE_MOVES[group.stage]
+        mover = buyer if role == 'A' else seller
+        error = advance_live_round(group, buyer, seller, mover, dict(type=field, value=LIVE_DEFAULTS[field](group)))
+        if error:
+            raise RuntimeError(f"Valeur par défaut refusée pour {field} : {error}")
+        flag_default(mover, field)
+
+
+def live_state(group: Group, player: Player):
+    """What LiveRound shows to ``player`` at the current stage."""
+    stage = group.stage
+    state = dict(stage=stage, role=player.player_role)
+    if stage == 'prices':
+        return state
+    state.update(price1=group.price1_offer, price2=group.price2_offer)
+    if player.player_role == 'A':
+        if stage in ('action', 'payment'):
+            state.update(
+                player_b_type=group.player_b_type,
+                action_info=action_info(group.player_b_type),
+            )
+        if stage == 'payment':
+            state.update(
+                action_chosen=group.action_chosen,
+                price_paid_choices=price_paid_choices(group),
+            )
+    return state
+
+
 # PAGES
-class Welcome(Page):
+class Welcome(TimedPage):
     next_button_text = 'Suivant'
 
     @staticmethod
     def is_displayed(player: Player):
         return player.round_number == 1
 
-class ControlQuiz(Page):
+
+QUIZ_ERROR = 'Incorrect. Veuillez lire les instructions et réessayer.'
+
+
+class ControlQuiz(TimedPage):
     form_model = 'player'
     form_fields = ['cq_q1', 'cq_q2', 'cq_q3', 'cq_q4']
 
     @staticmethod
     def is_displayed(player: Player):
         return player.round_number == 1
-   
+
     @staticmethod
-    def error_message(player: Player, values):
-        errors = {}
-        if values['cq_q1'] != 'B':  # replace 'B' with the correct option
-            errors['cq_q1'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q2'] != 'A':
-            errors['cq_q2'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q3'] != 'C':
-            errors['cq_q3'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q4'] != 'A':
-            errors['cq_q4'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
+    def live_method(player: Player, data):
+        # each answer is checked as soon as it is picked
+        return check_answer(QuizAttempt, player, data, QUIZ_ERROR)
 
-        if errors:
-            return errors  # Page stays until all answers are correct
+    @staticmethod
+    def error_message(player: Player, values):
+        # Page stays until all answers are correct (answers in credencegoods.quiz)
+        return quiz_errors(QuizAttempt, player, values, QUIZ_ERROR)
 
 
-class WaitForAllPlayers(WaitPage):
+class WaitForAllPlayers(TimedWaitPage):
     title_text = "En attente"
     body_text = "Veuillez patienter jusqu'à ce que tous les participants aient lu les instructions."
     wait_for_all_groups = True
     
     @staticmethod
     def is_displayed(player: Player):
-        return player.round_number == 1
+        return player.round_number == 1 and not market_barrier(player)
+
 
+class WaitForMarketStart(MarketWaitPage):
+    barrier = START_BARRIER
+    body_text = "Veuillez patienter jusqu'à ce que tous les participants de votre marché aient lu les instructions."
 
-class RoleAssignment(Page):
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number == 1 and market_barrier(player) and not arrival_markets(player)
+
+
+class WaitForMarketArrival(ArrivalWaitPage):
+    market_size = C.MARKET_SIZE
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number == 1 and arrival_markets(player)
+
+
+class RoleAssignment(TimedPage):
     @staticmethod
     def is_displayed(player: Player):
         if player.player_role is None:
@@ -376,8 +444,8 @@ class RoleAssignment(Page):
         }
 
 
-class PriceOffer(Page):
-    form_model = 'player'
+class PriceOffer(TimeoutPage):
+    form_model = 'group'
     form_fields = ['price_choice']
 
     @staticmethod
@@ -385,7 +453,7 @@ class PriceOffer(Page):
         role = player.player_role
         if role is None:
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at PriceOffer in round {player.round_number}.")
-        return role == 'A'
+        return role == 'A' and not live_rounds(player)
 
     @staticmethod
     def error_message(player: Player, values):
@@ -394,48 +462,31 @@ class PriceOffer(Page):
 
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
-        choice = player.price_choice
-        if choice is None:
-            raise RuntimeError("Aucune paire de prix sélectionnée.")
-        mapping = {
-            '2-3': (2, 3),
-            '2-7': (2, 7),
-            '4-7': (4, 7),
-        }
-        if choice not in mapping:
-            raise RuntimeError(f"Paire de prix inconnue : {choice}")
-        price1, price2 = mapping[choice]
-        player.price1_offer = price1
-        player.price2_offer = price2
-        partner = player.set_partner()
-        partner.partner_price1 = price1
-        partner.partner_price2 = price2
+        default_on_timeout(player, timeout_happened, 'price_choice', random_price_choice(C.PRICE_VECTORS))
+        set_price_offer(player.group)
 
 
-class WaitForPrices(WaitPage):
+class WaitForPrices(TimedWaitPage):
     title_text = "En attente"
     body_text = "Merci de patienter le temps que le joueur A définisse les prix…"
     wait_for_all_groups = False
 
+    @staticmethod
+    def is_displayed(player: Player):
+        return not live_rounds(player)
+
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        buyer = next((p for p in players if p.player_role == 'A'), None)
-        if buyer is None:
-            # fall back to id_in_group
-            buyer = next((p for p in players if p.id_in_group == 1), None)
-        if buyer is None:
-            raise RuntimeError("No buyer found in group at WaitForPrices.")
-        price1 = buyer.field_maybe_none('price1_offer')
-        price2 = buyer.field_maybe_none('price2_offer')
+        price1 = group.field_maybe_none('price1_offer')
+        price2 = group.field_maybe_none('price2_offer')
         if price1 is None or price2 is None:
             raise RuntimeError(
-                f"Buyer {buyer.id_in_subsession} missing price offers when releasing WaitForPrices."
+                f"Group {group.id_in_subsession} missing price offers when releasing WaitForPrices."
             )
 
 
-class InteractionDecision(Page):
-    form_model = 'player'
+class InteractionDecision(TimeoutPage):
+    form_model = 'group'
     form_fields = ['interaction']
     
     @staticmethod
@@ -443,10 +494,10 @@ class InteractionDecision(Page):
         role = player.player_role
         if role is None:
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at InteractionDecision in round {player.round_number}.")
-        if role != 'B':
+        if role != 'B' or live_rounds(player):
             return False
-        partner = player.set_partner()
-        if partner.price1_offer is None or partner.price2_offer is None:
+        group = player.group
+        if group.field_maybe_none('price1_offer') is None or group.field_maybe_none('price2_offer') is None:
             raise RuntimeError(
                 f"Partner price offers missing for player {player.id_in_subsession} entering InteractionDecision."
             )
@@ -454,85 +505,60 @@ class InteractionDecision(Page):
     
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
-        price1 = partner.field_maybe_none('price1_offer')
-        price2 = partner.field_maybe_none('price2_offer')
+        price1 = player.field_maybe_none('price1_offer')
+        price2 = player.field_maybe_none('price2_offer')
         if price1 is None or price2 is None:
             raise RuntimeError("Partner prices missing while rendering InteractionDecision.")
         return {
             'price1': price1,
             'price2': price2
         }
-    
+
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
-        partner = player.set_partner()
-        interaction = player.field_maybe_none('interaction')
-        if interaction is None:
-            raise RuntimeError("Interaction decision must be submitted before leaving the page.")
-        partner.partner_interaction = interaction
+        default_on_timeout(player, timeout_happened, 'interaction', configured_interaction)
 
 
-class WaitForInteraction(WaitPage):
+class WaitForInteraction(TimedWaitPage):
     title_text = "En attente"
     body_text = "Merci de patienter pendant que le Joueur B fait son choix."
     wait_for_all_groups = False
 
+    @staticmethod
+    def is_displayed(player: Player):
+        return not live_rounds(player)
+
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
         # Assign player B type and check if interaction occurred
-        players = group.get_players()
-        players_b = [p for p in players if p.player_role == 'B']
-        players_a = [p for p in players if p.player_role == 'A']
-
-        if not players_b or not players_a:
-            return
-
-        player_b = players_b[0]
-        player_a = players_a[0]
-        
-        interaction = player_b.field_maybe_none('interaction')
-        if interaction is None:
-            raise RuntimeError("Player B interaction decision missing when assigning type.")
-        
-        if interaction:
-            # Randomly assign type 1 or 2
-            player_b.player_b_type = random.randint(1, 2)
-            player_a.player_b_type = player_b.player_b_type  # Player A sees the type
-        else:
-            # No interaction, assign default (won't be used)
-            player_b.player_b_type = 0
-            player_a.player_b_type = 0
+        assign_b_type(group)
+        if not group.interaction and fast_path(group):
+            settle_group(group, C)
 
 
-class WaitForAction(WaitPage):
+class WaitForAction(TimedWaitPage):
     title_text = "En attente du choix d’action"
     body_text = "Veuillez patienter pendant que le Joueur A sélectionne une action."
     wait_for_all_groups = False
 
     @staticmethod
     def is_displayed(player: Player):
-        return True
+        return not live_rounds(player) and not combined_payment(player) and not skips_transaction(player)
 
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        buyer = next((p for p in players if p.player_role == 'A'), None)
-        seller = next((p for p in players if p.player_role == 'B'), None)
-        if buyer is None or seller is None:
-            raise RuntimeError("Both buyer and seller are required in WaitForAction.")
-        interaction = seller.interaction
+        interaction = group.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError("Player B interaction decision missing before WaitForAction.")
-        if interaction and buyer.player_b_type is None:
-            raise RuntimeError("Player A missing player_b_type before WaitForAction.")
+        if interaction and group.field_maybe_none('player_b_type') is None:
+            raise RuntimeError("Player B type missing before WaitForAction.")
         if interaction:
-            action = buyer.field_maybe_none('action_chosen')
+            action = group.field_maybe_none('action_chosen')
             if action not in [1, 2]:
                 raise RuntimeError("Player A action choice missing before WaitForAction.")
 
-class ActionChoice(Page):
-    form_model = 'player'
+class ActionChoice(TimeoutPage):
+    form_model = 'group'
     form_fields = ['action_chosen']
     
     @staticmethod
@@ -540,9 +566,8 @@ class ActionChoice(Page):
         role = player.player_role
         if role is None:
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at ActionChoice in round {player.round_number}.")
-        if role == 'A':
-            partner = player.set_partner()
-            interaction = partner.interaction
+        if role == 'A' and not live_rounds(player) and not combined_payment(player):
+            interaction = player.field_maybe_none('interaction')
             if interaction is None:
                 raise RuntimeError(
                     f"Partner interaction decision missing before ActionChoice for player {player.id_in_subsession}."
@@ -558,70 +583,47 @@ class ActionChoice(Page):
 
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
         player_b_type = player.field_maybe_none('player_b_type')
         if player_b_type is None:
             raise RuntimeError("Player B type missing when rendering ActionChoice.")
-        interaction = partner.field_maybe_none('interaction')
+        interaction = player.field_maybe_none('interaction')
         if interaction is None:
             interaction = False
 
-        if player_b_type == 1:
-            revenue_action_1 = C.REVENUE_1
-            revenue_action_2 = C.REVENUE_2
-        else:
-            revenue_action_1 = C.REVENUE_2
-            revenue_action_2 = C.REVENUE_2
-
-        action_info = [
-            {
-                'label': 'Action 1',
-                'cost': C.ACTION_1_COST,
-                'revenue': revenue_action_1,
-                'net_gain': revenue_action_1 - C.ACTION_1_COST,
-            },
-            {
-                'label': 'Action 2',
-                'cost': C.ACTION_2_COST,
-                'revenue': revenue_action_2,
-                'net_gain': revenue_action_2 - C.ACTION_2_COST,
-            },
-        ]
-
         return {
             'player_b_type': player_b_type,
             'interaction': interaction,
-            'action_info': action_info,
+            'action_info': action_info(player_b_type),
             'price1_offer': player.field_maybe_none('price1_offer'),
             'price2_offer': player.field_maybe_none('price2_offer'),
         }
 
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        default_on_timeout(player, timeout_happened, 'action_chosen', suited_action)
+
 
-class WaitForPricePayment(WaitPage):
+class WaitForPricePayment(TimedWaitPage):
     title_text = "Patientez"
     body_text = "Merci de patienter le temps que le Joueur A choisisse quel prix il souhaite payer."
     wait_for_all_groups = False
 
     @staticmethod
     def is_displayed(player: Player):
-        return True
+        return not live_rounds(player) and not skips_transaction(player)
 
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        buyer = next((p for p in players if p.player_role == 'A'), None)
-        seller = next((p for p in players if p.player_role == 'B'), None)
-        if buyer is None or seller is None:
-            raise RuntimeError("Both buyer and seller are required in WaitForPricePayment.")
-        interaction = seller.interaction
+        interaction = group.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError("Player B interaction decision missing before WaitForPricePayment.")
-        if interaction and buyer.field_maybe_none('price_paid') is None:
+        if interaction and group.field_maybe_none('price_paid') is None:
             raise RuntimeError("Player A price payment missing before WaitForPricePayment.")
+        settle_group(group, C)
 
 
-class PricePayment(Page):
-    form_model = 'player'
+class PricePayment(TimeoutPage):
+    form_model = 'group'
     form_fields = ['price_paid']
     
     @staticmethod
@@ -629,10 +631,9 @@ class PricePayment(Page):
         role = player.player_role
         if role is None:
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at PricePayment in round {player.round_number}.")
-        if role != 'A':
+        if role != 'A' or live_rounds(player) or combined_payment(player):
             return False
-        partner = player.set_partner()
-        interaction = partner.field_maybe_none('interaction')
+        interaction = player.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError(
                 f"Partner interaction decision missing before PricePayment for player {player.id_in_subsession}."
@@ -652,99 +653,188 @@ class PricePayment(Page):
     
     @staticmethod
     def error_message(player: Player, values):
-        price1 = player.field_maybe_none('price1_offer')
-        price2 = player.field_maybe_none('price2_offer')
-        if values['price_paid'] not in [price1, price2]:
-            return f'Vous devez choisir soit le Prix 1 ({price1} points), soit le Prix 2 ({price2} points).'
-    
+        return price_paid_error(player, values['price_paid'])
+
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
-        # Store for partner feedback
+        default_on_timeout(player, timeout_happened, 'price_paid', action_price)
+
+
+class ActionPayment(TimeoutPage):
+    """ActionChoice and PricePayment on one form, for sessions with
+    ``combined_payment=True``: saves A a page load and the WaitForAction
+    barrier in every interacting round. The fields are the same."""
+    form_model = 'group'
+    form_fields = ['action_chosen', 'price_paid']
+
+    @staticmethod
+    def is_displayed(player: Player):
+        role = player.player_role
+        if role is None:
+            raise RuntimeError(f"Player {player.id_in_subsession} missing role at ActionPayment in round {player.round_number}.")
+        if role != 'A' or live_rounds(player) or not combined_payment(player):
+            return False
+        interaction = player.field_maybe_none('interaction')
+        if interaction is None:
+            raise RuntimeError(
+                f"Partner interaction decision missing before ActionPayment for player {player.id_in_subsession}."
+            )
+        return interaction
+
+    @staticmethod
+    def vars_for_template(player: Player):
+        player_b_type = player.field_maybe_none('player_b_type')
+        if player_b_type is None:
+            raise RuntimeError("Player B type missing when rendering ActionPayment.")
+        return {
+            'player_b_type': player_b_type,
+            'action_info': action_info(player_b_type),
+            'price1_offer': player.field_maybe_none('price1_offer'),
+            'price2_offer': player.field_maybe_none('price2_offer'),
+        }
+
+    @staticmethod
+    def error_message(player: Player, values):
+        errors = {}
+        if values.get('action_chosen') not in [1, 2]:
+            errors['action_chosen'] = 'Veuillez sélectionner une action avant de continuer.'
+        price_error = price_paid_error(player, values.get('price_paid'))
+        if price_error:
+            errors['price_paid'] = price_error
+        return errors or None
+
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        default_on_timeout(player, timeout_happened, 'action_chosen', suited_action)
+        default_on_timeout(player, timeout_happened, 'price_paid', action_price)
+
+
+class LiveRound(TimeoutPage):
+    """The whole round on one page, for sessions with ``live_rounds=True``.
+
+    Replaces PriceOffer to WaitForPricePayment: each decision is a live
+    message, ``Group.stage`` tracks where the pair is, and both players get
+    the new state pushed. Once the pair is settled the page submits itself
+    and RoundResults follows as usual. If the page times out first, the
+    moves left get the defaults of the decision pages (finish_live_round).
+    """
+    @staticmethod
+    def is_displayed(player: Player):
+        return live_rounds(player)
+
+    @staticmethod
+    def vars_for_template(player: Player):
+        return {
+            'player_role': player.player_role,
+            'price_choices': [
+                (f'{price1}-{price2}', f'Prix 1 : {price1} points, Prix 2 : {price2} points')
+                for price1, price2 in C.PRICE_VECTORS
+            ],
+        }
+
+    @staticmethod
+    def live_method(player: Player, data):
+        group = player.group
         partner = player.set_partner()
-        price_paid = player.field_maybe_none('price_paid')
-        if price_paid is None:
-            raise RuntimeError("Price paid must be selected before leaving PricePayment.")
-        partner.partner_price_paid = price_paid
-        partner.partner_action = player.field_maybe_none('action_chosen')
+        if data.get('type') == 'load':
+            return {player.id_in_group: live_state(group, player)}
+        if player.player_role == 'A':
+            buyer, seller = player, partner
+        else:
+            buyer, seller = partner, player
+        error = advance_live_round(group, buyer, seller, player, data)
+        if error:
+            return {player.id_in_group: dict(error=error)}
+        return {p.id_in_group: live_state(group, p) for p in (buyer, seller)}
+
+    @staticmethod
+    def error_message(player: Player, values):
+        if player.group.stage != 'results':
+            return "Le tour n'est pas encore terminé."
+
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        if timeout_happened:
+            finish_live_round(player)
 
 
-class RoundResults(Page):
+class RoundResults(TimedPage):
     @staticmethod
     def is_displayed(player: Player):
         return True
 
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
+        group = player.group
         role = player.field_maybe_none('player_role')
 
-        # Calculate payoffs
-        player.calculate_payoff()
-        partner.calculate_payoff()
-
-        partner_interaction = partner.field_maybe_none('interaction')
-        player_interaction = player.field_maybe_none('interaction')
-        player_price_paid = player.field_maybe_none('price_paid')
-        partner_price_paid = partner.field_maybe_none('price_paid')
-        player_price1 = player.field_maybe_none('price1_offer')
-        player_price2 = player.field_maybe_none('price2_offer')
-        partner_price1 = partner.field_maybe_none('price1_offer')
-        partner_price2 = partner.field_maybe_none('price2_offer')
+        interaction = group.field_maybe_none('interaction')
+        price_paid = group.field_maybe_none('price_paid')
+        price1 = group.field_maybe_none('price1_offer')
+        price2 = group.field_maybe_none('price2_offer')
         player_revenue = player.field_maybe_none('revenue')
-        action_chosen = player.field_maybe_none('action_chosen')
+        action_chosen = group.field_maybe_none('action_chosen')
 
         if role is None:
             return {
                 'player_role': None,
-                'interaction': partner_interaction,
+                'interaction': interaction,
                 'payoff': player.round_payoff,
                 'outside_option': C.OUTSIDE_OPTION
             }
         
         if role == 'A':
             action_cost = None
-            if partner_interaction and action_chosen:
+            if interaction and action_chosen:
                 action_cost = C.ACTION_2_COST if action_chosen == 2 else C.ACTION_1_COST
             
             return {
                 'player_role': 'A',
-                'price1_offer': player_price1,
-                'price2_offer': player_price2,
-                'interaction': partner_interaction,
-                'interaction_text': "d'interagir" if partner_interaction else "de ne pas interagir",
-                'price_paid': player_price_paid if partner_interaction else None,
-                'has_price_paid': partner_interaction and player_price_paid is not None,
+                'price1_offer': price1,
+                'price2_offer': price2,
+                'interaction': interaction,
+                'interaction_text': "d'interagir" if interaction else "de ne pas interagir",
+                'price_paid': price_paid if interaction else None,
+                'has_price_paid': interaction and price_paid is not None,
                 'payoff': player.round_payoff,
                 'outside_option': C.OUTSIDE_OPTION,
-                'revenue': player_revenue if partner_interaction else None,
-                'has_revenue': partner_interaction and player_revenue is not None,
+                'revenue': player_revenue if interaction else None,
+                'has_revenue': interaction and player_revenue is not None,
                 'action_cost': action_cost,
-                'action_chosen': action_chosen if partner_interaction else None
+                'action_chosen': action_chosen if interaction else None
             }
         else:  # Player B
             return {
                 'player_role': 'B',
-                'price1_offer': partner_price1,
-                'price2_offer': partner_price2,
-                'interaction': player_interaction,
-                'interaction_text': "d'interagir" if player_interaction else "de ne pas interagir",
-                'price_paid': partner_price_paid if player_interaction else None,
-                'has_price_paid': player_interaction and partner_price_paid is not None,
+                'price1_offer': price1,
+                'price2_offer': price2,
+                'interaction': interaction,
+                'interaction_text': "d'interagir" if interaction else "de ne pas interagir",
+                'price_paid': price_paid if interaction else None,
+                'has_price_paid': interaction and price_paid is not None,
                 'payoff': player.round_payoff,
                 'outside_option': C.OUTSIDE_OPTION
             }
 
-class WaitForRoundResults(WaitPage):
+class WaitForRoundResults(TimedWaitPage):
     wait_for_all_groups = True
     title_text = 'En attente'
     body_text = 'Veuillez patienter jusqu’à ce que tous les participants aient consulté les résultats de leur tour.'
 
     @staticmethod
     def is_displayed(player: Player):
-        return player.round_number < C.NUM_ROUNDS
+        return player.round_number < C.NUM_ROUNDS and not market_barrier(player)
 
 
-class FinalResults(Page):
+class WaitForMarketRound(MarketWaitPage):
+    body_text = 'Veuillez patienter jusqu’à ce que tous les participants de votre marché aient consulté les résultats de leur tour.'
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number < C.NUM_ROUNDS and market_barrier(player)
+
+
+class FinalResults(TimedPage):
     @staticmethod
     def is_displayed(player: Player):
         if player.round_number == C.NUM_ROUNDS and player.player_role is None:
@@ -755,19 +845,11 @@ class FinalResults(Page):
     
     @staticmethod
     def vars_for_template(player: Player):
-        round_payoffs = []
-        for past_round in player.in_all_rounds():
-            payoff = past_round.field_maybe_none('round_payoff')
-            if payoff is None:
-                raise RuntimeError(
-                    f"Round payoff missing for player {player.id_in_subsession} in round {past_round.round_number}."
-                )
-            round_payoffs.append(payoff)
-
-        total_payoff = sum(round_payoffs)
-        total_euros = total_payoff.to_real_world_currency(player.session)  # 1 point = 25 Euro-cents = 0.25 EUR
-        participation_fee = player.session.config.get('participation_fee', 0)
-        total_payment = total_euros + participation_fee
+        summary = payment_summary(player)
+        total_payoff = summary['total_payoff']
+        total_euros = summary['total_euros']
+        participation_fee = summary['participation_fee']
+        total_payment = summary['total_payment']
 
         # Store for CSV export / Monitor
         player.total_payoff_points = float(total_payoff)
@@ -783,11 +865,11 @@ class FinalResults(Page):
             'participation_fee_rounded': f"{participation_fee:.2f}",
             'total_payment': total_payment,
             'total_payment_rounded': f"{total_payment:.2f}",
-            'rounds': player.in_all_rounds()
+            'rounds': summary['rounds']
         }
 
 
-class WaitForFinalResults(WaitPage):
+class WaitForFinalResults(TimedWaitPage):
     wait_for_all_groups = True
     title_text = "En attente"
     body_text = "Veuillez patienter pendant que tous les participants consultent les résultats finaux."
@@ -800,8 +882,11 @@ class WaitForFinalResults(WaitPage):
 page_sequence = [
     Welcome,
     WaitForAllPlayers,
+    WaitForMarketStart,
     ControlQuiz,
+    WaitForMarketArrival,
     RoleAssignment,
+    LiveRound,
     PriceOffer,
     WaitForPrices,
     InteractionDecision,
@@ -809,9 +894,61 @@ page_sequence = [
     ActionChoice,
     WaitForAction,
     PricePayment,
+    ActionPayment,
     WaitForPricePayment,
     RoundResults,
     WaitForRoundResults,
+    WaitForMarketRound,
     WaitForFinalResults,
     FinalResults
 ]
+
+
+def vars_for_admin_report(subsession):
+    return admin_report(subsession, C.MARKET_SIZE, page_sequence)
+
+
+def custom_export(players):
+    return export_events(players, PageTiming)
+
+
+def custom_export_page_times(players):
+    return export_page_times(players, PageTiming, page_sequence)
+
+
+def custom_export_stragglers(players):
+    return export_stragglers(players, PageTiming, page_sequence)
+
+
+def custom_export_quiz(players):
+    return export_attempts(players, QuizAttempt)
+
+
+def custom_export_timeouts(players):
+    return export_timeouts(players)
+
+
+# Per-player transaction columns before they moved to Group:
+# old column -> (roles whose row had it, Group field)
+COMPAT_COLUMNS = dict(
+    price_choice=('A', 'price_choice'),
+    price1_offer=('A', 'price1_offer'),
+    price2_offer=('A', 'price2_offer'),
+    action_chosen=('A', 'action_chosen'),
+    price_paid=('A', 'price_paid'),
+    interaction=('B', 'interaction'),
+    player_b_type=('AB', 'player_b_type'),
+    partner_price1=('B', 'price1_offer'),
+    partner_price2=('B', 'price2_offer'),
+    partner_interaction=('A', 'interaction'),
+    partner_action=('B', 'action_chosen'),
+    partner_price_paid=('B', 'price_paid'),
+)
+
+
+def custom_export_compat(players):
+    return export_compat(players, COMPAT_COLUMNS)
+
+
+def custom_export_transactions(players):
+    return export_transactions(players, ['price_choice'])
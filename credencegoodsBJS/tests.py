@@ -0,0 +1,340 @@
+import inspect
+
+from otree.api import *
+from otree.live import call_live_method_compat
+from analysis.simulator import round_payoffs
+from credencegoods.arrival import seat_of
+from credencegoods.draws import market_members, matching_scheme, precompute_draws, stream
+from . import *
+
+
+# Decisions rotate with the round and the player's id, so that every round
+# has pairs that interact and pairs that do not, and over the session every
+# price pair, action and price paid is played against both B types.
+PRICE_CHOICES = ['2-3', '2-7', '4-7']
+
+
+def interacts(player):
+    rate = player.session.config.get('bot_interaction_rate')
+    if rate is not None:
+        # set by the load tests (benchmarks/fast_path.py), drawn per pair and round
+        rng = stream(player.session.code, 'bot-interaction', player.round_number, player.id_in_subsession)
+        return rng.random() < rate
+    return (player.round_number + player.id_in_subsession) % 4 != 0
+
+
+def price_choice(player):
+    return PRICE_CHOICES[(player.round_number + player.id_in_subsession) % 3]
+
+
+def action(player):
+    return 1 + (player.round_number + player.id_in_subsession) % 2
+
+
+def price_paid(player):
+    return player.price1_offer if player.round_number % 2 else player.price2_offer
+
+
+def times_out(bot):
+    """With decision timeouts, A idles every third round and B the round
+    after, so that every default is applied over the session."""
+    if not bot.session.config.get('decision_timeout'):
+        return False
+    return bot.round_number % 3 == (0 if bot.player.player_role == 'A' else 1)
+
+
+def live_idle_role(round_number, session):
+    """With decision timeouts, the live round stalls on A's first move every
+    third round and on B's the round after: the role left idle, or None."""
+    if not session.config.get('decision_timeout'):
+        return None
+    return {0: 'A', 1: 'B'}.get(round_number % 3)
+
+
+def timed_out(bot, page_class):
+    """Let ``page_class`` time out and return the defaults flagged."""
+    yield Submission(page_class, timeout_happened=True, check_html=False)
+    return bot.player.timeout_defaults.split(',')
+
+
+def expected_round_payoffs(buyer, seller):
+    """(A, B) payoffs following the rules of the instructions."""
+    if not seller.interaction:
+        return C.OUTSIDE_OPTION, C.OUTSIDE_OPTION
+    if seller.player_b_type == 1 and buyer.action_chosen == 1:
+        revenue = C.REVENUE_1
+    else:
+        revenue = C.REVENUE_2
+    cost = C.ACTION_1_COST if buyer.action_chosen == 1 else C.ACTION_2_COST
+    return revenue - cost - buyer.price_paid, buyer.price_paid
+
+
+def simulated_round_payoffs(buyer, seller):
+    """The same pair played by analysis.simulator, which must agree with the app."""
+    return round_payoffs(
+        'baseline',
+        buyer.price1_offer,
+        buyer.price2_offer,
+        seller.interaction,
+        seller.field_maybe_none('player_b_type'),
+        buyer.field_maybe_none('action_chosen'),
+        buyer.field_maybe_none('price_paid'),
+    )
+
+
+def seat(player):
+    return seat_of(player, C.MARKET_SIZE)
+
+
+def replayed_draws(bot):
+    """The session's draws recomputed from its code alone."""
+    players = bot.subsession.get_players()
+    return precompute_draws(
+        bot.session.code, market_members(players, seat), C.NUM_ROUNDS, matching=matching_scheme(bot.session),
+    )
+
+
+def expected_total_payment(bot):
+    total = sum(p.round_payoff for p in bot.player.in_all_rounds())
+    return total.to_real_world_currency(bot.session) + bot.session.config['participation_fee']
+
+
+def check_admin_report(bot):
+    """The market's running totals in the admin report agree with its pairs."""
+    market_id = bot.player.matching_group_id
+    buyers = Player.objects_filter(session_id=bot.session.id, matching_group_id=market_id, player_role='A')
+    groups = [buyer.group for buyer in buyers]
+    interacting = [g for g in groups if g.interaction]
+    report = {row['matching_group_id']: row for row in vars_for_admin_report(bot.subsession)['markets']}
+    totals = report[market_id]['cumulative']
+    expect(totals['pairs'], len(groups))
+    expect(totals['pairs'], totals['expected'])
+    expect(totals['interactions'], len(interacting))
+    expect(totals['overtreatment'], sum(g.player_b_type == 1 and g.action_chosen == 2 for g in interacting))
+    expect(totals['undertreatment'], sum(g.player_b_type == 2 and g.action_chosen == 1 for g in interacting))
+    expect(totals['price_paid'], sum(g.price_paid for g in interacting))
+
+
+def check_transactions_export(bot):
+    """One transactions row per pair and round, matching the Group rows."""
+    players = Player.objects_filter(session_id=bot.session.id).order_by('id')
+    header, *rows = custom_export_transactions(players)
+    expect(len(rows), bot.session.num_participants // 2 * C.NUM_ROUNDS)
+    rows = {(row[header.index('round_number')], row[header.index('group_id_in_subsession')]): row for row in rows}
+    for player in bot.player.in_all_rounds():
+        row = dict(zip(header, rows[player.round_number, player.group.id_in_subsession]))
+        expect(row[f'participant_code_{player.player_role}'], bot.participant.code)
+        expect(row[f'payoff_{player.player_role}'], player.round_payoff)
+        expect(row['interaction'], player.group.interaction)
+        expect(row['price_paid'], player.group.field_maybe_none('price_paid'))
+
+
+def check_events_export(bot):
+    """The events export of one participant has their PageTiming rows only."""
+    # the rounds played: the server may still log this round's wait page
+    # when the bots play over HTTP (benchmarks/load_test.py)
+    players = bot.player.in_previous_rounds()
+    header, *rows = custom_export(players)
+    expect(len(rows), sum(len(PageTiming.filter(player=player)) for player in players))
+    expect({row[header.index('participant_code')] for row in rows}, {bot.participant.code})
+
+
+def live_send(method, id_in_group, data):
+    """Call the live method and return its replies (oTree 6 wraps even a
+    plain live_method in an async generator, which is drained here)."""
+    result = method(id_in_group, data)
+    if inspect.isasyncgen(result):
+        try:
+            result.__anext__().send(None)
+        except StopIteration as stop:
+            return stop.value
+    return result
+
+
+def check_quiz_live(method, group):
+    for player in group.get_players():
+        if QuizAttempt.filter(player=player):
+            continue
+        replies = live_send(method, player.id_in_group, dict(question='cq_q1', answer='A'))
+        expect(replies[player.id_in_group]['correct'], False)
+        replies = live_send(method, player.id_in_group, dict(question='cq_q1', answer='B'))
+        expect(replies[player.id_in_group]['correct'], True)
+        replies = live_send(method, player.id_in_group, dict(question='cq_q9', answer='B'))
+        expect('error', 'in', replies[player.id_in_group])
+
+
+def check_own_quiz_live(bot):
+    """The runner checks the quiz once per pair (call_live_method); with
+    bots arriving one by one (benchmarks/load_test.py), a seat swap can move
+    a participant into a pair that was checked without them."""
+    players = {p.id_in_group: p for p in bot.group.get_players()}
+
+    def method(id_in_group, data):
+        return call_live_method_compat(ControlQuiz.live_method, players[id_in_group], data)
+
+    check_quiz_live(method, bot.group)
+
+
+def call_live_method(method, group, page_class, **kwargs):
+    if page_class is ControlQuiz:
+        check_quiz_live(method, group)
+    elif page_class is LiveRound:
+        play_live_round(method, group)
+
+
+def play_live_round(method, group):
+    players = {p.player_role: p for p in group.get_players()}
+    buyer, seller = players['A'], players['B']
+    idle = live_idle_role(group.round_number, group.session)
+    if idle == 'A':
+        return
+
+    replies = live_send(method, seller.id_in_group, dict(type='price_choice', value='2-7'))
+    expect('error', 'in', replies[seller.id_in_group])
+    replies = live_send(method, buyer.id_in_group, dict(type='price_choice', value=price_choice(buyer)))
+    expect(replies[seller.id_in_group]['stage'], 'interaction')
+    if idle == 'B':
+        return
+
+    live_send(method, seller.id_in_group, dict(type='interaction', value=interacts(seller)))
+    if interacts(seller):
+        live_send(method, buyer.id_in_group, dict(type='action_chosen', value=action(buyer)))
+        replies = live_send(method, buyer.id_in_group, dict(type='price_paid', value=C.MAX_PRICE))
+        expect('error', 'in', replies[buyer.id_in_group])
+        live_send(method, buyer.id_in_group, dict(type='price_paid', value=price_paid(buyer)))
+    expect(group.stage, 'results')
+
+
+class PlayerBot(Bot):
+    def play_round(self):
+        arrival = self.session.config.get('arrival_markets')
+        if self.round_number == 1:
+            yield Welcome
+            # with arrival markets, odd participants are ready first and fill market 1
+            fails_quiz = not arrival or self.participant.id_in_session % 2 == 0
+            check_own_quiz_live(self)
+            if fails_quiz:
+                yield SubmissionMustFail(
+                    ControlQuiz, dict(cq_q1='A', cq_q2='A', cq_q3='C', cq_q4='B'), error_fields=['cq_q1', 'cq_q4']
+                )
+            yield ControlQuiz, dict(cq_q1='B', cq_q2='A', cq_q3='C', cq_q4='A')
+            attempts = [(a.question, a.source, a.correct) for a in QuizAttempt.filter(player=self.player)]
+            # two live checks of Q1, then the wrong and the right submission
+            expect(len(attempts), 10 if fails_quiz else 6)
+            expect(attempts[:2], [('cq_q1', 'live', False), ('cq_q1', 'live', True)])
+            expect(sum(1 for _, source, correct in attempts if source == 'submit' and not correct), 2 if fails_quiz else 0)
+            # the export holds this participant's attempts only
+            header, *rows = custom_export_quiz([self.player])
+            expect([(row[header.index('question')], row[header.index('source')]) for row in rows],
+                   [(question, source) for question, source, _ in attempts])
+            if arrival:
+                # seated by WaitForMarketArrival, a wait page the bot went through
+                expect(self.player.matching_group_id, 1 if self.participant.id_in_session % 2 else 2)
+            yield RoleAssignment
+
+        if self.session.config.get('live_rounds'):
+            idle = live_idle_role(self.round_number, self.session)
+            yield Submission(LiveRound, timeout_happened=idle is not None, check_html=False)
+            if idle is not None:
+                self.check_live_timeout(idle)
+        elif self.player.player_role == 'A' and times_out(self):
+            yield from self.play_timeouts()
+        elif self.player.player_role == 'A':
+            if self.round_number == 1:
+                yield SubmissionMustFail(PriceOffer, dict(price_choice='3-5'))
+            yield PriceOffer, dict(price_choice=price_choice(self.player))
+            # both players read the pair's single record
+            expect(self.player.set_partner().price2_offer, self.player.price2_offer)
+            if self.player.set_partner().interaction:
+                expect(self.player.player_b_type, 'in', [1, 2])
+                if self.session.config.get('combined_payment'):
+                    yield SubmissionMustFail(
+                        ActionPayment, dict(action_chosen=action(self.player), price_paid=C.MAX_PRICE),
+                        error_fields=['price_paid'],
+                    )
+                    yield ActionPayment, dict(action_chosen=action(self.player), price_paid=price_paid(self.player))
+                else:
+                    yield ActionChoice, dict(action_chosen=action(self.player))
+                    yield SubmissionMustFail(PricePayment, dict(price_paid=C.MAX_PRICE))
+                    yield PricePayment, dict(price_paid=price_paid(self.player))
+        elif times_out(self):
+            defaults = yield from timed_out(self, InteractionDecision)
+            expect(defaults, ['interaction'])
+            expect(self.group.interaction, False)
+        else:
+            yield InteractionDecision, dict(interaction=interacts(self.player))
+
+        player = self.player
+        partner = player.set_partner()
+        buyer, seller = (player, partner) if player.player_role == 'A' else (partner, player)
+        buyer_payoff, seller_payoff = expected_round_payoffs(buyer, seller)
+        expect(player.round_payoff, buyer_payoff if player is buyer else seller_payoff)
+        expect(simulated_round_payoffs(buyer, seller), (buyer_payoff, seller_payoff))
+
+        draws = replayed_draws(self)
+        if self.round_number == 1:
+            expect(draws, self.session.vars['draws'])
+        # the bulk assignment put the drawn pair in the group of the same index
+        pair = draws['round_matrices'][self.round_number][self.group.id_in_subsession - 1]
+        expect([seat(p) for p in self.group.get_players()], pair)
+        if seller.interaction:
+            drawn = draws['b_types'][self.round_number][self.group.id_in_subsession - 1]
+            expect(seller.player_b_type, int(drawn))
+        expect(player.payoff, player.round_payoff)
+        yield RoundResults
+        events = {(t.page_name, t.event) for t in PageTiming.filter(player=self.player)}
+        expect(('RoundResults', 'submitted'), 'in', events)
+        if not self.session.config.get('live_rounds'):
+            pages = {page_name for page_name, _ in events}
+            if self.session.config.get('fast_path') and not seller.interaction:
+                # a declined pair goes straight from B's decision to RoundResults
+                expect('WaitForAction', 'not in', pages)
+                expect('WaitForPricePayment', 'not in', pages)
+            else:
+                expect('WaitForPricePayment', 'in', pages)
+            if self.session.config.get('combined_payment'):
+                expect('WaitForAction', 'not in', pages)
+
+        if self.round_number == C.NUM_ROUNDS:
+            expect(f'{expected_total_payment(self):.2f}', 'in', self.html)
+            check_admin_report(self)
+            check_transactions_export(self)
+            check_events_export(self)
+            yield FinalResults
+
+    def play_timeouts(self):
+        """A's decisions of the round, all left to time out."""
+        defaults = yield from timed_out(self, PriceOffer)
+        expect(defaults, ['price_choice'])
+        expect(self.group.price_choice, 'in', PRICE_CHOICES)
+        expect(f'{self.group.price1_offer}-{self.group.price2_offer}', self.group.price_choice)
+        if not self.group.interaction:
+            return
+        suited = 1 if self.group.player_b_type == 1 else 2
+        if self.session.config.get('combined_payment'):
+            defaults = yield from timed_out(self, ActionPayment)
+        else:
+            yield from timed_out(self, ActionChoice)
+            defaults = yield from timed_out(self, PricePayment)
+        expect(defaults, ['price_choice', 'action_chosen', 'price_paid'])
+        expect(self.group.action_chosen, suited)
+        expect(self.group.price_paid, self.group.price1_offer if suited == 1 else self.group.price2_offer)
+
+    def check_live_timeout(self, idle):
+        """The stalled live round was finished with the defaults; the
+        session's default_interaction makes B interact, so A's action and
+        price default too."""
+        group = self.group
+        expect(group.stage, 'results')
+        expect(group.interaction, True)
+        if self.player.player_role == 'B':
+            expect(self.player.timeout_defaults.split(','), ['interaction'])
+            return
+        defaults = ['action_chosen', 'price_paid']
+        if idle == 'A':
+            defaults.insert(0, 'price_choice')
+            expect(group.price_choice, 'in', PRICE_CHOICES)
+        expect(self.player.timeout_defaults.split(','), defaults)
+        suited = 1 if group.player_b_type == 1 else 2
+        expect(group.action_chosen, suited)
+        expect(group.price_paid, group.price1_offer if suited == 1 else group.price2_offer)
@@ -1,5 +1,20 @@
 from otree.api import *
-import random
+
+from credencegoods.arrival import ArrivalWaitPage, arrival_markets
+from credencegoods.assignment import assign_all_rounds, check_assigned
+from credencegoods.barrier import START_BARRIER, MarketWaitPage, market_barrier
+from credencegoods.draws import drawn_b_type, drawn_price_vector
+from credencegoods.matching import partner_of
+from credencegoods.payoffs import automatic_price, payment_summary, payoff_table, settle_group
+from credencegoods.report import admin_report
+from credencegoods.quiz import check_answer, export_attempts, quiz_errors
+from credencegoods.timeouts import (
+    TimeoutPage, configured_interaction, default_on_timeout, export_timeouts, suited_action,
+)
+from credencegoods.timing import (
+    TimedPage, TimedWaitPage, export_events, export_page_times, export_stragglers,
+)
+from credencegoods.transaction import export_compat, export_transactions, fast_path, group_field, skips_transaction
 
 
 doc = """
@@ -32,17 +47,9 @@ class Subsession(BaseSubsession):
 
 
 class Group(BaseGroup):
-    pass
-
-
-class Player(BasePlayer):
-    # Role and identification
-    player_role = models.StringField()
-    player_id_in_role = models.StringField()
-    matching_group_id = models.IntegerField()
-    condition_price = models.StringField()
-
+    # The pair's transaction, one record per round (see credencegoods.transaction)
     # Exogenous prices (set by the experimenter)
+    condition_price = models.StringField()
     price1_offer = models.IntegerField()
     price2_offer = models.IntegerField()
     price_paid = models.IntegerField(blank=True)
@@ -56,6 +63,18 @@ class Player(BasePlayer):
     interaction = models.BooleanField(
         choices=[[True, 'Oui'], [False, 'Non']],
     )
+    player_b_type = models.IntegerField()  # 1 or 2 if B interacts, 0 otherwise
+    reported_outcome = models.StringField(initial='')  # see credencegoods.report
+
+
+class Player(BasePlayer):
+    # Role and identification
+    player_role = models.StringField()
+    player_id_in_role = models.StringField()
+    matching_group_id = models.IntegerField()
+    partner_pk = models.IntegerField()  # Player.id of this round's partner
+    barrier_reached = models.IntegerField(initial=0)  # see credencegoods.barrier
+    timeout_defaults = models.StringField(initial='')  # see credencegoods.timeouts
 
     # Control quiz (updated text will be provided separately)
     cq_q1 = models.StringField(
@@ -91,7 +110,6 @@ class Player(BasePlayer):
     )
 
     # Game state variables
-    player_b_type = models.IntegerField()
     revenue = models.IntegerField()
     round_payoff = models.CurrencyField()
 
@@ -101,170 +119,70 @@ class Player(BasePlayer):
     participation_fee = models.FloatField(initial=0)
     total_payment = models.FloatField(initial=0)
 
+    # The pair's transaction, read from Group
+    condition_price = group_field('condition_price')
+    price1_offer = group_field('price1_offer')
+    price2_offer = group_field('price2_offer')
+    interaction = group_field('interaction')
+    player_b_type = group_field('player_b_type')
+    action_chosen = group_field('action_chosen')
+    price_paid = group_field('price_paid')
+
     def set_partner(self):
-        partners = [p for p in self.group.get_players() if p.id_in_group != self.id_in_group]
-        if len(partners) != 1:
-            raise RuntimeError("Group configuration invalid: unable to identify partner.")
-        return partners[0]
+        return partner_of(self)
 
-    def calculate_payoff(self):
-        partner = self.set_partner()
-        role = self.field_maybe_none('player_role')
+    def role(self):
+        return self.player_role or 'A'
 
-        if role is None:
-            raise RuntimeError(f"Player {self.id_in_subsession} is missing a role in round {self.round_number}.")
 
-        if role == 'A':
-            partner_interaction = partner.field_maybe_none('interaction')
-            if partner_interaction is None:
-                raise RuntimeError(
-                    f"Partner interaction decision missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if not partner_interaction:
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.revenue = 0
-                self.payoff = cu(self.round_payoff)
-                return
-
-            partner_type = partner.field_maybe_none('player_b_type')
-            if partner_type is None:
-                raise RuntimeError(
-                    f"Player B type missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            action_chosen = self.field_maybe_none('action_chosen')
-            if action_chosen is None:
-                raise RuntimeError(
-                    f"Action choice missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-
-            if partner_type == 1:
-                revenue = C.REVENUE_1 if action_chosen == 1 else C.REVENUE_2
-            else:
-                revenue = C.REVENUE_2
-
-            cost = C.ACTION_1_COST if action_chosen == 1 else C.ACTION_2_COST
-            price_paid = self.field_maybe_none('price_paid')
-            if price_paid is None:
-                raise RuntimeError(
-                    f"Price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-
-            self.revenue = revenue
-            self.round_payoff = revenue - cost - price_paid
-            self.payoff = cu(self.round_payoff)
-        else:
-            interaction = self.field_maybe_none('interaction')
-            if interaction is None:
-                raise RuntimeError(
-                    f"Interaction decision missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if not interaction:
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.payoff = cu(self.round_payoff)
-                return
-
-            partner_price_paid = partner.field_maybe_none('price_paid')
-            if partner_price_paid is None:
-                raise RuntimeError(
-                    f"Partner price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-
-            self.round_payoff = partner_price_paid
-            self.payoff = cu(self.round_payoff)
+class PageTiming(ExtraModel):
+    """Append-only page timing events, see credencegoods.timing."""
+    player = models.Link(Player)
+    round_number = models.IntegerField()
+    page_index = models.IntegerField()
+    page_name = models.StringField()
+    event = models.StringField()
+    at = models.FloatField()  # epoch seconds
 
-    def role(self):
-        return self.player_role or 'A'
 
+class QuizAttempt(ExtraModel):
+    """Append-only control quiz answers, see credencegoods.quiz."""
+    player = models.Link(Player)
+    question = models.StringField()
+    answer = models.StringField()
+    correct = models.BooleanField()
+    source = models.StringField()  # 'live' or 'submit'
+    at = models.FloatField()  # epoch seconds
+
+
+class MarketRound(ExtraModel):
+    """Running totals of the admin report, see credencegoods.report."""
+    subsession = models.Link(Subsession)
+    round_number = models.IntegerField()
+    matching_group_id = models.IntegerField()
+    pairs = models.IntegerField()
+    interactions = models.IntegerField()
+    overtreatment = models.IntegerField()
+    undertreatment = models.IntegerField()
+    paid = models.IntegerField()  # interacting pairs, which all pay a price
+    price_paid = models.IntegerField()  # sum over the pairs that paid
 
-def creating_session(subsession: Subsession):
-    players = sorted(subsession.get_players(), key=lambda p: p.id_in_subsession)
-    market_size = C.MARKET_SIZE
-    total_players = len(players)
 
-    if total_players % market_size != 0:
-        raise RuntimeError(f"Session size {total_players} is not divisible by market size {market_size}.")
+def exogenous_prices(session, round_number, group_id_in_subsession):
+    """Prices of a pair, from the price vector drawn for its group."""
+    vector = C.PRICE_VECTORS[drawn_price_vector(session, round_number, group_id_in_subsession)]
+    return dict(price1_offer=vector['price1'], price2_offer=vector['price2'], condition_price=vector['condition'])
 
-    session = subsession.session
 
+def creating_session(subsession: Subsession):
+    # every round is assigned in round 1, see credencegoods.assignment
     if subsession.round_number == 1:
-        markets = {}
-        half_market = market_size // 2
-
-        for idx, player in enumerate(players):
-            market_id = idx // market_size + 1
-            position = idx % market_size
-            role = 'A' if position < half_market else 'B'
-            label_idx = position % half_market + 1
-            label = f"{role}{label_idx}"
-
-            player.matching_group_id = market_id
-            player.player_role = role
-            player.player_id_in_role = label
-
-            player.participant.vars['matching_group_id'] = market_id
-            player.participant.vars['player_role'] = role
-            player.participant.vars['player_id_in_role'] = label
-
-            markets.setdefault(market_id, []).append(player)
-
-        round_matrices = {}
-        for round_no in range(1, C.NUM_ROUNDS + 1):
-            round_pairs = []
-            for market_id, market_players in markets.items():
-                buyers = [p.id_in_subsession for p in market_players if p.player_role == 'A']
-                sellers = [p.id_in_subsession for p in market_players if p.player_role == 'B']
-
-                if len(buyers) != len(sellers):
-                    raise RuntimeError(f"Market {market_id}: {len(buyers)} buyers vs {len(sellers)} sellers.")
-
-                rng = random.Random(f"{session.code}-{market_id}-{round_no}")
-                rng.shuffle(buyers)
-                rng.shuffle(sellers)
-
-                for buyer_id, seller_id in zip(buyers, sellers):
-                    round_pairs.append([buyer_id, seller_id])
-
-            round_matrices[round_no] = round_pairs
-
-        session.vars['round_matrices'] = round_matrices
-
-    round_matrices = session.vars.get('round_matrices')
-    if not round_matrices:
-        raise RuntimeError("Round matrices missing in session vars.")
-
-    for player in players:
-        stored_market = player.participant.vars.get('matching_group_id')
-        stored_role = player.participant.vars.get('player_role')
-        stored_label = player.participant.vars.get('player_id_in_role')
-
-        if stored_market is None or stored_role is None or stored_label is None:
-            raise RuntimeError(f"Participant {player.participant.code} is missing stored assignments.")
-
-        player.matching_group_id = stored_market
-        player.player_role = stored_role
-        player.player_id_in_role = stored_label
-
-    subsession.set_group_matrix(round_matrices[subsession.round_number])
-
-    groups = subsession.get_groups()
-    num_groups = len(groups)
-    vector_pool = []
-    while len(vector_pool) < num_groups:
-        vector_pool.extend(C.PRICE_VECTORS)
-    rng_prices = random.Random(f"{session.code}-prices-{subsession.round_number}")
-    rng_prices.shuffle(vector_pool)
-    for group, vector in zip(groups, vector_pool[:num_groups]):
-        price1 = vector['price1']
-        price2 = vector['price2']
-        condition = vector['condition']
-        for player in group.get_players():
-            player.price1_offer = price1
-            player.price2_offer = price2
-            player.price_paid = None
-            player.condition_price = condition
-
-
-class Welcome(Page):
+        assign_all_rounds(subsession, C, Player, Group, group_fields=exogenous_prices)
+    else:
+        check_assigned(subsession)
+
+
+class Welcome(TimedPage):
     next_button_text = 'Suivant'
 
     @staticmethod
@@ -272,7 +190,10 @@ class Welcome(Page):
         return player.round_number == 1
 
 
-class ControlQuiz(Page):
+QUIZ_ERROR = 'Incorrect. Veuillez lire les instructions et réessayer.'
+
+
+class ControlQuiz(TimedPage):
     form_model = 'player'
     form_fields = ['cq_q1', 'cq_q2', 'cq_q3', 'cq_q4']
 
@@ -281,32 +202,43 @@ class ControlQuiz(Page):
         return player.round_number == 1
 
     @staticmethod
-    def error_message(player: Player, values):
-        errors = {}
-        if values['cq_q1'] != 'B':
-            errors['cq_q1'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q2'] != 'A':
-            errors['cq_q2'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q3'] != 'C':
-            errors['cq_q3'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
-        if values['cq_q4'] != 'A':
-            errors['cq_q4'] = 'Incorrect. Veuillez lire les instructions et réessayer.'
+    def live_method(player: Player, data):
+        # each answer is checked as soon as it is picked
+        return check_answer(QuizAttempt, player, data, QUIZ_ERROR)
 
-        if errors:
-            return errors
+    @staticmethod
+    def error_message(player: Player, values):
+        return quiz_errors(QuizAttempt, player, values, QUIZ_ERROR)
 
 
-class WaitForAllPlayers(WaitPage):
+class WaitForAllPlayers(TimedWaitPage):
     title_text = "En attente"
     body_text = "Veuillez patienter jusqu'à ce que tous les participants aient lu les instructions."
     wait_for_all_groups = True
 
     @staticmethod
     def is_displayed(player: Player):
-        return player.round_number == 1
+        return player.round_number == 1 and not market_barrier(player)
+
+
+class WaitForMarketStart(MarketWaitPage):
+    barrier = START_BARRIER
+    body_text = "Veuillez patienter jusqu'à ce que tous les participants de votre marché aient lu les instructions."
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number == 1 and market_barrier(player) and not arrival_markets(player)
+
+
+class WaitForMarketArrival(ArrivalWaitPage):
+    market_size = C.MARKET_SIZE
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number == 1 and arrival_markets(player)
 
 
-class RoleAssignment(Page):
+class RoleAssignment(TimedPage):
     @staticmethod
     def is_displayed(player: Player):
         if player.player_role is None:
@@ -318,7 +250,7 @@ class RoleAssignment(Page):
         return dict(player_role=player.player_role)
 
 
-class PriceInfo(Page):
+class PriceInfo(TimedPage):
     @staticmethod
     def vars_for_template(player: Player):
         price1 = player.field_maybe_none('price1_offer')
@@ -332,8 +264,8 @@ class PriceInfo(Page):
         )
 
 
-class InteractionDecision(Page):
-    form_model = 'player'
+class InteractionDecision(TimeoutPage):
+    form_model = 'group'
     form_fields = ['interaction']
 
     @staticmethod
@@ -343,8 +275,8 @@ class InteractionDecision(Page):
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at InteractionDecision in round {player.round_number}.")
         if role != 'B':
             return False
-        partner = player.set_partner()
-        if partner.price1_offer is None or partner.price2_offer is None:
+        group = player.group
+        if group.field_maybe_none('price1_offer') is None or group.field_maybe_none('price2_offer') is None:
             raise RuntimeError(
                 f"Partner price offers missing for player {player.id_in_subsession} entering InteractionDecision."
             )
@@ -352,51 +284,40 @@ class InteractionDecision(Page):
 
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
-        price1 = partner.field_maybe_none('price1_offer')
-        price2 = partner.field_maybe_none('price2_offer')
+        price1 = player.field_maybe_none('price1_offer')
+        price2 = player.field_maybe_none('price2_offer')
         if price1 is None or price2 is None:
             raise RuntimeError("Partner prices missing while rendering InteractionDecision.")
         return dict(price1=price1, price2=price2)
 
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
-        interaction = player.field_maybe_none('interaction')
-        if interaction is None:
-            raise RuntimeError("Interaction decision must be submitted before leaving the page.")
+        default_on_timeout(player, timeout_happened, 'interaction', configured_interaction)
 
 
-class WaitForInteraction(WaitPage):
+class WaitForInteraction(TimedWaitPage):
     title_text = "En attente"
     body_text = "Merci de patienter pendant que le Joueur B fait son choix."
     wait_for_all_groups = False
 
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        player_a = next((p for p in players if p.player_role == 'A'), None)
-        player_b = next((p for p in players if p.player_role == 'B'), None)
-
-        if player_a is None or player_b is None:
-            raise RuntimeError("Group members missing when assigning types.")
-
-        interaction = player_b.field_maybe_none('interaction')
+        interaction = group.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError("Player B interaction decision missing when assigning type.")
 
         if interaction:
-            player_b.player_b_type = random.randint(1, 2)
-            player_a.player_b_type = player_b.player_b_type
-            price_to_pay = player_a.price1_offer if player_b.player_b_type == 1 else player_a.price2_offer
-            player_a.price_paid = price_to_pay
+            group.player_b_type = drawn_b_type(group)
+            group.price_paid = automatic_price(group.price1_offer, group.price2_offer, group.player_b_type)
         else:
-            player_b.player_b_type = 0
-            player_a.player_b_type = 0
-            player_a.price_paid = None
+            group.player_b_type = 0
+            group.price_paid = None
+            if fast_path(group):
+                settle_group(group, C)
 
 
-class ActionChoice(Page):
-    form_model = 'player'
+class ActionChoice(TimeoutPage):
+    form_model = 'group'
     form_fields = ['action_chosen']
 
     @staticmethod
@@ -406,8 +327,7 @@ class ActionChoice(Page):
             raise RuntimeError(f"Player {player.id_in_subsession} missing role at ActionChoice in round {player.round_number}.")
         if role != 'A':
             return False
-        partner = player.set_partner()
-        interaction = partner.field_maybe_none('interaction')
+        interaction = player.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError(
                 f"Partner interaction decision missing before ActionChoice for player {player.id_in_subsession}."
@@ -422,33 +342,18 @@ class ActionChoice(Page):
 
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
         player_b_type = player.field_maybe_none('player_b_type')
         if player_b_type is None:
             raise RuntimeError("Player B type missing when rendering ActionChoice.")
-        interaction = partner.field_maybe_none('interaction') or False
-
-        if player_b_type == 1:
-            revenue_action_1 = C.REVENUE_1
-            revenue_action_2 = C.REVENUE_2
-        else:
-            revenue_action_1 = C.REVENUE_2
-            revenue_action_2 = C.REVENUE_2
-
-        action_info = [
-            dict(
-                label='Action 1',
-                cost=C.ACTION_1_COST,
-                revenue=revenue_action_1,
-                net_gain=revenue_action_1 - C.ACTION_1_COST,
-            ),
-            dict(
-                label='Action 2',
-                cost=C.ACTION_2_COST,
-                revenue=revenue_action_2,
-                net_gain=revenue_action_2 - C.ACTION_2_COST,
-            ),
-        ]
+        interaction = player.field_maybe_none('interaction') or False
+
+        table = payoff_table(C)
+        action_info = []
+        for action in (1, 2):
+            revenue, cost = table[player_b_type, action]
+            action_info.append(
+                dict(label=f'Action {action}', cost=cost, revenue=revenue, net_gain=revenue - cost)
+            )
 
         return dict(
             player_b_type=player_b_type,
@@ -458,92 +363,98 @@ class ActionChoice(Page):
             price2_offer=player.field_maybe_none('price2_offer'),
         )
 
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        default_on_timeout(player, timeout_happened, 'action_chosen', suited_action)
+
 
-class WaitForAction(WaitPage):
+class WaitForAction(TimedWaitPage):
     title_text = "En attente du choix d’action"
     body_text = "Veuillez patienter pendant que le Joueur A sélectionne une action."
     wait_for_all_groups = False
 
+    @staticmethod
+    def is_displayed(player: Player):
+        return not skips_transaction(player)
+
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        buyer = next((p for p in players if p.player_role == 'A'), None)
-        seller = next((p for p in players if p.player_role == 'B'), None)
-        if buyer is None or seller is None:
-            raise RuntimeError("Both players must be present in WaitForAction.")
-        interaction = seller.field_maybe_none('interaction')
+        interaction = group.field_maybe_none('interaction')
         if interaction is None:
             raise RuntimeError("Player B interaction decision missing before WaitForAction.")
         if interaction:
-            action = buyer.field_maybe_none('action_chosen')
+            action = group.field_maybe_none('action_chosen')
             if action not in [1, 2]:
                 raise RuntimeError("Player A action choice missing before releasing WaitForAction.")
+        settle_group(group, C)
 
 
-class RoundResults(Page):
+class RoundResults(TimedPage):
     @staticmethod
     def vars_for_template(player: Player):
-        partner = player.set_partner()
-        player.calculate_payoff()
-        partner.calculate_payoff()
-
-        partner_interaction = partner.field_maybe_none('interaction')
-        player_interaction = player.field_maybe_none('interaction')
-        player_price_paid = player.field_maybe_none('price_paid')
-        partner_price_paid = partner.field_maybe_none('price_paid')
-        player_price1 = player.field_maybe_none('price1_offer')
-        player_price2 = player.field_maybe_none('price2_offer')
-        partner_price1 = partner.field_maybe_none('price1_offer')
-        partner_price2 = partner.field_maybe_none('price2_offer')
+        group = player.group
+
+        interaction = group.field_maybe_none('interaction')
+        price_paid = group.field_maybe_none('price_paid')
+        price1 = group.field_maybe_none('price1_offer')
+        price2 = group.field_maybe_none('price2_offer')
         player_revenue = player.field_maybe_none('revenue')
-        action_chosen = player.field_maybe_none('action_chosen')
+        action_chosen = group.field_maybe_none('action_chosen')
 
         role = player.field_maybe_none('player_role')
         if role == 'A':
             action_cost = None
-            if partner_interaction and action_chosen:
+            if interaction and action_chosen:
                 action_cost = C.ACTION_2_COST if action_chosen == 2 else C.ACTION_1_COST
 
             return dict(
                 player_role='A',
-                price1_offer=player_price1,
-                price2_offer=player_price2,
-                interaction=partner_interaction,
-                interaction_text="d'interagir" if partner_interaction else "de ne pas interagir",
-                price_paid=player_price_paid if partner_interaction else None,
-                has_price_paid=partner_interaction and player_price_paid is not None,
+                price1_offer=price1,
+                price2_offer=price2,
+                interaction=interaction,
+                interaction_text="d'interagir" if interaction else "de ne pas interagir",
+                price_paid=price_paid if interaction else None,
+                has_price_paid=interaction and price_paid is not None,
                 payoff=player.round_payoff,
                 outside_option=C.OUTSIDE_OPTION,
-                revenue=player_revenue if partner_interaction else None,
-                has_revenue=partner_interaction and player_revenue is not None,
+                revenue=player_revenue if interaction else None,
+                has_revenue=interaction and player_revenue is not None,
                 action_cost=action_cost,
-                action_chosen=action_chosen if partner_interaction else None,
+                action_chosen=action_chosen if interaction else None,
             )
         else:
             return dict(
                 player_role='B',
-                price1_offer=partner_price1,
-                price2_offer=partner_price2,
-                interaction=player_interaction,
-                interaction_text="d'interagir" if player_interaction else "de ne pas interagir",
-                price_paid=partner_price_paid if player_interaction else None,
-                has_price_paid=player_interaction and partner_price_paid is not None,
+                price1_offer=price1,
+                price2_offer=price2,
+                interaction=interaction,
+                interaction_text="d'interagir" if interaction else "de ne pas interagir",
+                price_paid=price_paid if interaction else None,
+                has_price_paid=interaction and price_paid is not None,
                 payoff=player.round_payoff,
                 outside_option=C.OUTSIDE_OPTION,
             )
 
 
-class WaitForRoundResults(WaitPage):
+class WaitForRoundResults(TimedWaitPage):
     wait_for_all_groups = True
     title_text = 'En attente'
     body_text = 'Veuillez patienter jusqu’à ce que tous les participants aient consulté les résultats de leur tour.'
 
     @staticmethod
     def is_displayed(player: Player):
-        return player.round_number < C.NUM_ROUNDS
+        return player.round_number < C.NUM_ROUNDS and not market_barrier(player)
 
 
-class FinalResults(Page):
+class WaitForMarketRound(MarketWaitPage):
+    body_text = 'Veuillez patienter jusqu’à ce que tous les participants de votre marché aient consulté les résultats de leur tour.'
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return player.round_number < C.NUM_ROUNDS and market_barrier(player)
+
+
+class FinalResults(TimedPage):
     @staticmethod
     def is_displayed(player: Player):
         if player.round_number == C.NUM_ROUNDS and player.player_role is None:
@@ -552,19 +463,11 @@ class FinalResults(Page):
 
     @staticmethod
     def vars_for_template(player: Player):
-        round_payoffs = []
-        for past_round in player.in_all_rounds():
-            payoff = past_round.field_maybe_none('round_payoff')
-            if payoff is None:
-                raise RuntimeError(
-                    f"Round payoff missing for player {player.id_in_subsession} in round {past_round.round_number}."
-                )
-            round_payoffs.append(payoff)
-
-        total_payoff = sum(round_payoffs)
-        total_euros = total_payoff.to_real_world_currency(player.session)
-        participation_fee = player.session.config.get('participation_fee', 0)
-        total_payment = total_euros + participation_fee
+        summary = payment_summary(player)
+        total_payoff = summary['total_payoff']
+        total_euros = summary['total_euros']
+        participation_fee = summary['participation_fee']
+        total_payment = summary['total_payment']
 
         player.total_payoff_points = float(total_payoff)
         player.total_payoff_euros = float(total_euros)
@@ -579,11 +482,11 @@ class FinalResults(Page):
             participation_fee_rounded=f"{participation_fee:.2f}",
             total_payment=total_payment,
             total_payment_rounded=f"{total_payment:.2f}",
-            rounds=player.in_all_rounds(),
+            rounds=summary['rounds'],
         )
 
 
-class WaitForFinalResults(WaitPage):
+class WaitForFinalResults(TimedWaitPage):
     wait_for_all_groups = True
     title_text = "En attente"
     body_text = "Veuillez patienter pendant que tous les participants consultent les résultats finaux."
@@ -596,7 +499,9 @@ class WaitForFinalResults(WaitPage):
 page_sequence = [
     Welcome,
     WaitForAllPlayers,
+    WaitForMarketStart,
     ControlQuiz,
+    WaitForMarketArrival,
     RoleAssignment,
     PriceInfo,
     InteractionDecision,
@@ -605,6 +510,52 @@ page_sequence = [
     WaitForAction,
     RoundResults,
     WaitForRoundResults,
+    WaitForMarketRound,
     WaitForFinalResults,
     FinalResults,
 ]
+
+
+def vars_for_admin_report(subsession):
+    return admin_report(subsession, C.MARKET_SIZE, page_sequence)
+
+
+def custom_export(players):
+    return export_events(players, PageTiming)
+
+
+def custom_export_page_times(players):
+    return export_page_times(players, PageTiming, page_sequence)
+
+
+def custom_export_stragglers(players):
+    return export_stragglers(players, PageTiming, page_sequence)
+
+
+def custom_export_quiz(players):
+    return export_attempts(players, QuizAttempt)
+
+
+def custom_export_timeouts(players):
+    return export_timeouts(players)
+
+
+# Per-player transaction columns before they moved to Group:
+# old column -> (roles whose row had it, Group field)
+COMPAT_COLUMNS = dict(
+    condition_price=('AB', 'condition_price'),
+    price1_offer=('AB', 'price1_offer'),
+    price2_offer=('AB', 'price2_offer'),
+    price_paid=('A', 'price_paid'),
+    action_chosen=('A', 'action_chosen'),
+    interaction=('B', 'interaction'),
+    player_b_type=('AB', 'player_b_type'),
+)
+
+
+def custom_export_compat(players):
+    return export_compat(players, COMPAT_COLUMNS)
+
+
+def custom_export_transactions(players):
+    return export_transactions(players, ['condition_price'])
@@ -1,5 +1,20 @@
 from otree.api import *
-import random
+
+from credencegoods.arrival import ArrivalWaitPage, arrival_markets
+from credencegoods.assignment import assign_all_rounds, check_assigned
+from credencegoods.barrier import START_BARRIER, MarketWaitPage, market_barrier
+from credencegoods.draws import drawn_b_type
+from credencegoods.matching import partner_of
+from credencegoods.payoffs import automatic_price, payment_summary, settle_group
+from credencegoods.report import admin_report
+from credencegoods.quiz import check_answer, export_attempts, quiz_errors
+from credencegoods.timeouts import (
+    TimeoutPage, configured_interaction, default_on_timeout, export_timeouts, random_price_choice, suited_action,
+)
+from credencegoods.timing import (
+    TimedPage, TimedWaitPage, export_events, export_page_times, export_stragglers,
+)
+from credencegoods.transaction import export_compat, export_transactions, fast_path, group_field, skips_transaction
 
 
 doc = """
@@ -36,15 +51,7 @@ class Subsession(BaseSubsession):
 
 
 class Group(BaseGroup):
-    pass
-
-
-class Player(BasePlayer):
-    # Role and identification
-    player_role = models.StringField()
-    player_id_in_role = models.StringField()
-    matching_group_id = models.IntegerField()
-
+    # The pair's transaction, one record per round (see credencegoods.transaction)
     # Price choice (only once by A)
     price_choice = models.StringField(
         choices=[
@@ -66,6 +73,18 @@ class Player(BasePlayer):
         label=""
     )
     interaction = models.BooleanField(choices=[[True, "Oui"], [False, "Non"]])
+    player_b_type = models.IntegerField()  # 1 or 2 if B interacts, 0 otherwise
+    reported_outcome = models.StringField(initial="")  # see credencegoods.report
+
+
+class Player(BasePlayer):
+    # Role and identification
+    player_role = models.StringField()
+    player_id_in_role = models.StringField()
+    matching_group_id = models.IntegerField()
+    partner_pk = models.IntegerField()  # Player.id of this round's partner
+    barrier_reached = models.IntegerField(initial=0)  # see credencegoods.barrier
+    timeout_defaults = models.StringField(initial="")  # see credencegoods.timeouts
 
     # Control quiz
     cq_q1 = models.StringField(
@@ -112,7 +131,6 @@ class Player(BasePlayer):
     )
 
     # Game state
-    player_b_type = models.IntegerField()
     revenue = models.IntegerField()
     round_payoff = models.CurrencyField()
 
@@ -122,141 +140,99 @@ class Player(BasePlayer):
     participation_fee = models.FloatField(initial=0)
     total_payment = models.FloatField(initial=0)
 
-    # For feedback
-    partner_price1 = models.IntegerField()
-    partner_price2 = models.IntegerField()
-    partner_interaction = models.BooleanField()
-    partner_action = models.IntegerField()
-    partner_price_paid = models.IntegerField()
+    # The pair's transaction, read from Group
+    price_choice = group_field("price_choice")
+    price1_offer = group_field("price1_offer")
+    price2_offer = group_field("price2_offer")
+    interaction = group_field("interaction")
+    player_b_type = group_field("player_b_type")
+    action_chosen = group_field("action_chosen")
+    price_paid = group_field("price_paid")
 
     def set_partner(self):
-        return [p for p in self.group.get_players() if p != self][0]
-
-    def calculate_payoff(self):
-        partner = self.set_partner()
-        role = self.player_role
-        if role == "A":
-            if not partner.interaction:
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.revenue = 0
-                self.payoff = cu(self.round_payoff)
-                return
-            partner_type = partner.field_maybe_none("player_b_type")
-            if partner_type is None:
-                raise RuntimeError(
-                    f"Player B type missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            action_chosen = self.field_maybe_none("action_chosen")
-            if action_chosen is None:
-                raise RuntimeError(
-                    f"Action choice missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if partner_type == 1:
-                revenue = C.REVENUE_1 if action_chosen == 1 else C.REVENUE_2
-            else:
-                revenue = C.REVENUE_2
-            cost = C.ACTION_1_COST if action_chosen == 1 else C.ACTION_2_COST
-            price_paid = self.field_maybe_none("price_paid")
-            if price_paid is None:
-                raise RuntimeError(
-                    f"Price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            self.revenue = revenue
-            self.round_payoff = revenue - cost - price_paid
-            self.payoff = cu(self.round_payoff)
-        else:
-            interaction_val = self.field_maybe_none("interaction")
-            if interaction_val is None:
-                raise RuntimeError(
-                    f"Interaction decision missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            if not interaction_val:
-                self.round_payoff = C.OUTSIDE_OPTION
-                self.payoff = cu(self.round_payoff)
-                return
-            partner_price_paid = partner.field_maybe_none("price_paid")
-            if partner_price_paid is None:
-                raise RuntimeError(
-                    f"Partner price paid missing for player {self.id_in_subsession} in round {self.round_number}."
-                )
-            self.round_payoff = partner_price_paid
-            self.payoff = cu(self.round_payoff)
+        return partner_of(self)
+
+
+class PageTiming(ExtraModel):
+    """Append-only page timing events, see credencegoods.timing."""
+    player = models.Link(Player)
+    round_number = models.IntegerField()
+    page_index = models.IntegerField()
+    page_name = models.StringField()
+    event = models.StringField()
+    at = models.FloatField()  # epoch seconds
+
+
+class QuizAttempt(ExtraModel):
+    """Append-only control quiz answers, see credencegoods.quiz."""
+    player = models.Link(Player)
+    question = models.StringField()
+    answer = models.StringField()
+    correct = models.BooleanField()
+    source = models.StringField()  # 'live' or 'submit'
+    at = models.FloatField()  # epoch seconds
+
+
+class MarketRound(ExtraModel):
+    """Running totals of the admin report, see credencegoods.report."""
+    subsession = models.Link(Subsession)
+    round_number = models.IntegerField()
+    matching_group_id = models.IntegerField()
+    pairs = models.IntegerField()
+    interactions = models.IntegerField()
+    overtreatment = models.IntegerField()
+    undertreatment = models.IntegerField()
+    paid = models.IntegerField()  # interacting pairs, which all pay a price
+    price_paid = models.IntegerField()  # sum over the pairs that paid
 
 
 def creating_session(subsession: Subsession):
-    players = sorted(subsession.get_players(), key=lambda p: p.id_in_subsession)
-    market_size = C.MARKET_SIZE
-    total_players = len(players)
-    if total_players % market_size != 0:
-        raise RuntimeError(f"Session size {total_players} is not divisible by market size {market_size}.")
-    session = subsession.session
+    # every round is assigned in round 1, see credencegoods.assignment
     if subsession.round_number == 1:
-        markets = {}
-        half_market = market_size // 2
-        for idx, player in enumerate(players):
-            market_id = idx // market_size + 1
-            position = idx % market_size
-            role = "A" if position < half_market else "B"
-            label_idx = position % half_market + 1
-            label = f"{role}{label_idx}"
-            player.matching_group_id = market_id
-            player.player_role = role
-            player.player_id_in_role = label
-            player.participant.vars["matching_group_id"] = market_id
-            player.participant.vars["player_role"] = role
-            player.participant.vars["player_id_in_role"] = label
-            markets.setdefault(market_id, []).append(player)
-        round_matrices = {}
-        for round_no in range(1, C.NUM_ROUNDS + 1):
-            round_pairs = []
-            for market_id, market_players in markets.items():
-                buyers = [p.id_in_subsession for p in market_players if p.player_role == "A"]
-                sellers = [p.id_in_subsession for p in market_players if p.player_role == "B"]
-                rng = random.Random(f"{session.code}-{market_id}-{round_no}")
-                rng.shuffle(buyers)
-                rng.shuffle(sellers)
-                for buyer_id, seller_id in zip(buyers, sellers):
-                    round_pairs.append([buyer_id, seller_id])
-            round_matrices[round_no] = round_pairs
-        session.vars["round_matrices"] = round_matrices
-    round_matrices = session.vars.get("round_matrices")
-    for player in players:
-        player.matching_group_id = player.participant.vars["matching_group_id"]
-        player.player_role = player.participant.vars["player_role"]
-        player.player_id_in_role = player.participant.vars["player_id_in_role"]
-    subsession.set_group_matrix(round_matrices[subsession.round_number])
-
-
-class Welcome(Page):
+        assign_all_rounds(subsession, C, Player, Group)
+    else:
+        check_assigned(subsession)
+
+
+class Welcome(TimedPage):
     template_name = "credencegoodsBJS_verifiability/Welcome.html"
     @staticmethod
     def is_displayed(player): return player.round_number == 1
 
 
-class ControlQuiz(Page):
+class ControlQuiz(TimedPage):
     template_name = "credencegoodsBJS_verifiability/ControlQuiz.html"
     form_model = "player"
     form_fields = ["cq_q1", "cq_q2", "cq_q3", "cq_q4"]
     @staticmethod
     def is_displayed(player): return player.round_number == 1
     @staticmethod
-    def error_message(player, values):
-        errors = {}
-        if values["cq_q1"] != "B": errors["cq_q1"] = "Incorrect."
-        if values["cq_q2"] != "A": errors["cq_q2"] = "Incorrect."
-        if values["cq_q3"] != "C": errors["cq_q3"] = "Incorrect."
-        if values["cq_q4"] != "A": errors["cq_q4"] = "Incorrect."
-        if errors: return errors
+    def live_method(player, data): return check_answer(QuizAttempt, player, data, "Incorrect.")
+    @staticmethod
+    def error_message(player, values): return quiz_errors(QuizAttempt, player, values, "Incorrect.")
 
 
-class WaitForAllPlayers(WaitPage):
+class WaitForAllPlayers(TimedWaitPage):
     template_name = "credencegoodsBJS_verifiability/WaitForAllPlayers.html"
     wait_for_all_groups = True
     @staticmethod
-    def is_displayed(player): return player.round_number == 1
+    def is_displayed(player): return player.round_number == 1 and not market_barrier(player)
+
+
+class WaitForMarketStart(MarketWaitPage):
+    barrier = START_BARRIER
+    body_text = "Veuillez patienter jusqu'à ce que tous les participants de votre marché aient lu les instructions."
+    @staticmethod
+    def is_displayed(player): return player.round_number == 1 and market_barrier(player) and not arrival_markets(player)
 
 
-class RoleAssignment(Page):
+class WaitForMarketArrival(ArrivalWaitPage):
+    market_size = C.MARKET_SIZE
+    @staticmethod
+    def is_displayed(player): return player.round_number == 1 and arrival_markets(player)
+
+
+class RoleAssignment(TimedPage):
     template_name = "credencegoodsBJS_verifiability/RoleAssignment.html"
     @staticmethod
     def is_displayed(player): return player.round_number == 1
@@ -264,86 +240,72 @@ class RoleAssignment(Page):
     def vars_for_template(player): return dict(player_role=player.player_role)
 
 
-class PriceOffer(Page):
+class PriceOffer(TimeoutPage):
     template_name = "credencegoodsBJS_verifiability/PriceOffer.html"
-    form_model = "player"
+    form_model = "group"
     form_fields = ["price_choice"]
     @staticmethod
     def is_displayed(player): return player.player_role == "A"
     @staticmethod
     def before_next_page(player, timeout_happened):
         mapping = {"2-3": (2, 3), "2-7": (2, 7), "4-7": (4, 7)}
-        # If admin auto-advances without a selection, default to first pair to avoid crashes
-        if not player.price_choice:
-            player.price_choice = "2-3"
-        if player.price_choice not in mapping:
+        # a timeout (or the admin advancing the page) without a selection draws a pair
+        default_on_timeout(player, timeout_happened, "price_choice", random_price_choice(C.PRICE_VECTORS))
+        group = player.group
+        if group.price_choice not in mapping:
             raise RuntimeError("Paire de prix inconnue.")
-        p1, p2 = mapping[player.price_choice]
-        player.price1_offer = p1
-        player.price2_offer = p2
-        partner = player.set_partner()
-        partner.partner_price1 = p1
-        partner.partner_price2 = p2
+        group.price1_offer, group.price2_offer = mapping[group.price_choice]
 
 
-class WaitForPrices(WaitPage):
+class WaitForPrices(TimedWaitPage):
     template_name = "credencegoodsBJS_verifiability/WaitForPrices.html"
     wait_for_all_groups = False
 
 
-class InteractionDecision(Page):
+class InteractionDecision(TimeoutPage):
     template_name = "credencegoodsBJS_verifiability/InteractionDecision.html"
-    form_model = "player"
+    form_model = "group"
     form_fields = ["interaction"]
     @staticmethod
     def is_displayed(player): return player.player_role == "B"
     @staticmethod
-    def vars_for_template(player):
-        partner = player.set_partner()
-        return dict(price1=partner.price1_offer, price2=partner.price2_offer)
+    def vars_for_template(player): return dict(price1=player.price1_offer, price2=player.price2_offer)
     @staticmethod
     def before_next_page(player, timeout_happened):
-        partner = player.set_partner()
-        partner.partner_interaction = player.interaction
+        default_on_timeout(player, timeout_happened, "interaction", configured_interaction)
 
 
-class WaitForInteraction(WaitPage):
+class WaitForInteraction(TimedWaitPage):
     template_name = "credencegoodsBJS_verifiability/WaitForInteraction.html"
     wait_for_all_groups = False
     @staticmethod
     def after_all_players_arrive(group: Group, **kwargs):
-        players = group.get_players()
-        player_a = next(p for p in players if p.player_role == "A")
-        player_b = next(p for p in players if p.player_role == "B")
-        interaction = player_b.interaction
-        if interaction:
-            player_b.player_b_type = random.randint(1, 2)
-            player_a.player_b_type = player_b.player_b_type
-            price_to_pay = player_a.price1_offer if player_b.player_b_type == 1 else player_a.price2_offer
-            player_a.price_paid = price_to_pay
-            player_b.partner_price_paid = price_to_pay
+        if group.interaction:
+            group.player_b_type = drawn_b_type(group)
+            group.price_paid = automatic_price(group.price1_offer, group.price2_offer, group.player_b_type)
         else:
-            player_b.player_b_type = 0
-            player_a.player_b_type = 0
-            player_a.price_paid = None
-            player_b.partner_price_paid = None
+            group.player_b_type = 0
+            group.price_paid = None
+            if fast_path(group):
+                settle_group(group, C)
 
 
-class WaitForAction(WaitPage):
+class WaitForAction(TimedWaitPage):
     template_name = "credencegoodsBJS_verifiability/WaitForAction.html"
     wait_for_all_groups = False
+    @staticmethod
+    def is_displayed(player): return not skips_transaction(player)
+    @staticmethod
+    def after_all_players_arrive(group: Group, **kwargs):
+        settle_group(group, C)
 
 
-class ActionChoice(Page):
+class ActionChoice(TimeoutPage):
     template_name = "credencegoodsBJS_verifiability/ActionChoice.html"
-    form_model = "player"
+    form_model = "group"
     form_fields = ["action_chosen"]
     @staticmethod
-    def is_displayed(player):
-        if player.player_role != "A":
-            return False
-        partner = player.set_partner()
-        return bool(partner.interaction)
+    def is_displayed(player): return player.player_role == "A" and bool(player.interaction)
     @staticmethod
     def vars_for_template(player):
         player_b_type = player.player_b_type
@@ -356,33 +318,33 @@ class ActionChoice(Page):
     def error_message(player, values):
         if values.get("action_chosen") is None:
             return "Veuillez choisir une action avant de continuer."
+    @staticmethod
+    def before_next_page(player, timeout_happened):
+        default_on_timeout(player, timeout_happened, "action_chosen", suited_action)
 
 
-class RoundResults(Page):
+class RoundResults(TimedPage):
     template_name = "credencegoodsBJS_verifiability/RoundResults.html"
     @staticmethod
     def vars_for_template(player):
-        partner = player.set_partner()
-        player.calculate_payoff()
-        partner.calculate_payoff()
+        group = player.group
         role = player.player_role
-        interaction = partner.interaction if role == "A" else player.interaction
+        interaction = group.interaction
         # Safe access with explicit guards (mirror Exo behavior)
-        action_chosen_val = player.field_maybe_none("action_chosen") if role == "A" else partner.field_maybe_none("action_chosen")
-        player_b_type_val = player.field_maybe_none("player_b_type") if role == "A" else partner.field_maybe_none("player_b_type")
+        action_chosen_val = group.field_maybe_none("action_chosen")
+        player_b_type_val = group.field_maybe_none("player_b_type")
         action_cost = None
         if role == "A" and interaction and action_chosen_val is not None:
             action_cost = C.ACTION_2_COST if action_chosen_val == 2 else C.ACTION_1_COST
-        price_paid_a = player.field_maybe_none("price_paid")
-        price_paid_partner = partner.field_maybe_none("price_paid")
+        price_paid = group.field_maybe_none("price_paid")
         return dict(
             player_role=role,
-            price1_offer=player.price1_offer if role == "A" else partner.price1_offer,
-            price2_offer=player.price2_offer if role == "A" else partner.price2_offer,
+            price1_offer=group.price1_offer,
+            price2_offer=group.price2_offer,
             interaction=interaction,
             interaction_text="d'interagir" if interaction else "de ne pas interagir",
-            price_paid=price_paid_a if role == "A" else price_paid_partner,
-            has_price_paid=interaction and ((price_paid_a if role == "A" else price_paid_partner) is not None),
+            price_paid=price_paid,
+            has_price_paid=interaction and price_paid is not None,
             payoff=player.round_payoff,
             player_b_type=player_b_type_val,
             outside_option=C.OUTSIDE_OPTION,
@@ -393,24 +355,30 @@ class RoundResults(Page):
         )
 
 
-class WaitForRoundResults(WaitPage):
+class WaitForRoundResults(TimedWaitPage):
     template_name = "credencegoodsBJS_verifiability/WaitForRoundResults.html"
     wait_for_all_groups = True
     @staticmethod
-    def is_displayed(player): return player.round_number < C.NUM_ROUNDS
+    def is_displayed(player): return player.round_number < C.NUM_ROUNDS and not market_barrier(player)
 
 
-class FinalResults(Page):
+class WaitForMarketRound(MarketWaitPage):
+    body_text = "Veuillez patienter jusqu'à ce que tous les participants de votre marché aient consulté les résultats de leur tour."
+    @staticmethod
+    def is_displayed(player): return player.round_number < C.NUM_ROUNDS and market_barrier(player)
+
+
+class FinalResults(TimedPage):
     template_name = "credencegoodsBJS_verifiability/FinalResults.html"
     @staticmethod
     def is_displayed(player): return player.round_number == C.NUM_ROUNDS
     @staticmethod
     def vars_for_template(player):
-        round_payoffs = [pr.round_payoff for pr in player.in_all_rounds()]
-        total_payoff = sum(round_payoffs)
-        total_euros = total_payoff.to_real_world_currency(player.session)
-        participation_fee = player.session.config.get("participation_fee", 0)
-        total_payment = total_euros + participation_fee
+        summary = payment_summary(player)
+        total_payoff = summary["total_payoff"]
+        total_euros = summary["total_euros"]
+        participation_fee = summary["participation_fee"]
+        total_payment = summary["total_payment"]
         player.total_payoff_points = float(total_payoff)
         player.total_payoff_euros = float(total_euros)
         player.participation_fee = float(participation_fee)
@@ -423,14 +391,16 @@ class FinalResults(Page):
             participation_fee_rounded=f"{participation_fee:.2f}",
             total_payment=total_payment,
             total_payment_rounded=f"{total_payment:.2f}",
-            rounds=player.in_all_rounds(),
+            rounds=summary["rounds"],
         )
 
 
 page_sequence = [
     Welcome,
     WaitForAllPlayers,
+    WaitForMarketStart,
     ControlQuiz,
+    WaitForMarketArrival,
     RoleAssignment,
     PriceOffer,
     WaitForPrices,
@@ -440,6 +410,55 @@ page_sequence = [
     WaitForAction,
     RoundResults,
     WaitForRoundResults,
+    WaitForMarketRound,
     FinalResults,
 ]
 
+
+def vars_for_admin_report(subsession):
+    return admin_report(subsession, C.MARKET_SIZE, page_sequence)
+
+
+def custom_export(players):
+    return export_events(players, PageTiming)
+
+
+def custom_export_page_times(players):
+    return export_page_times(players, PageTiming, page_sequence)
+
+
+def custom_export_stragglers(players):
+    return export_stragglers(players, PageTiming, page_sequence)
+
+
+def custom_export_quiz(players):
+    return export_attempts(players, QuizAttempt)
+
+
+def custom_export_timeouts(players):
+    return export_timeouts(players)
+
+
+# Per-player transaction columns before they moved to Group:
+# old column -> (roles whose row had it, Group field)
+COMPAT_COLUMNS = dict(
+    price_choice=("A", "price_choice"),
+    price1_offer=("A", "price1_offer"),
+    price2_offer=("A", "price2_offer"),
+    price_paid=("A", "price_paid"),
+    action_chosen=("A", "action_chosen"),
+    interaction=("B", "interaction"),
+    player_b_type=("AB", "player_b_type"),
+    partner_price1=("B", "price1_offer"),
+    partner_price2=("B", "price2_offer"),
+    partner_interaction=("A", "interaction"),
+    partner_price_paid=("B", "price_paid"),
+)
+
+
+def custom_export_compat(players):
+    return export_compat(players, COMPAT_COLUMNS)
+
+
+def custom_export_transactions(players):
+    return export_transactions(players, ["price_choice"])
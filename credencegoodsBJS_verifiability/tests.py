@@ -0,0 +1,111 @@
+from otree.api import *
+from analysis.simulator import round_payoffs
+from credencegoods.draws import market_members, matching_scheme, precompute_draws, stream
+from . import *
+
+
+# Decisions rotate with the round and the player's id, so that every round
+# has pairs that interact and pairs that do not, and over the session every
+# price pair and both actions are played against both B types.
+PRICE_CHOICES = ["2-3", "2-7", "4-7"]
+
+
+def interacts(player):
+    rate = player.session.config.get("bot_interaction_rate")
+    if rate is not None:
+        # set by the load tests (benchmarks/fast_path.py), drawn per pair and round
+        rng = stream(player.session.code, "bot-interaction", player.round_number, player.id_in_subsession)
+        return rng.random() < rate
+    return (player.round_number + player.id_in_subsession) % 4 != 0
+
+
+def price_choice(player):
+    return PRICE_CHOICES[(player.round_number + player.id_in_subsession) % 3]
+
+
+def action(player):
+    return 1 + (player.round_number + player.id_in_subsession) % 2
+
+
+def expected_round_payoffs(buyer, seller):
+    """(A, B) payoffs following the rules of the instructions; the price
+    paid is Prix 1 for a type 1 and Prix 2 for a type 2."""
+    if not seller.interaction:
+        return C.OUTSIDE_OPTION, C.OUTSIDE_OPTION
+    price_paid = buyer.price1_offer if seller.player_b_type == 1 else buyer.price2_offer
+    if seller.player_b_type == 1 and buyer.action_chosen == 1:
+        revenue = C.REVENUE_1
+    else:
+        revenue = C.REVENUE_2
+    cost = C.ACTION_1_COST if buyer.action_chosen == 1 else C.ACTION_2_COST
+    return revenue - cost - price_paid, price_paid
+
+
+def simulated_round_payoffs(buyer, seller):
+    """The same pair played by analysis.simulator, which must agree with the app."""
+    return round_payoffs(
+        "verifiability",
+        buyer.price1_offer,
+        buyer.price2_offer,
+        seller.interaction,
+        seller.field_maybe_none("player_b_type"),
+        buyer.field_maybe_none("action_chosen"),
+        buyer.field_maybe_none("price_paid"),
+    )
+
+
+def replayed_draws(bot):
+    """The session's draws recomputed from its code alone."""
+    players = bot.subsession.get_players()
+    return precompute_draws(
+        bot.session.code, market_members(players), C.NUM_ROUNDS, matching=matching_scheme(bot.session),
+    )
+
+
+def expected_total_payment(bot):
+    total = sum(p.round_payoff for p in bot.player.in_all_rounds())
+    return total.to_real_world_currency(bot.session) + bot.session.config["participation_fee"]
+
+
+class PlayerBot(Bot):
+    def play_round(self):
+        if self.round_number == 1:
+            yield Welcome
+            yield SubmissionMustFail(
+                ControlQuiz, dict(cq_q1="B", cq_q2="A", cq_q3="A", cq_q4="A"), error_fields=["cq_q3"]
+            )
+            yield ControlQuiz, dict(cq_q1="B", cq_q2="A", cq_q3="C", cq_q4="A")
+            yield RoleAssignment
+
+        if self.player.player_role == "A":
+            yield PriceOffer, dict(price_choice=price_choice(self.player))
+            expect(f"{self.player.price1_offer}-{self.player.price2_offer}", price_choice(self.player))
+            if self.player.set_partner().interaction:
+                expect(self.player.player_b_type, "in", [1, 2])
+                yield SubmissionMustFail(ActionChoice)
+                yield ActionChoice, dict(action_chosen=action(self.player))
+        else:
+            yield InteractionDecision, dict(interaction=interacts(self.player))
+
+        player = self.player
+        partner = player.set_partner()
+        buyer, seller = (player, partner) if player.player_role == "A" else (partner, player)
+        buyer_payoff, seller_payoff = expected_round_payoffs(buyer, seller)
+        expect(player.round_payoff, buyer_payoff if player is buyer else seller_payoff)
+        expect(simulated_round_payoffs(buyer, seller), (buyer_payoff, seller_payoff))
+
+        draws = replayed_draws(self)
+        if self.round_number == 1:
+            expect(draws, self.session.vars["draws"])
+        # the bulk assignment put the drawn pair in the group of the same index
+        pair = draws["round_matrices"][self.round_number][self.group.id_in_subsession - 1]
+        expect([p.id_in_subsession for p in self.group.get_players()], pair)
+        if seller.interaction:
+            drawn = draws["b_types"][self.round_number][self.group.id_in_subsession - 1]
+            expect(seller.player_b_type, int(drawn))
+        yield RoundResults
+
+        if self.round_number == C.NUM_ROUNDS:
+            expect(f"{expected_total_payment(self):.2f}", "in", self.html)
+            # FinalResults is the end of the treatment and has no next button
+            yield Submission(FinalResults, check_html=False)
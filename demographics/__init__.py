@@ -1,5 +1,7 @@
 from otree.api import *
 
+from credencegoods.payments import export_payment_summary, export_payments
+
 
 doc = """
 A post-experimental questionnaire to collect demographics information from the participants.
@@ -34,6 +36,26 @@ class Player(BasePlayer):
     field_of_study = models.StringField(label="Quel est votre domaine d'études ?")
 
 
+class Payment(ExtraModel):
+    """A participant's payment, stored by the settlement at the end of the
+    game, see credencegoods.payments."""
+    player = models.Link(Player)
+    participant_code = models.StringField()
+    participant_label = models.StringField()
+    id_in_session = models.IntegerField()
+    app = models.StringField()
+    rounds_settled = models.IntegerField()
+    num_rounds = models.IntegerField()
+    total_points = models.FloatField()
+    total_euros = models.FloatField()
+    participation_fee = models.FloatField()
+    payment = models.FloatField()
+    running_payment = models.FloatField()
+    stored_payment = models.FloatField()
+    otree_payment = models.FloatField()
+    settled_at = models.FloatField()  # epoch seconds
+
+
 class Demographics(Page):
     form_model = "player"
     form_fields = ["age", "gender", "field_of_study"]
@@ -46,3 +68,11 @@ class ThankYou(Page):
 
 
 page_sequence = [Demographics, ThankYou]
+
+
+def custom_export_payments(players):
+    return export_payments(players, Payment)
+
+
+def custom_export_payment_summary(players):
+    return export_payment_summary(players, Payment)
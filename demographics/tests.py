@@ -0,0 +1,38 @@
+from otree.api import *
+from . import *
+
+
+GENDERS = ["f", "m", "na"]
+
+
+class PlayerBot(Bot):
+    def play_round(self):
+        yield SubmissionMustFail(
+            Demographics, dict(age=17, gender="f", field_of_study="Economie"), error_fields=["age"]
+        )
+        yield Demographics, dict(
+            age=18 + self.participant.id_in_session % 30,
+            gender=GENDERS[self.participant.id_in_session % len(GENDERS)],
+            field_of_study="Economie",
+        )
+        expect(self.player.gender, "in", GENDERS)
+        # ThankYou is the last page of the session and has no next button
+        # settled at the end of the game, in one pass for everybody
+        players = Player.objects_filter(session_id=self.session.id)
+        settled = [payment for player in players for payment in Payment.filter(player=player)]
+        expect(len(settled), self.session.num_participants)
+        expect(len({payment.settled_at for payment in settled}), 1)
+        header, *rows = custom_export_payments(Player.objects_filter(session_id=self.session.id))
+        payments = {row[header.index('participant_code')]: dict(zip(header, row)) for row in rows}
+        expect(len(payments), self.session.num_participants)
+        payment = payments[self.participant.code]
+        expect(payment['questionnaire'], True)
+        expect(payment['complete'], True)
+        expect(payment['payment'], round(float(self.participant.payoff_plus_participation_fee()), 2))
+        summary = list(custom_export_payment_summary(Player.objects_filter(session_id=self.session.id)))
+        row = dict(zip(*summary))
+        expect(len(summary), 2)
+        expect(row["settled"], True)
+        expect(row['rounds_missing'], 0)
+        expect(row['running_mismatches'] + row['stored_mismatches'] + row['otree_mismatches'], 0)
+        expect(row['stored_missing'], 0)
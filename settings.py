@@ -6,11 +6,61 @@ SESSION_CONFIGS = [
         app_sequence=['credencegoodsBJS','demographics'],
         num_demo_participants=16,
     ),
+    dict(
+        name='credencegoods_baseline_live',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        live_rounds=True,  # one live page per round instead of PriceOffer ... WaitForPricePayment
+    ),
+    dict(
+        name='credencegoods_baseline_live_timeouts',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        live_rounds=True,
+        decision_timeout=90,  # a stalled live round is finished with the defaults
+        default_interaction=True,
+    ),
+    dict(
+        name='credencegoods_baseline_combined',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        combined_payment=True,  # A picks action and price paid on one page (ActionPayment)
+    ),
+    dict(
+        name='credencegoods_baseline_arrival',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        arrival_markets=True,  # markets formed by the first 8 ready, the next 8, ...
+    ),
+    dict(
+        name='credencegoods_baseline_timeouts',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        decision_timeout=90,  # idle participants get the default decision (credencegoods.timeouts)
+    ),
+    dict(
+        name='credencegoods_baseline_fastpath',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        fast_path=True,  # pairs that do not interact go straight to RoundResults
+    ),
+    dict(
+        name='credencegoods_baseline_latin',
+        app_sequence=['credencegoodsBJS','demographics'],
+        num_demo_participants=16,
+        matching='latin',  # minimal-repeat schedule (credencegoods.schedule)
+    ),
     dict(
         name='credencegoods_exogenous',
         app_sequence=['credencegoodsBJS_Exo','demographics'],
         num_demo_participants=16,
     ),
+    dict(
+        name='credencegoods_exogenous_latin',
+        app_sequence=['credencegoodsBJS_Exo','demographics'],
+        num_demo_participants=16,
+        matching='latin',  # minimal-repeat schedule and balanced price vectors
+    ),
     dict(
         name='credencegoods_verifiability',
         app_sequence=['credencegoodsBJS_verifiability','demographics'],
@@ -24,7 +74,12 @@ SESSION_CONFIGS = [
 # e.g. self.session.config['participation_fee']
 
 SESSION_CONFIG_DEFAULTS = dict(
-    real_world_currency_per_point=1/7, participation_fee=5.00, doc=""  # 7 points = 1 EUR
+    real_world_currency_per_point=1/7, participation_fee=5.00, doc="",  # 7 points = 1 EUR
+    market_barrier=False,  # True: markets advance through rounds independently
+    fast_path=False,  # True: pairs that do not interact skip the remaining wait pages of the round
+    decision_timeout=0,  # seconds before a decision page submits a default; 0: none; timeout_<PageName> overrides
+    default_interaction=False,  # B's decision when InteractionDecision times out
+    matching='random',  # independent shuffles, as in earlier sessions; 'latin': minimal-repeat schedule
 )
 
 PARTICIPANT_FIELDS = []